@@ -9,6 +9,8 @@ from collections import deque
 from PySide6.QtCore import QObject, Signal, Slot, QMutex, QMutexLocker
 from rapidfuzz.distance import Levenshtein
 
+from app.core.g2p.phoneme_inventory import get_inventory
+
 # -----------------------------------------
 # 数据结构（保持与原接口一致）
 # -----------------------------------------
@@ -98,10 +100,15 @@ class Aligner(QObject):
     suggestionReady = Signal(object)
     currentCueIndexChanged = Signal(int)
 
-    def __init__(self, cues: List[Any], g2p_converter: Any, parent: Optional[QObject] = None, debug: bool = False):
+    def __init__(self, cues: List[Any], g2p_converter: Any, parent: Optional[QObject] = None, debug: bool = False,
+                 lexicon: Optional[Any] = None):
         super().__init__(parent)
         self.cues = cues
         self.g2p = g2p_converter
+        # 预计算的 STT 词表音素词典（PhonemeLexicon），优先于 G2P
+        self.lexicon = lexicon
+        # ASR 词 → 音素：analyze 在取互斥锁之前解析本轮的新词，锁内只查表
+        self._phoneme_memo: Dict[str, str] = {}
         self.debug = debug
 
         # 配置（可按需调参）
@@ -143,8 +150,17 @@ class Aligner(QObject):
             "LINE_NGRAM_N": 3,        # 对齐所用的 n
             "W_ANCHOR": 0.30,         # 锚点权重加入 S
             "ANCHOR_HEAD_BIAS": 0.5,  # 越靠前权重越高（尾部至少乘以 1-0.5=0.5）
+
+            # 音素相似度：True 使用整数音段 + 发音特征加权编辑距离，False 使用字符 Levenshtein。
+            # 加权距离给最小对打分高得多（pa/ba 0.90、le/lə 0.875，字符 Levenshtein 约 0.5），
+            # 上面的 PHON_EQ_THR 等阈值都是按字符 Levenshtein 调的，开启前需用实录数据重新调阈值。
+            # 目前只是可选实验：台词音素在载入时驻留为整数音段，词对相似度缓存，开启后每帧开销与默认接近
+            "PHON_FEATURE_WEIGHTED": False,
         }
 
+        # 音素符号表（按 G2P 语言共享）
+        self._inventory = get_inventory(str(getattr(g2p_converter, "language", "") or ""))
+
         # 状态
         self.current_cue_index: int = -1
         self._mutex = QMutex()
@@ -163,6 +179,8 @@ class Aligner(QObject):
 
         # 全剧 IDF
         self._idf: Dict[str, float] = self._build_idf()
+        # 载入时把台词句头音素驻留为整数音段，对齐时不再切分
+        self._intern_cue_phonemes(self.cues)
 
         self._refresh_target()
         if self.debug:
@@ -191,6 +209,9 @@ class Aligner(QObject):
         pending_proposal = None
         pending_index_change = None
         
+        # 查词典 / G2P 可能要等待，不能占着对齐器的互斥锁
+        self._prefetch_phonemes(asr_word_list)
+        
         with QMutexLocker(self._mutex):
             if self._entry is None or self._next_index is None:
                 return
@@ -235,6 +256,7 @@ class Aligner(QObject):
             PH_THR = self.config.get("PHON_EQ_THR", 0.85)
             Hm_canon = [_canon(t) for t in Hm_tok]
 
+            head_sim = self._phon_sim_lookup(W_raw_pho, Hm_tok_pho) if Hm_tok_pho else None
             W: List[str] = []
             for w, w_ph in zip(W_raw, W_raw_pho):
                 wc = _canon(w)
@@ -242,7 +264,7 @@ class Aligner(QObject):
                 if not keep:
                     keep = any(h in wc or wc in h for h in Hm_canon)
                 if not keep and Hm_tok_pho and w_ph:
-                    keep = any(Levenshtein.normalized_similarity(w_ph, hp) >= PH_THR for hp in Hm_tok_pho)
+                    keep = any(head_sim(w_ph, hp) >= PH_THR for hp in Hm_tok_pho)
                 if keep:
                     W.append(w)
 
@@ -275,15 +297,12 @@ class Aligner(QObject):
                         W_ph = []
                     W_ng_ph = list(zip(*[W_ph[i:] for i in range(n)])) if len(W_ph) >= n else []
                     if W_ng_ph:
-                        # 逐个 n-gram 做音素相似匹配
+                        # 逐个 n-gram 做音素相似匹配：先一次算出所有 ASR 词 × 目标词的相似度矩阵
                         thr = self.config.get("PHON_EQ_THR", 0.85)
+                        sim = self._phon_sim_lookup(W_ph, [p for tgt in L_tri_ph for p in tgt])
                         for i, tri_ph in enumerate(W_ng_ph):
                             for j, tgt_ph in enumerate(L_tri_ph):
-                                ok = True
-                                for a, b in zip(tri_ph, tgt_ph):
-                                    if Levenshtein.normalized_similarity(a, b) < thr:
-                                        ok = False
-                                        break
+                                ok = all(sim(a, b) >= thr for a, b in zip(tri_ph, tgt_ph))
                                 if ok:
                                     anchor_hit = True
                                     anchor_words = list(W_norm[i:i+n])
@@ -361,7 +380,7 @@ class Aligner(QObject):
                 first_match = any((_canon(w) == _canon(first_tok)) for w in W)
                 if (not first_match) and first_pho:
                     PH_THR = self.config.get("PHON_EQ_THR", 0.85)
-                    first_match = any(Levenshtein.normalized_similarity(p, first_pho) >= PH_THR for p in W_sel_pho if p)
+                    first_match = any(self._phon_sim(p, first_pho) >= PH_THR for p in W_sel_pho if p)
             if self._firstword_hits is not None:
                 self._firstword_hits.append(1 if first_match else 0)
 
@@ -529,7 +548,7 @@ class Aligner(QObject):
                 tok_ok = (Wk[i] == H_tok[i]) or (_canon(Wk[i]) == _canon(H_tok[i]))
                 pho_ok = False
                 if H_pho and W_pho_pos[i] and H_pho[i]:
-                    pho_ok = Levenshtein.normalized_similarity(W_pho_pos[i], H_pho[i]) >= thr
+                    pho_ok = self._phon_sim(W_pho_pos[i], H_pho[i]) >= thr
                 if tok_ok or pho_ok:
                     match_cnt += 1
             prefix_tok = match_cnt / max(1, k_eff)
@@ -548,10 +567,10 @@ class Aligner(QObject):
                 W_bi_ph = list(zip(W_pho_all, W_pho_all[1:]))
                 H_bi_ph = list(zip(H_pho, H_pho[1:]))
                 thr = self.config.get("PHON_EQ_THR", 0.85)
+                sim = self._phon_sim_lookup(W_pho_all, H_pho)
                 for a1, a2 in W_bi_ph:
                     for b1, b2 in H_bi_ph:
-                        if (Levenshtein.normalized_similarity(a1, b1) >= thr and
-                            Levenshtein.normalized_similarity(a2, b2) >= thr):
+                        if sim(a1, b1) >= thr and sim(a2, b2) >= thr:
                             pho_hit = 1.0
                             break
                     if pho_hit:
@@ -568,7 +587,7 @@ class Aligner(QObject):
             try:
                 W_pho = self._words_to_phonemes(W)
                 k_eff2 = min(len(W_pho), len(H_pho))
-                phon_prefix = Levenshtein.normalized_similarity(
+                phon_prefix = self._phon_sim(
                     " ".join(W_pho[:k_eff2]), " ".join(H_pho[:k_eff2])
                 ) if k_eff2 > 0 else 0.0
             except Exception:
@@ -599,10 +618,69 @@ class Aligner(QObject):
             matched_phonemes=W_pho,
         )
 
+    # -------------------- 音素相似度 --------------------
+
+    def _phon_sim(self, a: str, b: str) -> float:
+        if self.config.get("PHON_FEATURE_WEIGHTED", False):
+            return self._inventory.similarity(a, b)
+        return Levenshtein.normalized_similarity(a, b)
+
+    def _phon_sim_lookup(self, A: List[str], B: List[str]):
+        """批量计算 A × B 的相似度，返回 sim(a, b) 查表函数"""
+        if not self.config.get("PHON_FEATURE_WEIGHTED", False):
+            return Levenshtein.normalized_similarity
+        # 已比较过的词对直接命中缓存，只有新词对才走一次批量矩阵
+        self._inventory.cache_similarities(A, B)
+        return self._inventory.similarity
+
     def _p_from_llr(self, llr: float) -> float:
         return 1.0 / (1.0 + math.exp(-llr))
 
+    def _prefetch_phonemes(self, asr_word_list: List[str]):
+        """解析本轮 ASR 词（原词及缩合拆分后的词）中尚未缓存的音素，存入 _phoneme_memo"""
+        words = set()
+        for w in asr_word_list:
+            if not w or w.lower() in FILLERS:
+                continue
+            words.add(w.lower())
+            words.update(p for p in _split_clitic(w.lower()) if p)
+        missing = [w for w in words if w not in self._phoneme_memo]
+        if not missing:
+            return
+        try:
+            phonemes = self._resolve_phonemes(missing)
+        except Exception:
+            return  # 锁内查表未命中时会再试一次
+        if len(self._phoneme_memo) + len(missing) > 50_000:
+            self._phoneme_memo.clear()
+        self._phoneme_memo.update(zip(missing, phonemes))
+        if self.config.get("PHON_FEATURE_WEIGHTED", False):
+            self._inventory.intern(phonemes)
+
     def _words_to_phonemes(self, words: List[str]) -> List[str]:
+        memo = self._phoneme_memo
+        found = [memo.get(w) for w in words]
+        missing = [w for w, p in zip(words, found) if p is None]
+        if not missing:
+            return found
+        extra = iter(self._resolve_phonemes(missing))
+        return [p if p is not None else next(extra) for p in found]
+
+    def _resolve_phonemes(self, words: List[str]) -> List[str]:
+        if self.lexicon is not None:
+            # 先查词典，只把未命中的词交给 G2P
+            found = self.lexicon.lookup_many(words)
+            missing = [w for w, p in zip(words, found) if p is None]
+            if missing:
+                extra = iter(self._g2p_convert(missing))
+                found = [p if p is not None else next(extra) for p in found]
+            return found
+        return self._g2p_convert(words)
+
+    def _g2p_convert(self, words: List[str]) -> List[str]:
+        if hasattr(self.g2p, "submit"):
+            # G2PService：与其他调用方的并发请求去重、合批
+            return self.g2p.submit(words).result()
         if hasattr(self.g2p, "batch_convert"):
             return self.g2p.batch_convert(words)
         else:
@@ -610,17 +688,59 @@ class Aligner(QObject):
 
     # -------------------- IDF --------------------
 
+    @staticmethod
+    def _cue_token_set(cue: Any) -> frozenset:
+        text = getattr(cue, 'pure_line', '') or cue.line
+        return frozenset(_norm_tokenize(text))
+
     def _build_idf(self) -> Dict[str, float]:
-        df: Dict[str, int] = {}
-        N = max(1, len(self.cues))
+        # 保留每句的词集与文档频率，台词编辑后可增量更新
+        self._cue_tokens: Dict[int, frozenset] = {}
+        self._df: Dict[str, int] = {}
         for cue in self.cues:
-            text = getattr(cue, 'pure_line', '') or cue.line
-            toks = set(_norm_tokenize(text))
+            toks = self._cue_token_set(cue)
+            self._cue_tokens[id(cue)] = toks
             for t in toks:
-                df[t] = df.get(t, 0) + 1
-        return {t: math.log((N + 1) / (c + 1)) + 1.0 for t, c in df.items()}
-
-
-
-
+                self._df[t] = self._df.get(t, 0) + 1
+        return self._idf_from_df()
+
+    def _intern_cue_phonemes(self, cues: List[Any]):
+        if self.config.get("PHON_FEATURE_WEIGHTED", False):
+            self._inventory.intern(p for cue in cues for p in (getattr(cue, 'head_phonemes', None) or []))
+
+    def _idf_from_df(self) -> Dict[str, float]:
+        N = max(1, len(self._cue_tokens))
+        return {t: math.log((N + 1) / (c + 1)) + 1.0 for t, c in self._df.items()}
+
+    # -------------------- 增量更新 --------------------
+
+    def cue_update_lock(self) -> QMutexLocker:
+        """写回台词特征时持有，保证对齐线程看不到写了一半的台词"""
+        return QMutexLocker(self._mutex)
+
+    def update_cue_statistics(self, changed: List[Any], removed: List[Any]):
+        """
+        台词被编辑/新增（changed）或删除（removed）后增量更新 IDF，并重建下一句目标条目。
+        只重新分词受影响的台词；调用方须持有 cue_update_lock()。
+        """
+        for cue in removed:
+            self._retract_tokens(self._cue_tokens.pop(id(cue), frozenset()))
+        for cue in changed:
+            self._retract_tokens(self._cue_tokens.get(id(cue), frozenset()))
+            toks = self._cue_token_set(cue)
+            self._cue_tokens[id(cue)] = toks
+            for t in toks:
+                self._df[t] = self._df.get(t, 0) + 1
+        self._idf = self._idf_from_df()
+        self._intern_cue_phonemes(changed)
+        self._refresh_target()
+        if self.debug:
+            print(f"[Aligner/SPRT] cues updated: changed={len(changed)} removed={len(removed)} IDF size={len(self._idf)}")
 
+    def _retract_tokens(self, toks: frozenset):
+        for t in toks:
+            c = self._df.get(t, 0) - 1
+            if c > 0:
+                self._df[t] = c
+            else:
+                self._df.pop(t, None)
@@ -210,9 +210,18 @@ class AlignmentManager(QObject):
                 raise Exception("G2P管理器或脚本数据缺失")
             
             g2p_converter = self.g2p_manager.get_current_engine()
+            # 经异步G2P服务调用：与同一引擎的其他调用方共享去重与合批
+            from app.core.g2p.g2p_service import get_g2p_service
+            # Vosk 的输出词集封闭，若已为其模型构建了音素词典则优先查词典
+            lexicon = None
+            model_dir = getattr(self.stt_engine, 'model_dir', None)
+            if model_dir:
+                from app.core.g2p.lexicon import find_lexicon
+                lexicon = find_lexicon(model_dir, g2p_converter)
             self.aligner = Aligner(
                 cues=self.script_data.cues,
-                g2p_converter=g2p_converter
+                g2p_converter=get_g2p_service(g2p_converter),
+                lexicon=lexicon
             )
             self.status_changed.emit("Aligner初始化成功")
             self._mark_component_ready('Aligner')
@@ -229,7 +238,7 @@ class AlignmentManager(QObject):
             # 从第一个cue开始
             initial_cue = self.script_data.cues[0] if self.script_data.cues else None
             self.director = Director(current_cue=initial_cue)
-            self.director.set_cues_list(self.script_data.cues)
+            self.director.set_cues_list(self.script_data.cues, self.script_data.cue_index)
             
             # 连接Aligner和Director
             if self.aligner:
@@ -1,66 +1,29 @@
-# TODO :解耦AudioHub与降噪器
-import os
 import queue
 import threading
+import time
 import numpy as np
 import sounddevice as sd
 from PySide6.QtCore import QObject, Signal
-import ctypes
-from ctypes import c_void_p, c_float, POINTER
 
-# Try importing noisereduce
-try:
-    import noisereduce as nr
-    NOISEREDUCE_AVAILABLE = True
-except ImportError:
-    NOISEREDUCE_AVAILABLE = False
+from app.core.audio.resampler import PolyphaseResampler
+from app.core.audio.metrics import AudioMetrics
+from app.core.audio.pipeline import (
+    AudioPipeline, LevelMeterStage, EnergyVADStage, DenoiseStage, SmoothAGCStage,
+    RNNoiseCT, NOISEREDUCE_AVAILABLE,
+)
 
-class RNNoiseCT:
-    """
-    Simple RNNoise binding via ctypes.
-    """
-    FRAME_SIZE = 480  # 30ms @ 16kHz
-
-    def __init__(self, lib_path: str):
-        if not os.path.isfile(lib_path):
-            raise FileNotFoundError(f"RNNoise 库文件不存在: {lib_path}")
-        self.lib = ctypes.cdll.LoadLibrary(lib_path)
-        # Setup function signatures
-        self.lib.rnnoise_create.restype = c_void_p
-        self.lib.rnnoise_destroy.argtypes = [c_void_p]
-        self.lib.rnnoise_process_frame.argtypes = [c_void_p, POINTER(c_float), POINTER(c_float)]
-        self.state = self.lib.rnnoise_create()
-
-    def filter(self, pcm_block: np.ndarray) -> np.ndarray:
-        data = pcm_block.astype(np.float32)
-        length = len(data)
-        out = np.zeros_like(data)
-        for i in range(0, length, self.FRAME_SIZE):
-            chunk = data[i:i + self.FRAME_SIZE]
-            if chunk.shape[0] < self.FRAME_SIZE:
-                padded = np.zeros(self.FRAME_SIZE, dtype=np.float32)
-                padded[:chunk.shape[0]] = chunk
-                chunk = padded
-            in_arr = (c_float * self.FRAME_SIZE)(*chunk)
-            out_arr = (c_float * self.FRAME_SIZE)()
-            self.lib.rnnoise_process_frame(self.state, in_arr, out_arr)
-            processed = np.ctypeslib.as_array(out_arr)
-            out[i:i + chunk.shape[0]] = processed[:chunk.shape[0]]
-        return out
-
-    def __del__(self):
-        try:
-            self.lib.rnnoise_destroy(self.state)
-        except Exception:
-            pass
 
 class AudioHub(QObject):
     """
     管理多通道麦克风输入。
     - blockReady 发出单通道 PCM float32 ndarray
-    - 可选预处理：降噪（noisereduce 或 RNNoise）与 AGC
+    - 可选预处理：降噪（noisereduce 或 RNNoise）与平滑 AGC（含噪声门与前瞻软限幅）
+    - 旁路 tap：原始块流（回调线程）与预处理后块流，可挂载 ShowRecorder 录音
+    - 以声卡原生采样率采集，由多相重采样器统一转换到 samplerate（默认 16 kHz）
+    - 健康指标：metricsReady 按固定周期发出快照，get_metrics() 供仪表盘主动拉取
     """
     blockReady = Signal(int, np.ndarray)
+    metricsReady = Signal(dict)
 
     def __init__(
         self,
@@ -77,6 +40,15 @@ class AudioHub(QObject):
         enable_agc=False,
         target_rms=0.1,
         max_gain=10.0,
+        agc_attack_ms=10.0,
+        agc_release_ms=300.0,
+        gate_threshold=0.003,
+        limiter_lookahead_ms=5.0,
+        # 健康指标
+        metrics_interval_ms=1000,
+        # 采集采样率
+        capture_native_rate=True,
+        device_samplerate=None,
     ):
         super().__init__()
         self.samplerate = samplerate
@@ -92,33 +64,54 @@ class AudioHub(QObject):
         self.enable_agc = enable_agc
         self.target_rms = target_rms
         self.max_gain = max_gain
+        self.agc_attack_ms = agc_attack_ms
+        self.agc_release_ms = agc_release_ms
+        self.gate_threshold = gate_threshold
+        self.limiter_lookahead_ms = limiter_lookahead_ms
+
+        self.rnnoise_lib_path = rnnoise_lib_path
+
+        # 预处理流水线：电平 -> 静音门限(VAD) -> 降噪 -> AGC，整块 (frames, channels) 一次处理
+        denoise = DenoiseStage(self.denoise_method, channels=channels, rnnoise_lib_path=rnnoise_lib_path,
+                               enabled=self.enable_denoise, debug=self.debug)
+        self.enable_denoise = denoise.enabled
+        self.pipeline = AudioPipeline(samplerate, channels, [
+            LevelMeterStage(),
+            EnergyVADStage(silence_thresh),
+            denoise,
+            SmoothAGCStage(target_rms, max_gain, attack_ms=agc_attack_ms, release_ms=agc_release_ms,
+                           gate_threshold=gate_threshold, lookahead_ms=limiter_lookahead_ms, enabled=enable_agc),
+        ])
+
+        # 健康指标
+        self.metrics = AudioMetrics(channels)
+        self.metrics_interval_ms = metrics_interval_ms
+        self._metrics_stop = threading.Event()
+        self._last_status_print = 0.0
 
-        # 初始化降噪器
-        self.denoiser = None
-        if self.enable_denoise:
-            if self.denoise_method == 'noisereduce':
-                if NOISEREDUCE_AVAILABLE:
-                    print("[AudioHub] 使用 noisereduce 降噪")
-                else:
-                    print("[AudioHub] WARNING: noisereduce 未安装，降噪关闭")
-                    self.enable_denoise = False
-            elif self.denoise_method == 'rnnoise':
-                if not rnnoise_lib_path:
-                    raise ValueError("使用 rnnoise 时必须提供 rnnoise_lib_path")
-                try:
-                    self.denoiser = RNNoiseCT(rnnoise_lib_path)
-                    print("[AudioHub] 使用 RNNoise 降噪")
-                except Exception as e:
-                    print(f"[AudioHub] 初始化 RNNoiseCT 失败：{e}")
-                    self.enable_denoise = False
-            else:
-                raise ValueError(f"未知的降噪方法: {self.denoise_method}")
-
-        # 队列与流
-        self.queues = [queue.Queue(maxsize=100) for _ in range(channels)]
+        # 旁路 tap（写时复制的元组，回调线程无需加锁即可遍历）
+        self._raw_taps = ()
+        self._processed_taps = ()
+        self._recorder_taps = {}
+
+        # 采集采样率：默认使用设备原生采样率，避免 PortAudio/宿主的低质量重采样或打开失败
+        self.device_samplerate = int(device_samplerate or samplerate)
+        if capture_native_rate and device_samplerate is None:
+            self.device_samplerate = self._query_native_rate(device, samplerate)
+        self.resampler = None
+        device_frames = frames_per_block
+        if self.device_samplerate != samplerate:
+            self.resampler = PolyphaseResampler(self.device_samplerate, samplerate, channels=channels)
+            # 保持输出块时长与 frames_per_block 一致
+            device_frames = int(round(frames_per_block * self.device_samplerate / samplerate))
+            print(f"[AudioHub] 设备采样率 {self.device_samplerate} Hz -> 重采样到 {samplerate} Hz "
+                  f"(L/M={self.resampler.up}/{self.resampler.down}, K={self.resampler.taps_per_phase})")
+
+        # 队列与流：回调只把整块放进 _block_queue，处理线程负责重采样、预处理与按声道分发
+        self._block_queue = queue.Queue(maxsize=100)
         self.stream = sd.InputStream(
-            samplerate=samplerate,
-            blocksize=frames_per_block,
+            samplerate=self.device_samplerate,
+            blocksize=device_frames,
             channels=channels,
             dtype='float32',
             device=device,
@@ -126,69 +119,86 @@ class AudioHub(QObject):
         )
         self._running = False
 
-    def _callback(self, indata, frames, time, status):
-        if status:
+    def _callback(self, indata, frames, time_info, status):
+        t0 = time.perf_counter()
+        t = time.monotonic()
+        if status and t - self._last_status_print > 1.0:
+            # xrun 计入指标；打印限频，避免在持续过载时刷屏
             print(f"[AudioHub] ⚠️ {status}")
-        for ch in range(self.channels):
-            try:
-                self.queues[ch].put_nowait(indata[:, ch].copy())
-            except queue.Full:
-                _ = self.queues[ch].get_nowait()
-                self.queues[ch].put_nowait(indata[:, ch].copy())
-
-    def _preprocess(self, block: np.ndarray) -> np.ndarray:
-        # 降噪
-        if self.enable_denoise:
+            self._last_status_print = t
+        for tap in self._raw_taps:
             try:
-                if self.denoise_method == 'noisereduce':
-                    block = nr.reduce_noise(y=block, sr=self.samplerate, stationary=False)
-                elif self.denoise_method == 'rnnoise' and self.denoiser:
-                    block = self.denoiser.filter(block)
+                tap(indata, t)
             except Exception as e:
                 if self.debug:
-                    print(f"[AudioHub] 降噪出错：{e}")
-        # AGC
-        if self.enable_agc:
-            rms = np.sqrt(np.mean(block**2))
-            if rms > 1e-5:
-                gain = self.target_rms / rms
-                gain = min(gain, self.max_gain)
-                block = np.clip(block * gain, -1.0, 1.0)
-        return block
-
-    def _emit_loop(self, ch: int):
-        q = self.queues[ch]
+                    print(f"[AudioHub] raw tap 出错：{e}")
+        item = (t, indata.copy())
+        dropped = False
+        try:
+            self._block_queue.put_nowait(item)
+        except queue.Full:
+            _ = self._block_queue.get_nowait()
+            self._block_queue.put_nowait(item)
+            dropped = True
+        self.metrics.on_callback(time.perf_counter() - t0, status, self._block_queue.qsize(), dropped)
+
+    @staticmethod
+    def _query_native_rate(device, fallback: int) -> int:
+        """查询输入设备的默认（原生）采样率"""
+        try:
+            info = sd.query_devices(device, 'input')
+            return int(info['default_samplerate'])
+        except Exception as e:
+            print(f"[AudioHub] 查询设备采样率失败，使用 {fallback} Hz：{e}")
+            return int(fallback)
+
+    def _process_loop(self):
+        """单线程处理整块：重采样 -> 预处理流水线 -> 按活动声道发射"""
         while self._running:
-            block = q.get()
-            if block is None:
+            item = self._block_queue.get()
+            if item is None:
                 break
-            # 静音过滤
-            if np.sqrt(np.mean(block**2)) < self.silence_thresh:
-                continue
-            processed = self._preprocess(block)
+            t, block = item
+            t0 = time.perf_counter()
+            if self.resampler is not None:
+                block = self.resampler.process(block)
+            processed, ctx = self.pipeline.process(block, t)
+            self.metrics.on_processed(ctx, time.perf_counter() - t0, t)
             if self.debug:
-                import time
                 if not hasattr(self, '_last_print_time') or time.time() - self._last_print_time > 1:
-                    print(f"[AudioHub] ch-{ch} processed max_vol={np.max(np.abs(processed)):.4f}")
+                    print(f"[AudioHub] processed max_vol={np.round(np.max(np.abs(processed), axis=0), 4)}")
                     self._last_print_time = time.time()
-            self.blockReady.emit(ch, processed)
+            for ch in np.flatnonzero(ctx.active):
+                ch = int(ch)
+                out = np.ascontiguousarray(processed[:, ch])
+                for tap in self._processed_taps:
+                    try:
+                        tap(ch, out, t)
+                    except Exception as e:
+                        if self.debug:
+                            print(f"[AudioHub] processed tap 出错：{e}")
+                self.blockReady.emit(ch, out)
 
     def start(self):
         if self._running:
             return
         self._running = True
         self.stream.start()
-        for ch in range(self.channels):
-            threading.Thread(target=self._emit_loop, args=(ch,), daemon=True).start()
-        print(f"[AudioHub] Started, {self.channels} ch @ {self.samplerate} Hz")
+        self.pipeline.reset()
+        self.metrics.reset()
+        threading.Thread(target=self._process_loop, daemon=True).start()
+        if self.metrics_interval_ms:
+            self._metrics_stop.clear()
+            threading.Thread(target=self._metrics_loop, daemon=True).start()
+        print(f"[AudioHub] Started, {self.channels} ch @ {self.samplerate} Hz (device {self.device_samplerate} Hz)")
 
     def stop(self):
         if not self._running:
             return
         self._running = False
-        for q in self.queues:
-            try: q.put_nowait(None)
-            except queue.Full: pass
+        self._metrics_stop.set()
+        try: self._block_queue.put_nowait(None)
+        except queue.Full: pass
         self.stream.stop()
         self.stream.close()
         print("[AudioHub] Stopped")
@@ -197,8 +207,100 @@ class AudioHub(QObject):
         # 支持动态更新参数和降噪方法
         for k, v in kwargs.items():
             if hasattr(self, k): setattr(self, k, v)
+        self._sync_pipeline(method_changed='denoise_method' in kwargs or 'rnnoise_lib_path' in kwargs)
         print(f"[AudioHub] 预处理更新：denoise={self.enable_denoise}, method={self.denoise_method}, agc={self.enable_agc}")
 
+    def _sync_pipeline(self, method_changed: bool = False):
+        """把 AudioHub 上的预处理属性同步到对应的流水线阶段"""
+        vad = self.pipeline.get_stage('vad')
+        if vad:
+            vad.threshold = self.silence_thresh
+        agc = self.pipeline.get_stage('agc')
+        if agc:
+            agc.enabled = self.enable_agc
+            agc.target_rms = self.target_rms
+            agc.max_gain = self.max_gain
+            if isinstance(agc, SmoothAGCStage):
+                timing = (self.agc_attack_ms, self.agc_release_ms, self.limiter_lookahead_ms)
+                if timing != (agc.attack_ms, agc.release_ms, agc.lookahead_ms):
+                    agc.attack_ms, agc.release_ms, agc.lookahead_ms = timing
+                    agc.reset()  # 时间常数/延迟线长度变化，下一块重新初始化状态
+                agc.gate_threshold = self.gate_threshold
+        denoise = self.pipeline.get_stage('denoise')
+        if denoise:
+            if self.enable_denoise and (method_changed or not denoise.enabled):
+                denoise.enabled = True
+                denoise.configure(self.denoise_method, self.rnnoise_lib_path)
+            denoise.enabled = self.enable_denoise and denoise.enabled
+            self.enable_denoise = denoise.enabled
+
+    def add_stage(self, stage, before=None, after=None):
+        """向预处理流水线插入自定义阶段（无需新线程）"""
+        self.pipeline.add_stage(stage, before=before, after=after)
+
+    # -------- 健康指标 --------
+
+    def get_metrics(self, reset_peaks: bool = False) -> dict:
+        """拉取当前健康指标（任意线程可调用）"""
+        snap = self.metrics.snapshot(self.pipeline, self.resampler, reset_peaks=reset_peaks)
+        for tap, source, recorder in list(self._recorder_taps.values()):
+            snap.setdefault("recorders", []).append(recorder.stats())
+        return snap
+
+    def _metrics_loop(self):
+        """按固定周期发出 metricsReady；不依赖音频块到达，流停顿时仍能上报"""
+        interval = self.metrics_interval_ms / 1000.0
+        while not self._metrics_stop.wait(interval):
+            try:
+                self.metricsReady.emit(self.get_metrics(reset_peaks=True))
+            except Exception as e:
+                if self.debug:
+                    print(f"[AudioHub] 指标发送出错：{e}")
+
+    def get_resampler_stats(self):
+        """返回重采样开销（未启用重采样时为 None）"""
+        return self.resampler.stats() if self.resampler else None
+
+    # -------- 旁路 tap / 录音 --------
+
+    def add_tap(self, fn, source: str = 'raw'):
+        """
+        注册旁路 tap。
+        - source='raw'：fn(indata, t_monotonic)，在 PortAudio 回调线程中调用，indata 为设备原生采样率
+          (device_samplerate) 下的 (frames, channels)，
+          回调返回后缓冲区即失效，fn 必须自行拷贝且不得阻塞
+        - source='processed'：fn(ch, block, t_monotonic)，在处理线程中对每个活动声道调用
+        """
+        if source == 'raw':
+            self._raw_taps = self._raw_taps + (fn,)
+        elif source == 'processed':
+            self._processed_taps = self._processed_taps + (fn,)
+        else:
+            raise ValueError(f"未知的 tap 源: {source}")
 
+    def remove_tap(self, fn, source: str = 'raw'):
+        if source == 'raw':
+            self._raw_taps = tuple(t for t in self._raw_taps if t is not fn)
+        elif source == 'processed':
+            self._processed_taps = tuple(t for t in self._processed_taps if t is not fn)
 
+    def attach_recorder(self, recorder, source: str = 'raw', channel: int = 0):
+        """
+        把 ShowRecorder 挂到块流上。raw 录制全部声道；processed 录制单个声道（recorder.channels 应为 1）。
+        """
+        if source == 'raw':
+            tap = recorder.push
+        else:
+            def tap(ch, block, t, _channel=channel):
+                if ch == _channel:
+                    recorder.push(block, t)
+        if not recorder.running:
+            recorder.start()
+        self._recorder_taps[id(recorder)] = (tap, source, recorder)
+        self.add_tap(tap, source)
 
+    def detach_recorder(self, recorder):
+        entry = self._recorder_taps.pop(id(recorder), None)
+        if entry:
+            tap, source, _ = entry
+            self.remove_tap(tap, source)
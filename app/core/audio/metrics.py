@@ -0,0 +1,125 @@
+"""
+AudioHub 健康指标
+在演出中回答“STT 跟得上吗”：采集/丢弃块数、队列深度高水位、回调耗时、xrun、
+每声道电平、各预处理阶段耗时。
+
+计数器由回调线程和处理线程直接累加（GIL 下的整数/浮点更新，指标允许极小的竞态误差），
+snapshot() 可在任意线程调用，返回可 JSON 序列化的字典。
+"""
+import time
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+
+class AudioMetrics:
+    """AudioHub 的计数器与仪表集合"""
+
+    def __init__(self, channels: int):
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        self.started_at = time.monotonic()
+
+        # 回调线程
+        self.blocks_captured = 0
+        self.blocks_dropped = 0
+        self.input_overflows = 0
+        self.input_underflows = 0
+        self.callback_count = 0
+        self.callback_seconds_total = 0.0
+        self.callback_seconds_max = 0.0
+        self.queue_depth = 0
+        self.queue_high_water = 0
+
+        # 处理线程
+        self.blocks_processed = 0
+        self.process_seconds_total = 0.0
+        self.process_seconds_max = 0.0
+        self.emitted = np.zeros(self.channels, dtype=np.int64)
+        self.gated = np.zeros(self.channels, dtype=np.int64)
+        self.rms = np.zeros(self.channels, dtype=np.float32)
+        self.peak = np.zeros(self.channels, dtype=np.float32)
+        # 自上次快照以来的峰值保持
+        self._peak_hold = np.zeros(self.channels, dtype=np.float32)
+        self.latency_seconds = 0.0  # 回调入队到处理完成
+        self.latency_seconds_max = 0.0
+
+    # -------- 回调线程 --------
+
+    def on_callback(self, duration: float, status, queue_depth: int, dropped: bool):
+        self.callback_count += 1
+        self.blocks_captured += 1
+        self.callback_seconds_total += duration
+        if duration > self.callback_seconds_max:
+            self.callback_seconds_max = duration
+        if status:
+            if getattr(status, 'input_overflow', False):
+                self.input_overflows += 1
+            if getattr(status, 'input_underflow', False):
+                self.input_underflows += 1
+        if dropped:
+            self.blocks_dropped += 1
+        self.queue_depth = queue_depth
+        if queue_depth > self.queue_high_water:
+            self.queue_high_water = queue_depth
+
+    # -------- 处理线程 --------
+
+    def on_processed(self, ctx, duration: float, t_enqueued: Optional[float] = None):
+        self.blocks_processed += 1
+        self.process_seconds_total += duration
+        if duration > self.process_seconds_max:
+            self.process_seconds_max = duration
+        self.emitted += ctx.active
+        self.gated += ~ctx.active
+        self.rms = ctx.rms
+        self.peak = ctx.peak
+        np.maximum(self._peak_hold, ctx.peak, out=self._peak_hold)
+        if t_enqueued is not None:
+            self.latency_seconds = time.monotonic() - t_enqueued
+            if self.latency_seconds > self.latency_seconds_max:
+                self.latency_seconds_max = self.latency_seconds
+
+    # -------- 读取 --------
+
+    def snapshot(self, pipeline=None, resampler=None, reset_peaks: bool = False) -> Dict[str, Any]:
+        """返回当前指标。pipeline/resampler 可选，用于附带阶段耗时与重采样开销"""
+        cb = max(1, self.callback_count)
+        pb = max(1, self.blocks_processed)
+        snap = {
+            "uptime_s": time.monotonic() - self.started_at,
+            "blocks_captured": self.blocks_captured,
+            "blocks_processed": self.blocks_processed,
+            "xruns": {"input_overflow": self.input_overflows, "input_underflow": self.input_underflows},
+            "queue": {"depth": self.queue_depth, "high_water": self.queue_high_water},
+            "callback_us": {"avg": self.callback_seconds_total / cb * 1e6, "max": self.callback_seconds_max * 1e6},
+            "process_us": {"avg": self.process_seconds_total / pb * 1e6, "max": self.process_seconds_max * 1e6},
+            "latency_ms": {"last": self.latency_seconds * 1e3, "max": self.latency_seconds_max * 1e3},
+            "channels": [
+                {
+                    "channel": ch,
+                    "captured": self.blocks_captured,
+                    # 整块丢弃时所有声道一起丢
+                    "dropped": self.blocks_dropped,
+                    "emitted": int(self.emitted[ch]),
+                    "gated": int(self.gated[ch]),
+                    "rms": float(self.rms[ch]) if ch < len(self.rms) else 0.0,
+                    "peak": float(self.peak[ch]) if ch < len(self.peak) else 0.0,
+                    "peak_hold": float(self._peak_hold[ch]),
+                }
+                for ch in range(self.channels)
+            ],
+        }
+        if pipeline is not None:
+            snap["stage_us_per_block"] = pipeline.stats()["stage_us_per_block"]
+        if resampler is not None:
+            rs = resampler.stats()
+            snap["resampler"] = {
+                "cpu_us_per_block_per_channel": rs["cpu_us_per_block_per_channel"],
+                "realtime_factor": rs["realtime_factor"],
+            }
+        if reset_peaks:
+            self._peak_hold[:] = 0.0
+        return snap
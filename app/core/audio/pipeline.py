@@ -0,0 +1,463 @@
+"""
+多声道向量化预处理流水线
+每个回调大小的块只跑一次，所有声道在同一个 (frames, channels) 数组上处理，
+取代以前“每声道一个线程、各自做相同 NumPy 运算”的结构。
+
+- AudioStage：可插拔的处理阶段，新增阶段不需要新线程
+- BlockContext：在阶段之间传递的每块状态（电平、活动声道掩码、耗时）
+- AudioPipeline：按顺序执行阶段，并累计每个阶段的耗时
+"""
+import ctypes
+import os
+import time
+from ctypes import c_void_p, c_float, POINTER
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+
+try:
+    import noisereduce as nr
+    NOISEREDUCE_AVAILABLE = True
+except ImportError:
+    nr = None
+    NOISEREDUCE_AVAILABLE = False
+
+
+class RNNoiseCT:
+    """
+    Simple RNNoise binding via ctypes.
+    """
+    FRAME_SIZE = 480  # 30ms @ 16kHz
+
+    def __init__(self, lib_path: str):
+        if not os.path.isfile(lib_path):
+            raise FileNotFoundError(f"RNNoise 库文件不存在: {lib_path}")
+        self.lib = ctypes.cdll.LoadLibrary(lib_path)
+        # Setup function signatures
+        self.lib.rnnoise_create.restype = c_void_p
+        self.lib.rnnoise_destroy.argtypes = [c_void_p]
+        self.lib.rnnoise_process_frame.argtypes = [c_void_p, POINTER(c_float), POINTER(c_float)]
+        self.state = self.lib.rnnoise_create()
+
+    def filter(self, pcm_block: np.ndarray) -> np.ndarray:
+        data = pcm_block.astype(np.float32)
+        length = len(data)
+        out = np.zeros_like(data)
+        for i in range(0, length, self.FRAME_SIZE):
+            chunk = data[i:i + self.FRAME_SIZE]
+            if chunk.shape[0] < self.FRAME_SIZE:
+                padded = np.zeros(self.FRAME_SIZE, dtype=np.float32)
+                padded[:chunk.shape[0]] = chunk
+                chunk = padded
+            in_arr = (c_float * self.FRAME_SIZE)(*chunk)
+            out_arr = (c_float * self.FRAME_SIZE)()
+            self.lib.rnnoise_process_frame(self.state, in_arr, out_arr)
+            processed = np.ctypeslib.as_array(out_arr)
+            out[i:i + chunk.shape[0]] = processed[:chunk.shape[0]]
+        return out
+
+    def __del__(self):
+        try:
+            self.lib.rnnoise_destroy(self.state)
+        except Exception:
+            pass
+
+
+def _block_rms(block: np.ndarray) -> np.ndarray:
+    """每声道 RMS；einsum 一次完成平方和，避免 mean/square 产生临时数组"""
+    return np.sqrt(np.einsum('ij,ij->j', block, block) / max(1, block.shape[0]))
+
+
+def _forward_window_min(a: np.ndarray, w: int) -> np.ndarray:
+    """
+    沿 axis 0 求前向窗口最小值 out[i] = min(a[i:i+w])，输出长度 len(a)-w+1。
+    倍增法：log2(w) 次整列 np.minimum，避免逐窗口的跨步归约。
+    """
+    span, m = 1, a
+    while span * 2 <= w:
+        m = np.minimum(m[:-span], m[span:])
+        span *= 2
+    n = a.shape[0] - w + 1
+    # 两个长度为 span 的窗口覆盖 [i, i+w)
+    return np.minimum(m[:n], m[w - span:w - span + n])
+
+
+class BlockContext:
+    """单个块在流水线中的上下文"""
+
+    __slots__ = ("samplerate", "t_monotonic", "active", "rms", "peak", "stage_times")
+
+    def __init__(self, samplerate: int, channels: int, t_monotonic: float = 0.0):
+        self.samplerate = samplerate
+        self.t_monotonic = t_monotonic
+        # 活动声道掩码：VAD/静音门限会清掉对应位，后续阶段只处理活动声道
+        self.active = np.ones(channels, dtype=bool)
+        self.rms = np.zeros(channels, dtype=np.float32)
+        self.peak = np.zeros(channels, dtype=np.float32)
+        self.stage_times: Dict[str, float] = {}
+
+
+class AudioStage:
+    """
+    流水线阶段基类。
+    process() 接收 (frames, channels) float32 块，返回同形状的块（可原地修改）。
+    """
+    name = "stage"
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+
+    def process(self, block: np.ndarray, ctx: BlockContext) -> np.ndarray:
+        raise NotImplementedError
+
+    def reset(self):
+        """清除阶段内部状态（重新开始采集时调用）"""
+        pass
+
+
+class LevelMeterStage(AudioStage):
+    """计算每声道 RMS 与峰值，写入 ctx"""
+    name = "meter"
+
+    def process(self, block, ctx):
+        ctx.rms = _block_rms(block)
+        ctx.peak = np.max(np.abs(block), axis=0)
+        return block
+
+
+class EnergyVADStage(AudioStage):
+    """能量门限 VAD：RMS 低于阈值的声道本块不再下发（即原来的静音过滤）"""
+    name = "vad"
+
+    def __init__(self, threshold: float = 0.01, enabled: bool = True):
+        super().__init__(enabled)
+        self.threshold = threshold
+
+    def process(self, block, ctx):
+        ctx.active &= ctx.rms >= self.threshold
+        return block
+
+
+class DenoiseStage(AudioStage):
+    """
+    降噪阶段：noisereduce 对活动声道一次性按 (channels, frames) 处理；
+    RNNoise 每声道持有独立状态。
+    """
+    name = "denoise"
+
+    def __init__(self, method: str = 'noisereduce', channels: int = 1,
+                 rnnoise_lib_path: Optional[str] = None, enabled: bool = True, debug: bool = False):
+        super().__init__(enabled)
+        self.method = method
+        self.channels = channels
+        self.debug = debug
+        self.rnnoise_lib_path = rnnoise_lib_path
+        self._rnnoise: List[Any] = []
+        if enabled:
+            self.configure(method, rnnoise_lib_path)
+
+    def configure(self, method: str, rnnoise_lib_path: Optional[str] = None):
+        """切换降噪方法；不可用时自动关闭本阶段"""
+        self.method = method
+        self._rnnoise = []
+        if method == 'noisereduce':
+            if NOISEREDUCE_AVAILABLE:
+                print("[AudioHub] 使用 noisereduce 降噪")
+            else:
+                print("[AudioHub] WARNING: noisereduce 未安装，降噪关闭")
+                self.enabled = False
+        elif method == 'rnnoise':
+            lib_path = rnnoise_lib_path or self.rnnoise_lib_path
+            if not lib_path:
+                raise ValueError("使用 rnnoise 时必须提供 rnnoise_lib_path")
+            try:
+                self._rnnoise = [RNNoiseCT(lib_path) for _ in range(self.channels)]
+                self.rnnoise_lib_path = lib_path
+                print("[AudioHub] 使用 RNNoise 降噪")
+            except Exception as e:
+                print(f"[AudioHub] 初始化 RNNoiseCT 失败：{e}")
+                self.enabled = False
+        else:
+            raise ValueError(f"未知的降噪方法: {method}")
+
+    def process(self, block, ctx):
+        active = np.flatnonzero(ctx.active)
+        if active.size == 0:
+            return block
+        try:
+            if self.method == 'noisereduce' and NOISEREDUCE_AVAILABLE:
+                sub = block[:, active].T
+                out = nr.reduce_noise(y=sub if sub.shape[0] > 1 else sub[0], sr=ctx.samplerate, stationary=False)
+                block[:, active] = np.atleast_2d(out).T
+            elif self.method == 'rnnoise' and self._rnnoise:
+                for ch in active:
+                    block[:, ch] = self._rnnoise[ch].filter(block[:, ch])
+        except Exception as e:
+            if self.debug:
+                print(f"[AudioHub] 降噪出错：{e}")
+        return block
+
+
+class SimpleAGCStage(AudioStage):
+    """按块计算增益的 AGC（每声道独立增益，向量化）"""
+    name = "agc"
+
+    def __init__(self, target_rms: float = 0.1, max_gain: float = 10.0, enabled: bool = True):
+        super().__init__(enabled)
+        self.target_rms = target_rms
+        self.max_gain = max_gain
+
+    def process(self, block, ctx):
+        rms = _block_rms(block)
+        gain = np.where(rms > 1e-5, self.target_rms / np.maximum(rms, 1e-5), 1.0)
+        gain = np.minimum(gain, self.max_gain)
+        gain = np.where(ctx.active, gain, 1.0).astype(np.float32)
+        np.clip(block * gain, -1.0, 1.0, out=block)
+        return block
+
+
+class SmoothAGCStage(AudioStage):
+    """
+    有状态的平滑 AGC + 噪声门 + 前瞻软限幅（每声道独立，块内向量化）。
+
+    - AGC：按子帧（默认 10 ms）估计 RMS，增益以 attack/release 时间常数平滑，子帧间线性插值，块间连续
+    - 噪声门：子帧 RMS 低于 gate_threshold 时冻结 AGC 增益（不放大底噪），并平滑衰减到 gate_floor
+    - 限幅：输出延迟 lookahead_ms，增益提前下压，使峰值不超过 limiter_threshold；
+      残余过冲再经 tanh 软拐点，替代原来的 np.clip 硬削波
+    """
+    name = "agc"
+
+    def __init__(
+        self,
+        target_rms: float = 0.1,
+        max_gain: float = 10.0,
+        attack_ms: float = 10.0,
+        release_ms: float = 300.0,
+        frame_ms: float = 10.0,
+        gate_threshold: float = 0.003,
+        gate_floor: float = 0.1,
+        gate_attack_ms: float = 5.0,
+        gate_release_ms: float = 150.0,
+        lookahead_ms: float = 5.0,
+        limiter_threshold: float = 0.9,
+        enabled: bool = True,
+    ):
+        super().__init__(enabled)
+        self.target_rms = target_rms
+        self.max_gain = max_gain
+        self.attack_ms = attack_ms
+        self.release_ms = release_ms
+        self.frame_ms = frame_ms
+        self.gate_threshold = gate_threshold
+        self.gate_floor = gate_floor
+        self.gate_attack_ms = gate_attack_ms
+        self.gate_release_ms = gate_release_ms
+        self.lookahead_ms = lookahead_ms
+        self.limiter_threshold = limiter_threshold
+        self._state_key = None
+
+    def reset(self):
+        self._state_key = None
+
+    def _init_state(self, samplerate: int, channels: int):
+        self._frame = max(1, int(samplerate * self.frame_ms / 1000))
+        self._lookahead = max(1, int(samplerate * self.lookahead_ms / 1000))
+        self._ramp = ((np.arange(self._frame, dtype=np.float32) + 1) / self._frame)[None, :, None]
+        coef = lambda ms: float(np.exp(-self._frame / max(1e-6, ms * samplerate / 1000)))
+        self._a_attack, self._a_release = coef(self.attack_ms), coef(self.release_ms)
+        self._g_attack, self._g_release = coef(self.gate_attack_ms), coef(self.gate_release_ms)
+
+        self._agc = np.ones(channels, dtype=np.float32)        # 子帧级 AGC 平滑状态
+        self._gate = np.ones(channels, dtype=np.float32)       # 子帧级门限平滑状态
+        self._g_last = np.ones(channels, dtype=np.float32)     # 上一块最后一个样本的总增益（插值起点）
+        D = self._lookahead
+        self._x_delay = np.zeros((D, channels), dtype=np.float32)   # 延迟线：输入样本
+        self._g_delay = np.ones((D, channels), dtype=np.float32)    # 延迟线：对应的 AGC 增益
+        self._lim_hist = np.ones((D, channels), dtype=np.float32)   # 限幅增益平滑的历史
+        self._state_key = (samplerate, channels)
+
+    def _subframe_gains(self, block: np.ndarray) -> np.ndarray:
+        """逐子帧平滑 AGC/门限增益，返回 (frames, channels) 的逐样本增益"""
+        frames, channels = block.shape
+        F = self._frame
+        S = -(-frames // F)
+        padded = np.zeros((S * F, channels), dtype=np.float32)
+        padded[:frames] = block
+        counts = np.full(S, F, dtype=np.float32)
+        counts[-1] = frames - (S - 1) * F
+        sub = padded.reshape(S, F, channels)
+        rms = np.sqrt(np.einsum('sfc,sfc->sc', sub, sub) / counts[:, None])
+
+        desired = np.minimum(self.target_rms / np.maximum(rms, 1e-6), self.max_gain)
+        open_gate = rms >= self.gate_threshold
+        gate_target = np.where(open_gate, 1.0, self.gate_floor)
+
+        out = np.empty((S, channels), dtype=np.float32)
+        agc, gate = self._agc, self._gate
+        for k in range(S):
+            # 门限关闭时冻结 AGC，避免在静音段把底噪放大到 max_gain
+            d = np.where(open_gate[k], desired[k], agc)
+            a = np.where(d < agc, self._a_attack, self._a_release)
+            agc = a * agc + (1.0 - a) * d
+            ga = np.where(gate_target[k] < gate, self._g_attack, self._g_release)
+            gate = ga * gate + (1.0 - ga) * gate_target[k]
+            out[k] = agc * gate
+        self._agc, self._gate = agc.astype(np.float32), gate.astype(np.float32)
+
+        # 子帧之间线性插值，起点接上一块的最后增益
+        prev = np.vstack((self._g_last[None, :], out[:-1]))
+        per_sample = (prev[:, None, :] + (out - prev)[:, None, :] * self._ramp).reshape(S * F, channels)[:frames]
+        self._g_last = per_sample[-1].copy()
+        return per_sample
+
+    def process(self, block, ctx):
+        frames, channels = block.shape
+        if self._state_key != (ctx.samplerate, channels):
+            self._init_state(ctx.samplerate, channels)
+        D = self._lookahead
+        thr = self.limiter_threshold
+
+        g_in = self._subframe_gains(block)
+
+        # 延迟 D 个样本：输出第 n 个样本对应扩展序列的第 n 个（即输入 n-D）
+        x_ext = np.concatenate((self._x_delay, block), axis=0)
+        g_ext = np.concatenate((self._g_delay, g_in), axis=0)
+        self._x_delay = x_ext[-D:].copy()
+        self._g_delay = g_ext[-D:].copy()
+
+        # 前瞻限幅：输出 n 的增益取 [n, n+D] 内所需增益的最小值，再做 D 点滑动平均使过渡平滑
+        need = thr / np.maximum(np.abs(x_ext * g_ext), thr)
+        win_min = _forward_window_min(need, D + 1)
+        m_ext = np.concatenate((self._lim_hist, win_min), axis=0)
+        self._lim_hist = m_ext[-D:].copy()
+        csum = np.cumsum(np.vstack((np.zeros((1, channels), dtype=np.float64), m_ext)), axis=0)
+        lim = ((csum[D + 1:] - csum[:-D - 1]) / (D + 1)).astype(np.float32)
+
+        y = x_ext[:frames] * g_ext[:frames] * lim
+
+        # 软拐点：超过阈值的部分经 tanh 压缩，输出绝对值严格小于 1
+        over = np.abs(y) > thr
+        if np.any(over):
+            knee = 1.0 - thr
+            y[over] = np.sign(y[over]) * (thr + knee * np.tanh((np.abs(y[over]) - thr) / knee))
+
+        # 非活动声道保持原样下发（它们本块不会被发射）
+        if not ctx.active.all():
+            y[:, ~ctx.active] = block[:, ~ctx.active]
+        return y.astype(np.float32, copy=False)
+
+
+class AudioPipeline:
+    """
+    按顺序执行阶段列表。
+    用法：
+        pipe = AudioPipeline(16_000, channels=8, stages=[LevelMeterStage(), EnergyVADStage(0.01)])
+        pipe.add_stage(MyStage(), before="vad")
+        out, ctx = pipe.process(block)
+        for ch in np.flatnonzero(ctx.active): ...
+    """
+
+    def __init__(self, samplerate: int, channels: int, stages: Optional[List[AudioStage]] = None):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.stages: List[AudioStage] = list(stages or [])
+        self._stage_seconds: Dict[str, float] = {}
+        self._blocks = 0
+
+    # -------- 阶段管理 --------
+
+    def get_stage(self, name: str) -> Optional[AudioStage]:
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        return None
+
+    def add_stage(self, stage: AudioStage, before: Optional[str] = None, after: Optional[str] = None):
+        """插入阶段；未指定位置时追加到末尾"""
+        anchor = before or after
+        if anchor is None:
+            self.stages.append(stage)
+            return
+        for i, s in enumerate(self.stages):
+            if s.name == anchor:
+                self.stages.insert(i if before else i + 1, stage)
+                return
+        raise ValueError(f"找不到阶段: {anchor}")
+
+    def remove_stage(self, name: str) -> bool:
+        for i, s in enumerate(self.stages):
+            if s.name == name:
+                del self.stages[i]
+                return True
+        return False
+
+    def reset(self):
+        for stage in self.stages:
+            stage.reset()
+
+    # -------- 处理 --------
+
+    def process(self, block: np.ndarray, t_monotonic: float = 0.0):
+        """处理一个 (frames, channels) 块，返回 (处理后的块, BlockContext)"""
+        ctx = BlockContext(self.samplerate, self.channels, t_monotonic)
+        block = np.array(block, dtype=np.float32, copy=True, order='C')
+        if block.ndim == 1:
+            block = block[:, None]
+        for stage in self.stages:
+            if not stage.enabled:
+                continue
+            t0 = time.perf_counter()
+            block = stage.process(block, ctx)
+            dt = time.perf_counter() - t0
+            ctx.stage_times[stage.name] = dt
+            self._stage_seconds[stage.name] = self._stage_seconds.get(stage.name, 0.0) + dt
+        self._blocks += 1
+        return block, ctx
+
+    def stats(self) -> Dict[str, Any]:
+        """每个阶段的平均耗时（µs/块）"""
+        n = max(1, self._blocks)
+        return {
+            "blocks": self._blocks,
+            "stage_us_per_block": {k: v / n * 1e6 for k, v in self._stage_seconds.items()},
+        }
+
+
+def benchmark_pipeline(seconds: float = 10.0, frames_per_block: int = 1024, samplerate: int = 16_000):
+    """
+    比较向量化流水线与旧的“每声道独立处理”方式在 1–16 声道下的吞吐。
+    只测 NumPy 部分（电平、门限、AGC），不含降噪；另报告平滑 AGC/限幅阶段的单独开销。
+    """
+    print("🧪 AudioPipeline 吞吐测试\n")
+    n_blocks = int(seconds * samplerate / frames_per_block)
+    for channels in (1, 2, 4, 8, 16):
+        blk = (np.random.randn(frames_per_block, channels) * 0.05).astype(np.float32)
+        pipe = AudioPipeline(samplerate, channels, [LevelMeterStage(), EnergyVADStage(0.01), SimpleAGCStage()])
+        t0 = time.perf_counter()
+        for _ in range(n_blocks):
+            pipe.process(blk)
+        vec = time.perf_counter() - t0
+
+        # 旧结构：每声道各自计算 RMS、门限、AGC
+        t0 = time.perf_counter()
+        for _ in range(n_blocks):
+            for ch in range(channels):
+                x = blk[:, ch].copy()
+                if np.sqrt(np.mean(x ** 2)) < 0.01:
+                    continue
+                rms = np.sqrt(np.mean(x ** 2))
+                np.clip(x * min(0.1 / rms, 10.0), -1.0, 1.0)
+        per_ch = time.perf_counter() - t0
+
+        smooth = AudioPipeline(samplerate, channels, [SmoothAGCStage()])
+        for _ in range(n_blocks):
+            smooth.process(blk)
+        agc_us = smooth.stats()["stage_us_per_block"]["agc"]
+
+        audio = n_blocks * frames_per_block / samplerate
+        print(f"   {channels:>2} ch: 向量化 {audio / vec:8.0f}x 实时, 逐声道 {audio / per_ch:8.0f}x 实时, "
+              f"加速 {per_ch / vec:4.1f}x, 平滑AGC {agc_us:7.1f} µs/块")
+
+
+if __name__ == "__main__":
+    benchmark_pipeline()
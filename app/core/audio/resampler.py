@@ -0,0 +1,170 @@
+"""
+有状态多相（polyphase）重采样器
+让 AudioHub 以声卡原生采样率（44.1/48 kHz 等）采集，再统一转换到 STT 需要的 16 kHz。
+
+- 有理数比 L/M 的多相 FIR，原型滤波器为 Kaiser 窗 sinc
+- 所有声道一次性向量化处理 (frames, channels)
+- 块间保留输入历史与相位，连续块之间无接缝
+- 记录每次调用的 CPU 时间，可按声道报告开销
+"""
+import time
+from math import gcd, ceil
+from typing import Dict, Any
+
+import numpy as np
+
+
+class PolyphaseResampler:
+    """
+    用法：
+        rs = PolyphaseResampler(48_000, 16_000, channels=8)
+        out = rs.process(block)      # block: (frames, 8) float32 -> (≈frames/3, 8)
+        print(rs.stats())
+    """
+
+    def __init__(
+        self,
+        in_rate: int,
+        out_rate: int,
+        channels: int = 1,
+        zero_crossings: int = 16,
+        rolloff: float = 0.92,
+        kaiser_beta: float = 8.0,
+    ):
+        """
+        Args:
+            in_rate: 输入采样率（声卡原生）
+            out_rate: 输出采样率
+            channels: 声道数
+            zero_crossings: 原型 sinc 单侧过零点数，越大过渡带越窄、CPU 越高
+            rolloff: 截止频率相对输出奈奎斯特频率的比例
+            kaiser_beta: Kaiser 窗参数（8.0 约 80 dB 阻带衰减）
+        """
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        self.channels = int(channels)
+
+        g = gcd(self.in_rate, self.out_rate)
+        self.up = self.out_rate // g     # L
+        self.down = self.in_rate // g    # M
+
+        self._H = self._design_polyphase(zero_crossings, rolloff, kaiser_beta)
+        self.taps_per_phase = self._H.shape[1]
+
+        # 块间状态：最近 K-1 个输入样本 + 下一个输出在上采样域中相对当前块起点的位置
+        self._history = np.zeros((self.taps_per_phase - 1, self.channels), dtype=np.float32)
+        self._pos = 0
+
+        # 开销统计
+        self._calls = 0
+        self._cpu_seconds = 0.0
+        self._in_frames = 0
+        self._out_frames = 0
+
+    def _design_polyphase(self, zero_crossings: int, rolloff: float, beta: float) -> np.ndarray:
+        """设计原型低通并拆分为 (L, K) 的多相矩阵"""
+        L, M = self.up, self.down
+        # 上采样域内的截止频率（以周期/样本计，奈奎斯特 = 0.5）
+        fc = 0.5 * rolloff / max(L, M)
+        half = zero_crossings * max(L, M)
+        n = np.arange(-half, half + 1, dtype=np.float64)
+        h = 2 * fc * np.sinc(2 * fc * n) * np.kaiser(len(n), beta)
+        h *= L  # 补偿插零带来的增益损失
+
+        K = ceil(len(h) / L)
+        padded = np.zeros(K * L, dtype=np.float64)
+        padded[:len(h)] = h
+        # H[p, k] = h[p + k*L]
+        return padded.reshape(K, L).T.astype(np.float32).copy()
+
+    @property
+    def ratio(self) -> float:
+        return self.out_rate / self.in_rate
+
+    @property
+    def passthrough(self) -> bool:
+        return self.up == self.down
+
+    def reset(self):
+        self._history[:] = 0.0
+        self._pos = 0
+
+    def output_frames_for(self, in_frames: int) -> int:
+        """给定输入帧数，当前状态下会产生的输出帧数"""
+        span = in_frames * self.up - self._pos
+        return max(0, -(-span // self.down))
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """
+        重采样一个 (frames, channels) 块（1D 视为单声道）。返回 float32 (out_frames, channels)。
+        """
+        t0 = time.perf_counter()
+        x = np.asarray(block, dtype=np.float32)
+        if x.ndim == 1:
+            x = x[:, None]
+        frames = x.shape[0]
+
+        if self.passthrough:
+            out = x
+        else:
+            L, M, K = self.up, self.down, self.taps_per_phase
+            buf = np.concatenate((self._history, x), axis=0)
+            n_out = self.output_frames_for(frames)
+
+            t = self._pos + np.arange(n_out, dtype=np.int64) * M
+            base = t // L
+            phase = t % L
+            # 每个输出对应 buf 中 K 个输入样本（倒序与滤波器系数对齐）
+            idx = base[:, None] + (K - 1) - np.arange(K, dtype=np.int64)[None, :]
+            # 批量矩阵乘 (n,1,K) @ (n,K,C)，比 einsum 在多声道下快数倍
+            out = np.matmul(self._H[phase][:, None, :], buf[idx])[:, 0, :]
+
+            self._pos = int(self._pos + n_out * M - frames * L)
+            self._history = buf[-(K - 1):].copy() if K > 1 else self._history
+
+        self._calls += 1
+        self._in_frames += frames
+        self._out_frames += out.shape[0]
+        self._cpu_seconds += time.perf_counter() - t0
+        return out
+
+    def stats(self) -> Dict[str, Any]:
+        """报告累计 CPU 开销"""
+        audio_seconds = self._in_frames / self.in_rate if self.in_rate else 0.0
+        per_call_us = self._cpu_seconds / self._calls * 1e6 if self._calls else 0.0
+        return {
+            "in_rate": self.in_rate,
+            "out_rate": self.out_rate,
+            "up": self.up,
+            "down": self.down,
+            "taps_per_phase": self.taps_per_phase,
+            "channels": self.channels,
+            "calls": self._calls,
+            "cpu_ms_total": self._cpu_seconds * 1e3,
+            "cpu_us_per_block": per_call_us,
+            "cpu_us_per_block_per_channel": per_call_us / max(1, self.channels),
+            # CPU 时间 / 音频时长，越小越好；按声道平摊
+            "realtime_factor": self._cpu_seconds / audio_seconds if audio_seconds else 0.0,
+            "realtime_factor_per_channel": (self._cpu_seconds / audio_seconds / max(1, self.channels))
+                                           if audio_seconds else 0.0,
+        }
+
+
+def benchmark_resampler(seconds: float = 10.0, block_ms: float = 64.0):
+    """对常见声卡采样率与声道数测量重采样开销"""
+    print("🧪 PolyphaseResampler 开销测试\n")
+    for in_rate in (44_100, 48_000, 96_000):
+        for channels in (1, 2, 8, 16):
+            rs = PolyphaseResampler(in_rate, 16_000, channels=channels)
+            frames = int(in_rate * block_ms / 1000)
+            blk = (np.random.randn(frames, channels) * 0.1).astype(np.float32)
+            for _ in range(int(seconds * 1000 / block_ms)):
+                rs.process(blk)
+            s = rs.stats()
+            print(f"   {in_rate:>6} Hz x {channels:>2} ch: "
+                  f"{s['cpu_us_per_block_per_channel']:8.1f} µs/块/声道, "
+                  f"RTF/声道={s['realtime_factor_per_channel']:.5f}, K={s['taps_per_phase']}")
+
+
+if __name__ == "__main__":
+    benchmark_resampler()
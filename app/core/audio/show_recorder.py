@@ -0,0 +1,322 @@
+"""
+演出录音器
+作为 AudioHub 的旁路 sink，把原始（或预处理后的）多声道音频落盘，用于构建回放基准测试。
+
+- 回调线程里只做一次拷贝 + 非阻塞入队，永远不等待磁盘
+- 独立写线程把小块攒成大块后批量写入 WAV / RF64 分段文件
+- 每个分段在 sidecar 索引（JSON Lines）中记录单调时钟时间戳；每段连续音频一条记录，
+  块之间有丢块或时间戳跳变时另起一条，回放时每条记录的时间戳都准确
+- 内存预算有上限，超出时丢块并计数；预算计数不加锁：回调线程只写入队总量，写线程只写释放总量
+- 可选：分段关闭后在后台进程中转码为 FLAC
+"""
+import json
+import os
+import queue
+import threading
+import time
+import wave
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+try:
+    import soundfile as sf
+    SOUNDFILE_AVAILABLE = True
+except ImportError:
+    sf = None
+    SOUNDFILE_AVAILABLE = False
+
+
+_SUBTYPE_BYTES = {'PCM_16': 2, 'PCM_24': 3, 'PCM_32': 4, 'FLOAT': 4, 'DOUBLE': 8}
+_TRANSCODE_BLOCK_FRAMES = 65536
+# 相邻块的时间戳与按帧数推算的时间相差超过块时长的这一比例时，视为中间有缺失
+_GAP_TOLERANCE = 0.5
+
+
+def _transcode_to_flac(wav_path: str, flac_path: str, delete_source: bool) -> str:
+    """
+    在后台进程中把一个 WAV/RF64 分段转码为 FLAC（模块级函数，便于进程池序列化）。
+    分块读写，15 分钟的多声道分段也不会整段载入内存。
+    """
+    with sf.SoundFile(wav_path) as src, sf.SoundFile(  # type: ignore
+        flac_path, mode='w', samplerate=src.samplerate, channels=src.channels,
+        format='FLAC', subtype='PCM_24'
+    ) as dst:
+        for block in src.blocks(blocksize=_TRANSCODE_BLOCK_FRAMES, dtype='int32', always_2d=True):
+            dst.write(block)
+    if delete_source:
+        os.remove(wav_path)
+    return flac_path
+
+
+class ShowRecorder:
+    """
+    演出录音 sink。
+
+    用法：
+        rec = ShowRecorder("recordings", samplerate=48000, channels=8)
+        hub.attach_recorder(rec)          # 订阅原始块流
+        ...
+        hub.detach_recorder(rec)
+        rec.stop()
+
+    push() 可以在 PortAudio 回调线程中直接调用：它只做一次拷贝与无锁等待的入队，
+    超出内存预算时丢弃该块并累加 dropped_blocks。push() 应只由一个线程（音频回调）调用。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        samplerate: int,
+        channels: int,
+        session_name: Optional[str] = None,
+        segment_seconds: float = 900.0,
+        write_chunk_seconds: float = 2.0,
+        max_buffer_bytes: int = 64 * 1024 * 1024,
+        subtype: str = 'PCM_24',
+        enable_flac: bool = False,
+        keep_wav_after_flac: bool = False,
+    ):
+        self.directory = Path(directory)
+        self.samplerate = int(samplerate)
+        self.channels = int(channels)
+        self.session_name = session_name or datetime.now().strftime("show_%Y%m%d_%H%M%S")
+        self.segment_frames = max(1, int(segment_seconds * self.samplerate))
+        self.write_chunk_frames = max(1, int(write_chunk_seconds * self.samplerate))
+        self.max_buffer_bytes = max_buffer_bytes
+        self.subtype = subtype
+        self.enable_flac = enable_flac
+        self.keep_wav_after_flac = keep_wav_after_flac
+
+        if self.enable_flac and not SOUNDFILE_AVAILABLE:
+            print("[ShowRecorder] WARNING: soundfile 未安装，FLAC 转码关闭")
+            self.enable_flac = False
+
+        # 回调线程 -> 写线程
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        # 内存预算：每个计数只有一个线程写，另一方只读，无需加锁。
+        # 回调线程读到的释放量可能略旧，只会高估占用（偏向丢块），不会超出预算
+        self._queued_bytes = 0    # 累计入队字节（仅回调线程写）
+        self._released_bytes = 0  # 累计写出字节（仅写线程写）
+
+        # 统计
+        self.pushed_blocks = 0    # 仅回调线程写
+        self.dropped_blocks = 0   # 仅回调线程写
+        self.written_frames = 0
+        self.written_bytes = 0
+        self._dropped_reported = 0  # 已记入索引的丢块数（仅写线程写）
+
+        # 分段状态（仅写线程访问）
+        self._segment_index = -1
+        self._segment_frames_written = 0
+        self._segment_path: Optional[Path] = None
+        self._writer = None
+        self._index_file = None
+
+        self._flac_pool: Optional[ProcessPoolExecutor] = None
+        self._flac_jobs: List[Any] = []
+
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    # -------- 生命周期 --------
+
+    def start(self):
+        if self._running:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        index_path = self.directory / f"{self.session_name}.index.jsonl"
+        # 索引行很短，行缓冲即可保证崩溃时丢失最少
+        self._index_file = open(index_path, 'a', encoding='utf-8', buffering=1)
+        if self.enable_flac:
+            self._flac_pool = ProcessPoolExecutor(max_workers=1)
+        self._running = True
+        self._thread = threading.Thread(target=self._writer_loop, name="ShowRecorderWriter", daemon=True)
+        self._thread.start()
+        fmt = 'RF64' if SOUNDFILE_AVAILABLE else 'WAV(int16)'
+        print(f"[ShowRecorder] Started: {self.session_name}, {self.channels} ch @ {self.samplerate} Hz, {fmt}")
+
+    def stop(self):
+        if not self._running:
+            return
+        self._running = False
+        self._queue.put(None)
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._flac_pool:
+            self._flac_pool.shutdown(wait=True)
+            self._flac_pool = None
+        if self._index_file:
+            self._index_file.close()
+            self._index_file = None
+        print(f"[ShowRecorder] Stopped: {self.written_frames} frames written, {self.dropped_blocks} blocks dropped")
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    # -------- 数据入口（回调线程） --------
+
+    def push(self, block: np.ndarray, t_monotonic: Optional[float] = None):
+        """
+        接收一个 (frames, channels) 或 1D 的 float32 块。非阻塞，可在音频回调中调用。
+        """
+        if not self._running:
+            return
+        if t_monotonic is None:
+            t_monotonic = time.monotonic()
+        nbytes = block.nbytes
+        if self._queued_bytes - self._released_bytes + nbytes > self.max_buffer_bytes:
+            self.dropped_blocks += 1
+            return
+        self._queued_bytes += nbytes
+        self.pushed_blocks += 1
+        # 附带此前的累计丢块数，写线程据此判断块之间是否有缺失
+        self._queue.put((t_monotonic, block.copy(), self.dropped_blocks))
+
+    def stats(self) -> Dict[str, Any]:
+        """返回录音统计（可在任意线程调用）"""
+        return {
+            "session": self.session_name,
+            "pushed_blocks": self.pushed_blocks,
+            "dropped_blocks": self.dropped_blocks,
+            "written_frames": self.written_frames,
+            "written_seconds": self.written_frames / self.samplerate,
+            "written_bytes": self.written_bytes,
+            "buffered_bytes": self._queued_bytes - self._released_bytes,
+            "segment": self._segment_index,
+        }
+
+    # -------- 写线程 --------
+
+    def _writer_loop(self):
+        pending: List[Tuple[float, np.ndarray, int]] = []
+        pending_frames = 0
+        while True:
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                break
+            if item:
+                t, block, dropped = item
+                if block.ndim == 1:
+                    block = block[:, None]
+                pending.append((t, block, dropped))
+                pending_frames += block.shape[0]
+            # 攒够一大块再写；空闲超时也把残留刷出去
+            if pending and (pending_frames >= self.write_chunk_frames or not item):
+                self._write_chunk(pending)
+                pending, pending_frames = [], 0
+        if pending:
+            self._write_chunk(pending)
+        self._close_segment()
+
+    def _write_chunk(self, items: List[Tuple[float, np.ndarray, int]]):
+        """按连续段写出：块之间有丢块或时间戳跳变处断开，每段用自己首块的时间戳"""
+        start = 0
+        for i in range(1, len(items) + 1):
+            if i < len(items):
+                prev_t, prev_block, _ = items[i - 1]
+                t, _, dropped = items[i]
+                duration = prev_block.shape[0] / self.samplerate
+                if dropped == items[i - 1][2] and abs(t - prev_t - duration) <= duration * _GAP_TOLERANCE:
+                    continue
+            run = items[start:i]
+            blocks = [block for _, block, _ in run]
+            self._write_run(blocks, run[0][0], run[0][2])
+            self._released_bytes += sum(b.nbytes for b in blocks)
+            start = i
+
+    def _write_run(self, blocks: List[np.ndarray], t0: float, dropped: int):
+        data = np.concatenate(blocks, axis=0) if len(blocks) > 1 else blocks[0]
+        offset = 0
+        while offset < data.shape[0]:
+            if self._writer is None or self._segment_frames_written >= self.segment_frames:
+                self._close_segment()
+                self._open_segment(t0 + offset / self.samplerate)
+            n = min(data.shape[0] - offset, self.segment_frames - self._segment_frames_written)
+            part = data[offset:offset + n]
+            try:
+                self._write_frames(part)
+            except Exception as e:
+                print(f"[ShowRecorder] 写入失败：{e}")
+                break
+            self._log_index({
+                "event": "chunk",
+                "segment": self._segment_index,
+                "frame_offset": self._segment_frames_written,
+                "frames": n,
+                "t_monotonic": t0 + offset / self.samplerate,
+                "dropped_before": dropped - self._dropped_reported,
+            })
+            self._dropped_reported = dropped
+            self._segment_frames_written += n
+            self.written_frames += n
+            offset += n
+
+    def _write_frames(self, part: np.ndarray):
+        if SOUNDFILE_AVAILABLE:
+            self._writer.write(part)
+            self.written_bytes += part.shape[0] * self.channels * _SUBTYPE_BYTES.get(self.subtype, 4)
+        else:
+            pcm = (np.clip(part, -1.0, 1.0) * 32767).astype('<i2')
+            raw = pcm.tobytes()
+            self._writer.writeframesraw(raw)
+            self.written_bytes += len(raw)
+
+    def _open_segment(self, t_monotonic: float):
+        self._segment_index += 1
+        self._segment_frames_written = 0
+        name = f"{self.session_name}_{self._segment_index:04d}.wav"
+        self._segment_path = self.directory / name
+        if SOUNDFILE_AVAILABLE:
+            # RF64 在 4 GB 以内与普通 WAV 兼容，超过后仍可继续写
+            self._writer = sf.SoundFile(  # type: ignore
+                str(self._segment_path), mode='w', samplerate=self.samplerate,
+                channels=self.channels, subtype=self.subtype, format='RF64'
+            )
+        else:
+            # 标准库后备：16 位 WAV，依赖分段保持在 4 GB 以内
+            self._writer = wave.open(str(self._segment_path), 'wb')
+            self._writer.setnchannels(self.channels)
+            self._writer.setsampwidth(2)
+            self._writer.setframerate(self.samplerate)
+        self._log_index({
+            "event": "segment_open",
+            "segment": self._segment_index,
+            "file": name,
+            "samplerate": self.samplerate,
+            "channels": self.channels,
+            "t_monotonic": t_monotonic,
+            "wallclock": datetime.now().isoformat(),
+        })
+
+    def _close_segment(self):
+        if self._writer is None:
+            return
+        try:
+            self._writer.close()
+        except Exception as e:
+            print(f"[ShowRecorder] 关闭分段失败：{e}")
+        self._log_index({
+            "event": "segment_close",
+            "segment": self._segment_index,
+            "frames": self._segment_frames_written,
+        })
+        if self._flac_pool and self._segment_path:
+            flac_path = self._segment_path.with_suffix('.flac')
+            self._flac_jobs.append(self._flac_pool.submit(
+                _transcode_to_flac, str(self._segment_path), str(flac_path), not self.keep_wav_after_flac
+            ))
+        self._writer = None
+        self._segment_path = None
+
+    def _log_index(self, record: Dict[str, Any]):
+        if self._index_file:
+            self._index_file.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -17,6 +17,7 @@ import inspect
 from PySide6.QtCore import QObject, Signal, Slot, QTimer
 
 from app.models.models import Cue
+from app.data.cue_index import CueIndex
 
 
 class ProposalSource(Enum):
@@ -156,6 +157,7 @@ class Director(QObject):
         # === 模块引用 ===
         self.aligner = None  # Aligner实例引用，用于双向通信
         self.cues_list: List[Cue] = []  # Cue列表，用于索引查找
+        self.cue_index: Optional[CueIndex] = None  # 台词 id → 位置索引
         
         # === 提案管理 ===
         self.proposal_history: List[CueProposal] = []
@@ -239,16 +241,16 @@ class Director(QObject):
             aligner.suggestionReady.connect(self.receive_match_proposal)
             print("[Director] Connected to Aligner via suggestionReady signal")
     
-    def set_cues_list(self, cues: List[Cue]):
-        """设置Cue列表，用于索引查找"""
+    def set_cues_list(self, cues: List[Cue], cue_index: Optional[CueIndex] = None):
+        """设置Cue列表及其 id 索引（通常是 ScriptData.cue_index），用于索引查找"""
         self.cues_list = cues
+        self.cue_index = cue_index if cue_index is not None else CueIndex(cues, parent=self)
     
     def _find_cue_index(self, target_cue: Cue) -> Optional[int]:
         """在Cue列表中查找指定Cue的索引"""
-        for i, cue in enumerate(self.cues_list):
-            if cue.id == target_cue.id:
-                return i
-        return None
+        if self.cue_index is None:
+            self.cue_index = CueIndex(self.cues_list, parent=self)
+        return self.cue_index.find(self.cues_list, target_cue.id)
     
     @Slot(Cue, str)
     def receive_manual_proposal(self, target_cue: Cue, reason: str = ""):
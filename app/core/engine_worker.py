@@ -70,9 +70,10 @@ class EngineWorkerThread(QThread):
                     raise Exception(f"所有STT引擎都无法初始化: {e2}")
             
             # 创建对齐器
+            from app.core.g2p.g2p_service import get_g2p_service
             self.aligner = Aligner(
                 cues=script_data.cues,
-                g2p_converter=g2p_converter,
+                g2p_converter=get_g2p_service(g2p_converter),
                 debug=True
             )
             
@@ -0,0 +1,122 @@
+"""
+台词特征增量更新
+编辑表格后只为受影响的台词重算音素、头尾词和 n-gram，不再重跑整本剧本的加载流程：
+
+- ScriptTableModel 在 setData / add_cue / remove_cue / move_cue 时记录脏台词并发出 featuresDirty
+- 去抖后在后台线程用 EnhancedScriptLoader.recompute_cue_features 只重算这些台词（基于快照，不碰实时数据）
+- 结果回到 GUI 线程后一次性写回：持有所有对齐器的锁写字段，再增量更新 IDF 和目标条目，
+  对齐线程不会看到写了一半的台词
+- 计算期间台词又被改动的结果直接丢弃（该台词已重新标脏，会在下一轮重算）
+"""
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Any, Callable, List, Optional, Tuple
+
+from PySide6.QtCore import QObject, QTimer, Signal, Slot
+
+from app.models.models import Cue
+
+# 由加载器生成、需要随台词文本一起更新的字段
+FEATURE_FIELDS = (
+    "pure_line", "phonemes",
+    "head_tok", "head_phonemes", "tail_tok", "tail_phonemes",
+    "line_ngram", "line_ngram_phonemes",
+)
+
+
+class IncrementalFeatureUpdater(QObject):
+    """监听 ScriptTableModel 的脏标记，在后台只重算被编辑的台词"""
+
+    featuresUpdated = Signal(int)       # 写回的台词数
+    updateFailed = Signal(str)
+    _jobFinished = Signal(object, object)  # (快照, 结果或异常)，从工作线程回到 GUI 线程
+
+    def __init__(self, model, loader_factory: Callable[[], Any],
+                 aligners_provider: Optional[Callable[[], List[Any]]] = None,
+                 debounce_ms: int = 300, parent: Optional[QObject] = None):
+        """
+        Args:
+            model: ScriptTableModel
+            loader_factory: 在工作线程中调用，返回使用当前 G2P 引擎的 EnhancedScriptLoader
+            aligners_provider: 返回当前共享这份台词列表的对齐器（可为空列表）
+            debounce_ms: 连续编辑合并为一次重算的等待时间
+        """
+        super().__init__(parent)
+        self.model = model
+        self.loader_factory = loader_factory
+        self.aligners_provider = aligners_provider or (lambda: [])
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="features")
+        self._running = False
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(debounce_ms)
+        self._timer.timeout.connect(self._start_job)
+
+        self._jobFinished.connect(self._on_job_finished)
+        model.featuresDirty.connect(self._timer.start)
+
+    @Slot()
+    def _start_job(self):
+        if self._running or not self.model.has_dirty_features():
+            return
+        dirty, removed = self.model.take_feature_changes()
+        # 快照：(实时台词对象, 提交时的文本)
+        snapshot: List[Tuple[Cue, str]] = [(cue, cue.line) for cue in dirty]
+        inputs = [Cue(id=cue.id, character=cue.character, line=line) for cue, line in snapshot]
+        self._running = True
+
+        def _compute():
+            if not inputs:
+                return []
+            return self.loader_factory().recompute_cue_features(inputs)
+
+        def _done(f: Future):
+            self._jobFinished.emit((snapshot, removed), f.exception() or f.result())
+
+        self._pool.submit(_compute).add_done_callback(_done)
+
+    @Slot(object, object)
+    def _on_job_finished(self, job, outcome):
+        self._running = False
+        snapshot, removed = job
+        if isinstance(outcome, Exception):
+            logging.error(f"增量特征重算失败: {outcome}")
+            # 删除不依赖重算结果：照常撤回已删除台词的统计，否则对齐器的词频永远不会减少
+            if removed:
+                self._write_back([], removed)
+            self.updateFailed.emit(str(outcome))
+        else:
+            self._apply(snapshot, outcome, removed)
+        # 计算期间产生的新脏标记
+        if self.model.has_dirty_features():
+            self._timer.start()
+
+    def _apply(self, snapshot: List[Tuple[Cue, str]], results: List[Cue], removed: List[Cue]):
+        live = {id(cue) for cue in self.model.get_cues()}
+        updates = [(cue, new) for (cue, line), new in zip(snapshot, results)
+                   if id(cue) in live and cue.line == line]
+        self._write_back(updates, removed)
+
+        self.model.notify_features_updated([cue for cue, _ in updates])
+        logging.info(f"增量特征重算: 更新 {len(updates)} 条，删除 {len(removed)} 条，"
+                     f"过期丢弃 {len(snapshot) - len(updates)} 条")
+        self.featuresUpdated.emit(len(updates))
+
+    def _write_back(self, updates: List[Tuple[Cue, Cue]], removed: List[Cue]):
+        """持有所有对齐器的锁写入特征字段，再增量更新它们的统计"""
+        aligners = [a for a in self.aligners_provider() if a is not None]
+        with ExitStack() as stack:
+            for aligner in aligners:
+                stack.enter_context(aligner.cue_update_lock())
+            for cue, new in updates:
+                for name in FEATURE_FIELDS:
+                    setattr(cue, name, getattr(new, name))
+            changed = [cue for cue, _ in updates]
+            for aligner in aligners:
+                aligner.update_cue_statistics(changed, removed)
+
+    def shutdown(self):
+        self._timer.stop()
+        self._pool.shutdown(wait=False)
@@ -1,10 +1,13 @@
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Tuple
 
 class G2PConverter(ABC):
     """
     G2P（字素到音素）转换器的抽象基类接口。
     """
+    # 提供引擎版本号的 pip 包名（子类覆盖），用于缓存失效判断
+    engine_package: str = ""
+
     @abstractmethod
     def convert(self, text: str) -> str:
         """转换单个文本字符串。"""
@@ -15,4 +18,18 @@ class G2PConverter(ABC):
         （可选优化）批量转换文本字符串列表。
         如果子类不实现，则默认逐个调用convert方法。
         """
-        return [self.convert(text) for text in texts]
\ No newline at end of file
+        return [self.convert(text) for text in texts]
+
+    def get_engine_identity(self) -> Tuple[str, str, str]:
+        """
+        返回 (引擎名, 引擎版本, 语言)，作为持久化缓存的命名空间。
+        引擎升级或切换语言后，旧缓存条目自然不再命中。
+        """
+        version = ""
+        if self.engine_package:
+            try:
+                from importlib.metadata import version as _pkg_version
+                version = _pkg_version(self.engine_package)
+            except Exception:
+                version = "unknown"
+        return type(self).__name__, version, str(getattr(self, 'language', ''))
@@ -1,4 +1,5 @@
-from typing import List
+import time
+from typing import List, Optional
 from .base import G2PConverter
 
 try:
@@ -17,8 +18,11 @@ class CharsiuG2P(G2PConverter):
     支持 100 种语言的字素到音素转换
     使用 Hugging Face Transformers 和预训练的 ByT5 模型
     """
+    engine_package = "transformers"
     
-    def __init__(self, model_name: str = 'charsiu/g2p_multilingual_byT5_tiny_16_layers_100', language: str = 'eng-us'):
+    def __init__(self, model_name: str = 'charsiu/g2p_multilingual_byT5_tiny_16_layers_100', language: str = 'eng-us',
+                 max_tokens: int = 8192, max_batch_size: int = 256, num_threads: Optional[int] = None,
+                 quantize: bool = False):
         """
         初始化 CharsiuG2P 转换器
         
@@ -36,6 +40,10 @@ class CharsiuG2P(G2PConverter):
                      - 'cmn': 中文（普通话）
                      - 'jpn': 日语
                      - 'kor': 韩语
+            max_tokens: 每个 generate 批次的填充后字节 token 上限（批大小 × 批内最长输入）
+            max_batch_size: 每批最多词数
+            num_threads: torch 算子内线程数（None 保持 torch 默认）
+            quantize: CPU 上对 ByT5 的 Linear 层做动态 int8 量化
         """
         if not CHARSIU_AVAILABLE:
             raise ImportError(
@@ -46,6 +54,16 @@ class CharsiuG2P(G2PConverter):
         self.model_name = model_name
         self.language = language
         self.device = 'cuda' if torch and torch.cuda.is_available() else 'cpu'
+        self.max_tokens = max_tokens
+        self.max_batch_size = max_batch_size
+        self.quantized = False
+        
+        # 吞吐统计
+        self._words_converted = 0
+        self._convert_seconds = 0.0
+        
+        if num_threads:
+            torch.set_num_threads(num_threads)  # type: ignore
         
         print(f"[CharsiuG2P] Initializing model: {model_name}")
         print(f"[CharsiuG2P] Language: {language}")
@@ -62,6 +80,9 @@ class CharsiuG2P(G2PConverter):
             self.model.to(self.device)
             self.model.eval()  # 设置为评估模式
             
+            if quantize:
+                self._quantize_dynamic()
+            
             print(f"[CharsiuG2P] Model loaded successfully")
             
         except Exception as e:
@@ -126,6 +147,9 @@ class CharsiuG2P(G2PConverter):
         """
         批量转换文本列表为音素列表
         
+        输入去重后按字节长度排序，切成受 max_tokens / max_batch_size 约束的批次，
+        相近长度的词同批，填充浪费小，整部剧的词表也不会一次性占满内存。
+        
         Args:
             texts: 输入文本列表
             
@@ -135,58 +159,89 @@ class CharsiuG2P(G2PConverter):
         if not texts:
             return []
         
-        try:
-            # 过滤空文本
-            non_empty_texts = [text.strip() for text in texts if text.strip()]
-            if not non_empty_texts:
-                return [''] * len(texts)
-            
-            # 批量添加语言前缀
-            formatted_texts = [f'<{self.language}>: {text}' for text in non_empty_texts]
-            
-            # 批量分词
-            inputs = self.tokenizer(
-                formatted_texts,
-                padding=True,
-                add_special_tokens=False,
-                return_tensors='pt'
+        start = time.perf_counter()
+        unique = [t for t in dict.fromkeys(text.strip() for text in texts) if t]
+        table = {}
+        for batch in self._make_batches(unique):
+            try:
+                table.update(zip(batch, self._generate_batch(batch)))
+            except Exception as e:
+                print(f"[CharsiuG2P] Error in batch conversion ({len(batch)} words): {e}")
+                # 只有出错的批次退回逐个转换
+                table.update((text, self.convert(text)) for text in batch)
+        
+        self._words_converted += len(unique)
+        self._convert_seconds += time.perf_counter() - start
+        return [table.get(text.strip(), '') for text in texts]
+    
+    def _make_batches(self, texts: List[str]) -> List[List[str]]:
+        """按字节长度从长到短排序后贪心切批"""
+        # 输入格式为 '<lang>: word'，ByT5 按 UTF-8 字节分词
+        prefix_len = len(f'<{self.language}>: '.encode('utf-8'))
+        ordered = sorted(texts, key=lambda t: len(t.encode('utf-8')), reverse=True)
+        batches: List[List[str]] = []
+        current: List[str] = []
+        longest = 0
+        for text in ordered:
+            length = prefix_len + len(text.encode('utf-8'))
+            longest_if_added = max(longest, length)
+            if current and (len(current) >= self.max_batch_size
+                            or (len(current) + 1) * longest_if_added > self.max_tokens):
+                batches.append(current)
+                current, longest_if_added = [], length
+            current.append(text)
+            longest = longest_if_added
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _generate_batch(self, texts: List[str]) -> List[str]:
+        """对一个批次执行 generate"""
+        formatted_texts = [f'<{self.language}>: {text}' for text in texts]
+        inputs = self.tokenizer(
+            formatted_texts,
+            padding=True,
+            add_special_tokens=False,
+            return_tensors='pt'
+        )
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        with torch.no_grad():  # type: ignore
+            preds = self.model.generate(
+                **inputs,
+                num_beams=1,
+                max_length=50,
+                do_sample=False
             )
-            
-            # 移动到设备
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            # 批量生成预测
-            with torch.no_grad():  # type: ignore
-                preds = self.model.generate(
-                    **inputs,
-                    num_beams=1,
-                    max_length=50,
-                    do_sample=False
-                )
-            
-            # 批量解码结果
-            phonemes_list = self.tokenizer.batch_decode(
-                preds.tolist(),
-                skip_special_tokens=True
+        return [p.strip() for p in self.tokenizer.batch_decode(preds.tolist(), skip_special_tokens=True)]
+    
+    def _quantize_dynamic(self):
+        """CPU 上把 Linear 层动态量化为 int8（GPU 上跳过）"""
+        if self.device != 'cpu':
+            print("[CharsiuG2P] int8 动态量化仅支持 CPU，已跳过")
+            return
+        try:
+            self.model = torch.quantization.quantize_dynamic(  # type: ignore
+                self.model, {torch.nn.Linear}, dtype=torch.qint8  # type: ignore
             )
-            
-            # 处理原始文本中的空白
-            result = []
-            non_empty_idx = 0
-            for text in texts:
-                if text.strip():
-                    result.append(phonemes_list[non_empty_idx].strip())
-                    non_empty_idx += 1
-                else:
-                    result.append('')
-            
-            return result
-            
+            self.quantized = True
+            print("[CharsiuG2P] ✅ 已启用 int8 动态量化")
         except Exception as e:
-            print(f"[CharsiuG2P] Error in batch conversion: {e}")
-            # 失败时逐个转换作为后备
-            return [self.convert(text) for text in texts]
+            print(f"[CharsiuG2P] ⚠️ int8 动态量化失败，使用浮点模型: {e}")
     
+    def get_throughput(self) -> dict:
+        """累计吞吐（去重后的词数 / 秒）"""
+        return {
+            'words': self._words_converted,
+            'seconds': self._convert_seconds,
+            'words_per_sec': self._words_converted / self._convert_seconds if self._convert_seconds else 0.0,
+        }
+    
+    def get_engine_identity(self):
+        """模型不同输出不同，版本中带上模型名"""
+        name, version, language = super().get_engine_identity()
+        suffix = "/int8" if self.quantized else ""
+        return name, f"{version}/{self.model_name}{suffix}", language
+
     def get_supported_languages(self) -> List[str]:
         """
         获取支持的语言代码列表
@@ -247,7 +302,11 @@ class CharsiuG2P(G2PConverter):
             'supported_languages': len(self.get_supported_languages()),
             'architecture': 'ByT5 (Byte-level T5)',
             'parameters': 'Tiny/Small variants available',
-            'multilingual': True
+            'multilingual': True,
+            'quantized': self.quantized,
+            'max_tokens': self.max_tokens,
+            'max_batch_size': self.max_batch_size,
+            'num_threads': torch.get_num_threads() if torch else None,
         }
     
     def __del__(self):
@@ -256,3 +315,34 @@ class CharsiuG2P(G2PConverter):
             del self.model
         if torch and torch.cuda.is_available():
             torch.cuda.empty_cache()  # type: ignore
+
+
+def benchmark_charsiu(words: Optional[List[str]] = None, language: str = 'fra',
+                      model_name: str = 'charsiu/g2p_multilingual_byT5_tiny_16_layers_100'):
+    """对不同线程数 / max_tokens / 量化组合测量 words/sec"""
+    if words is None:
+        base = ["bonjour", "je", "vous", "pas", "maintenant", "théâtre", "toujours", "demain",
+                "comédien", "rideau", "lumière", "extraordinairement"]
+        words = [f"{w}{i}" if i else w for i in range(40) for w in base]
+    
+    import os
+    cores = os.cpu_count() or 1
+    configs = [
+        {"num_threads": threads, "max_tokens": max_tokens, "quantize": quantize}
+        for quantize in (False, True)
+        for threads in sorted({1, max(1, cores // 2), cores})
+        for max_tokens in (4096, 16384)
+    ]
+    print(f"🧪 CharsiuG2P 吞吐测试: {len(words)} 词, 语言 {language}\n")
+    for cfg in configs:
+        g2p = CharsiuG2P(model_name=model_name, language=language, **cfg)
+        g2p.batch_convert(words[:16])  # 预热
+        g2p._words_converted, g2p._convert_seconds = 0, 0.0
+        g2p.batch_convert(words)
+        tp = g2p.get_throughput()
+        print(f"   threads={cfg['num_threads']:>2} max_tokens={cfg['max_tokens']:>5} "
+              f"int8={'是' if g2p.quantized else '否'}: {tp['words_per_sec']:8.1f} words/s")
+
+
+if __name__ == "__main__":
+    benchmark_charsiu()
@@ -1,8 +1,11 @@
-from typing import List
+from typing import List, Optional
 import os
 import sys
 import builtins
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from .base import G2PConverter
+from .epitran_worker import _worker_init, _worker_transliterate
 
 try:
     import epitran
@@ -16,8 +19,10 @@ class EpitranG2P(G2PConverter):
     基于 Epitran 库的 G2P 转换器
     支持多种语言的字素到音素转换
     """
+    engine_package = "epitran"
     
-    def __init__(self, language: str = 'fra-Latn'):
+    def __init__(self, language: str = 'fra-Latn', workers: Optional[int] = None,
+                 parallel_threshold: int = 2000):
         """
         初始化 Epitran G2P 转换器
         
@@ -31,11 +36,17 @@ class EpitranG2P(G2PConverter):
                      - 'ita-Latn': 意大利语
                      - 'cmn-Hans': 中文简体
                      - 'jpn-Jpan': 日语
+            workers: 并行批量转换的进程数（默认 CPU 核数，1 表示始终串行）
+            parallel_threshold: 去重后词数低于此值时串行处理（进程池开销大于收益）
         """
         if not EPITRAN_AVAILABLE:
             raise ImportError("Epitran library is not installed. Please run 'pip install epitran'.")
         
         self.language = language
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.parallel_threshold = parallel_threshold
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._parallel_disabled = False  # 进程池失败一次后不再尝试，避免每个大批次都重建失败
         
         try:
             # 基本的环境设置（全局monkey patch应该已在main.py中设置）
@@ -122,7 +133,43 @@ class EpitranG2P(G2PConverter):
         Returns:
             音素字符串列表
         """
-        return [self.convert(text) for text in texts]
+        unique = list(dict.fromkeys(texts))
+        if self._parallel_disabled or self.workers <= 1 or len(unique) < self.parallel_threshold:
+            return [self.convert(text) for text in texts]
+        
+        try:
+            table = dict(zip(unique, self._parallel_transliterate(unique)))
+        except Exception as e:
+            # 进程池不可用（如子进程崩溃）时退回串行
+            print(f"[EpitranG2P] ⚠️ 并行转换失败，此后改用串行: {e}")
+            self._parallel_disabled = True
+            self.cleanup()
+            return [self.convert(text) for text in texts]
+        return [table[text] for text in texts]
+    
+    def _parallel_transliterate(self, words: List[str]) -> List[str]:
+        """把去重后的词分片给进程池，按原顺序合并结果"""
+        if self._pool is None:
+            # spawn：不从带 Qt/音频线程的主进程 fork
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_worker_init,
+                initargs=(self.language,),
+            )
+        # 每个进程约 4 片，便于负载均衡；片太小时 IPC 开销占主导
+        chunk = max(256, -(-len(words) // (self.workers * 4)))
+        shards = [words[i:i + chunk] for i in range(0, len(words), chunk)]
+        results: List[str] = []
+        for part in self._pool.map(_worker_transliterate, shards):
+            results.extend(part)
+        return results
+    
+    def cleanup(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
     
     def get_available_languages(self) -> List[str]:
         """
@@ -0,0 +1,27 @@
+"""
+EpitranG2P 进程池工作函数（每个子进程各自持有一个 Epitran 实例，只初始化一次）
+
+单独成模块且不在模块顶层导入 epitran：spawn 子进程反序列化初始化函数时只导入本模块，
+这样可以先补上 main.py 的全局UTF-8编码处理，再导入 epitran。
+"""
+from typing import List
+
+_worker_epi = None
+
+
+def _worker_init(language: str):
+    global _worker_epi
+    from app.utils.encoding import setup_global_encoding
+    setup_global_encoding(verbose=False)
+    import epitran
+    _worker_epi = epitran.Epitran(language)
+
+
+def _worker_transliterate(words: List[str]) -> List[str]:
+    results = []
+    for word in words:
+        try:
+            results.append(_worker_epi.transliterate(word.strip()) if word and word.strip() else "")
+        except Exception:
+            results.append(word.strip())
+    return results
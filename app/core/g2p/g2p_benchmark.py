@@ -0,0 +1,230 @@
+"""
+G2P 引擎基准与质量测试
+在本机上用剧本的真实词表测量每个可用引擎：
+
+- 冷启动时间（导入 + 创建引擎，每个引擎在独立子进程中测量）
+- 单词 convert 与 batch_convert 的 words/sec
+- 峰值内存（RSS）
+- 引擎之间音素输出的一致性（完全相同比例 + 加权音素相似度均值）
+
+结果写入 JSON 报告（默认 cache/g2p/benchmark.json），G2PManager 会据此选择引擎。
+
+命令行：
+    python -m app.core.g2p.g2p_benchmark --script scripts/play.json
+    python -m app.core.g2p.g2p_benchmark --vocab words.txt --engines epitran phonemizer --sample 2000
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from app.utils.paths import CACHE_DIR, PROJECT_ROOT
+from .g2p_cache import extract_script_vocabulary, read_vocabulary_file
+
+DEFAULT_REPORT_PATH = CACHE_DIR / "g2p" / "benchmark.json"
+
+# 单词模式只测前若干词，避免慢引擎逐词调用耗时过长
+SINGLE_WORD_SAMPLE = 300
+BATCH_CHUNK = 1000
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位 KB，macOS 单位字节
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+
+def _run_worker(engine: str, language: str, vocab_path: str, out_path: str):
+    """子进程：测量单个引擎，结果写入 out_path"""
+    result: Dict[str, Any] = {"engine": engine, "language": language}
+    try:
+        start = time.perf_counter()
+        from app.core.g2p.g2p_manager import G2PManager
+        converter = G2PManager(use_persistent_cache=False).create_engine(engine, language)
+        result["cold_start_s"] = time.perf_counter() - start
+        result["identity"] = list(converter.get_engine_identity())
+        result["rss_after_load_mb"] = _peak_rss_mb()
+
+        with open(vocab_path, "r", encoding="utf-8") as f:
+            words = json.load(f)
+
+        sample = words[:SINGLE_WORD_SAMPLE]
+        start = time.perf_counter()
+        for w in sample:
+            converter.convert(w)
+        elapsed = time.perf_counter() - start
+        result["single_words_per_sec"] = len(sample) / elapsed if elapsed else None
+
+        phonemes: List[str] = []
+        start = time.perf_counter()
+        for i in range(0, len(words), BATCH_CHUNK):
+            phonemes.extend(converter.batch_convert(words[i:i + BATCH_CHUNK]))
+        elapsed = time.perf_counter() - start
+        result["batch_words_per_sec"] = len(words) / elapsed if elapsed else None
+        result["batch_seconds"] = elapsed
+        result["peak_rss_mb"] = _peak_rss_mb()
+        result["phonemes"] = phonemes
+        result["ok"] = True
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False)
+
+
+def _measure_engine(engine: str, language: str, vocab_path: str, timeout: float) -> Dict[str, Any]:
+    fd, out_path = tempfile.mkstemp(suffix=".json", prefix=f"g2p_{engine}_")
+    os.close(fd)
+    try:
+        # 以项目根目录为工作目录，python -m 才能找到 app 包；词表路径先转为绝对路径
+        proc = subprocess.run(
+            [sys.executable, "-m", "app.core.g2p.g2p_benchmark", "--worker", engine, language,
+             os.path.abspath(vocab_path), out_path],
+            capture_output=True, text=True, timeout=timeout, cwd=str(PROJECT_ROOT),
+        )
+        with open(out_path, "r", encoding="utf-8") as f:
+            content = f.read()
+        if not content:
+            return {"engine": engine, "language": language, "ok": False,
+                    "error": (proc.stderr or "worker produced no output").strip()[-500:]}
+        return json.loads(content)
+    except subprocess.TimeoutExpired:
+        return {"engine": engine, "language": language, "ok": False, "error": f"timeout after {timeout:.0f}s"}
+    finally:
+        try:
+            os.remove(out_path)
+        except OSError:
+            pass
+
+
+def _agreement(words: List[str], results: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """两两比较引擎输出：完全一致比例 + 加权音素相似度均值"""
+    from app.core.g2p.phoneme_inventory import PhonemeInventory
+
+    inventory = PhonemeInventory("benchmark")
+    agreement: Dict[str, Dict[str, float]] = {}
+    ok = [name for name, r in results.items() if r.get("ok")]
+    for a, b in combinations(ok, 2):
+        pa, pb = results[a]["phonemes"], results[b]["phonemes"]
+        n = min(len(pa), len(pb), len(words))
+        if n == 0:
+            continue
+        exact = sum(1 for i in range(n) if pa[i] == pb[i]) / n
+        mean_sim = sum(inventory.similarity(pa[i], pb[i]) for i in range(n)) / n
+        agreement[f"{a}|{b}"] = {"exact": exact, "mean_similarity": mean_sim, "words": n}
+    return agreement
+
+
+def run_benchmark(words: List[str], engines: Optional[List[str]] = None,
+                  languages: Optional[Dict[str, str]] = None, out_path=DEFAULT_REPORT_PATH,
+                  timeout: float = 1800.0) -> Dict[str, Any]:
+    """对每个可用引擎测量并写出报告"""
+    from app.core.g2p.g2p_manager import G2PManager, G2PEngineType
+
+    manager = G2PManager(use_persistent_cache=False)
+    if engines is None:
+        engines = [engine_type.value for engine_type, _ in manager.get_available_engines()]
+    languages = languages or {}
+
+    words = list(dict.fromkeys(w for w in words if w.strip()))
+    fd, vocab_path = tempfile.mkstemp(suffix=".json", prefix="g2p_vocab_")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(words, f, ensure_ascii=False)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for engine in engines:
+            language = languages.get(engine) or manager.engine_configs[G2PEngineType(engine)]["default_language"]
+            print(f"🧪 测量 {engine} [{language}] ...")
+            r = _measure_engine(engine, language, vocab_path, timeout)
+            results[engine] = r
+            if r.get("ok"):
+                print(f"   冷启动 {r['cold_start_s']:.2f}s | 单词 {r['single_words_per_sec'] or 0:.0f} 词/秒 | "
+                      f"批量 {r['batch_words_per_sec'] or 0:.0f} 词/秒 | 峰值内存 {r['peak_rss_mb'] or 0:.0f} MB")
+            else:
+                print(f"   ❌ {r.get('error')}")
+    finally:
+        os.remove(vocab_path)
+
+    agreement = _agreement(words, results)
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "machine": {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "vocabulary": {"words": len(words)},
+        "engines": {name: {k: v for k, v in r.items() if k != "phonemes"} for name, r in results.items()},
+        "agreement": agreement,
+    }
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n📄 报告已写入 {out_path}")
+    for pair, stats in agreement.items():
+        print(f"   {pair}: 完全一致 {stats['exact']:.1%}, 平均相似度 {stats['mean_similarity']:.3f}")
+    return report
+
+
+def load_benchmark_report(path=DEFAULT_REPORT_PATH) -> Optional[Dict[str, Any]]:
+    path = Path(path)
+    if not path.exists():
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[G2PBenchmark] ⚠️ 无法读取基准报告 {path}: {e}")
+        return None
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "--worker":
+        _run_worker(*argv[1:5])
+        return
+
+    parser = argparse.ArgumentParser(description="G2P 引擎基准与质量测试")
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--script", help="剧本 JSON 文件（使用其词表）")
+    src.add_argument("--vocab", help="词表文件（每行一个词）")
+    parser.add_argument("--engines", nargs="*", default=None, help="要测的引擎（默认全部可用引擎）")
+    parser.add_argument("--language", action="append", default=[], metavar="ENGINE=LANG",
+                        help="指定引擎语言，如 epitran=fra-Latn（可重复）")
+    parser.add_argument("--sample", type=int, default=None, help="只使用前 N 个词")
+    parser.add_argument("--out", default=str(DEFAULT_REPORT_PATH), help="报告输出路径")
+    parser.add_argument("--timeout", type=float, default=1800.0, help="单个引擎超时（秒）")
+    args = parser.parse_args(argv)
+
+    words = extract_script_vocabulary(args.script) if args.script else read_vocabulary_file(args.vocab)
+    if args.sample:
+        words = words[:args.sample]
+    languages = dict(item.split("=", 1) for item in args.language)
+    run_benchmark(words, args.engines, languages, args.out, args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,338 @@
+"""
+持久化 G2P 缓存
+词级音素表存放在 SQLite（WAL 模式），键为 (引擎, 引擎版本, 语言, 规范化词)，
+跨引擎实例、跨会话共享：重启或切换剧本后，已知词不再花费任何 G2P 时间。
+
+- PhonemeStore：SQLite 存储，每线程独立连接，多读者并发安全，写入按批提交
+- CachedG2P：包装任意 G2PConverter，先查内存，再查磁盘，最后才调用引擎
+- prewarm_*：从剧本或词表预热缓存（也可命令行使用）
+
+命令行：
+    python -m app.core.g2p.g2p_cache prewarm --engine epitran --language fra-Latn --script scripts/play.json
+    python -m app.core.g2p.g2p_cache prewarm --engine phonemizer --language fr-fr --vocab words.txt
+    python -m app.core.g2p.g2p_cache stats
+"""
+import argparse
+import atexit
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.utils.paths import CACHE_DIR
+from .base import G2PConverter
+
+DEFAULT_DB_PATH = CACHE_DIR / "g2p" / "phonemes.sqlite"
+
+# 与剧本加载器的 n-gram 清理规则一致：去标点（含"-"），保留字母、数字、中文和空格
+_PUNCT_RE = re.compile(r'[^\w\s]')
+_SPACE_RE = re.compile(r'\s+')
+
+Namespace = Tuple[str, str, str]
+
+
+def normalize_word(text: str) -> str:
+    """缓存键的规范化：NFC、去首尾空白、合并内部空白"""
+    return _SPACE_RE.sub(' ', unicodedata.normalize('NFC', text)).strip()
+
+
+def tokenize_text(text: str) -> List[str]:
+    """把一行台词切成词（与 EnhancedScriptLoader 的清理规则一致）"""
+    return [t for t in _PUNCT_RE.sub(' ', text).split() if t]
+
+
+class PhonemeStore:
+    """
+    SQLite 词级音素表。
+
+    - 每个线程使用独立连接（sqlite3 连接不能跨线程共享）
+    - WAL 模式：多个读者（含其他进程）与一个写者可同时工作
+    - put() 先进入内存缓冲，攒满 batch_size 或调用 flush() 时在一个事务中写入
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS phonemes (
+            engine   TEXT NOT NULL,
+            version  TEXT NOT NULL,
+            language TEXT NOT NULL,
+            word     TEXT NOT NULL,
+            phonemes TEXT NOT NULL,
+            PRIMARY KEY (engine, version, language, word)
+        ) WITHOUT ROWID
+    """
+    _QUERY_CHUNK = 500  # SQLite 默认参数上限 999，留出命名空间参数
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, batch_size: int = 1000):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._pending: Dict[Namespace, Dict[str, str]] = {}
+        self._pending_count = 0
+        self._write_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute(self._SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # -------- 读 --------
+
+    def get_many(self, namespace: Namespace, words: Iterable[str]) -> Dict[str, str]:
+        """批量查询，返回命中的 {word: phonemes}（含尚未落盘的缓冲条目）"""
+        words = list(words)
+        found: Dict[str, str] = {}
+        pending = self._pending.get(namespace)
+        if pending:
+            for w in words:
+                if w in pending:
+                    found[w] = pending[w]
+        missing = [w for w in words if w not in found]
+        conn = self._conn()
+        for i in range(0, len(missing), self._QUERY_CHUNK):
+            chunk = missing[i:i + self._QUERY_CHUNK]
+            marks = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT word, phonemes FROM phonemes WHERE engine=? AND version=? AND language=? "
+                f"AND word IN ({marks})",
+                (*namespace, *chunk),
+            ).fetchall()
+            found.update(rows)
+        return found
+
+    def get(self, namespace: Namespace, word: str) -> Optional[str]:
+        return self.get_many(namespace, [word]).get(word)
+
+    def count(self, namespace: Optional[Namespace] = None) -> int:
+        conn = self._conn()
+        if namespace is None:
+            return conn.execute("SELECT COUNT(*) FROM phonemes").fetchone()[0]
+        return conn.execute(
+            "SELECT COUNT(*) FROM phonemes WHERE engine=? AND version=? AND language=?", namespace
+        ).fetchone()[0]
+
+    def namespaces(self) -> List[Tuple[str, str, str, int]]:
+        return self._conn().execute(
+            "SELECT engine, version, language, COUNT(*) FROM phonemes GROUP BY engine, version, language"
+        ).fetchall()
+
+    # -------- 写 --------
+
+    def put_many(self, namespace: Namespace, items: Dict[str, str]):
+        if not items:
+            return
+        with self._write_lock:
+            self._pending.setdefault(namespace, {}).update(items)
+            self._pending_count += len(items)
+            should_flush = self._pending_count >= self.batch_size
+        if should_flush:
+            self.flush()
+
+    def put(self, namespace: Namespace, word: str, phonemes: str):
+        self.put_many(namespace, {word: phonemes})
+
+    def flush(self):
+        """把缓冲条目在一个事务中写入磁盘"""
+        with self._write_lock:
+            pending, self._pending, self._pending_count = self._pending, {}, 0
+        if not pending:
+            return
+        rows = [(*ns, w, p) for ns, items in pending.items() for w, p in items.items()]
+        conn = self._conn()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO phonemes (engine, version, language, word, phonemes) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        except sqlite3.Error as e:
+            print(f"[G2PCache] ⚠️ 写入缓存失败: {e}")
+
+    def close(self):
+        self.flush()
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_default_store: Optional[PhonemeStore] = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store() -> PhonemeStore:
+    """进程内共享的默认缓存（退出时自动落盘）"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = PhonemeStore()
+            atexit.register(_default_store.flush)
+        return _default_store
+
+
+class CachedG2P(G2PConverter):
+    """
+    为任意 G2PConverter 加上内存 + 持久化两级缓存。
+    未覆盖的属性/方法透明转发给被包装的引擎。
+    """
+
+    def __init__(self, converter: G2PConverter, store: Optional[PhonemeStore] = None):
+        self.converter = converter
+        self.store = store or get_default_store()
+        self.namespace: Namespace = converter.get_engine_identity()
+        self._memory: Dict[str, str] = {}
+        self._memory_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        # 只有在本对象上找不到属性时才会调用
+        return getattr(self.__dict__['converter'], name)
+
+    @property
+    def language(self):
+        return getattr(self.converter, 'language', '')
+
+    def get_engine_identity(self):
+        return self.namespace
+
+    def convert(self, text: str) -> str:
+        return self.batch_convert([text])[0]
+
+    def batch_convert(self, texts: List[str]) -> List[str]:
+        keys = [normalize_word(t) if t else "" for t in texts]
+        unique = [k for k in dict.fromkeys(keys) if k]
+
+        with self._memory_lock:
+            resolved = {k: self._memory[k] for k in unique if k in self._memory}
+        missing = [k for k in unique if k not in resolved]
+
+        if missing:
+            from_disk = self.store.get_many(self.namespace, missing)
+            resolved.update(from_disk)
+            missing = [k for k in missing if k not in from_disk]
+
+        if missing:
+            converted = self.converter.batch_convert(missing)
+            fresh = dict(zip(missing, converted))
+            resolved.update(fresh)
+            self.store.put_many(self.namespace, fresh)
+
+        with self._memory_lock:
+            self._memory.update(resolved)
+        self.hits += len(unique) - len(missing)
+        self.misses += len(missing)
+        return [resolved.get(k, "") for k in keys]
+
+    def flush(self):
+        self.store.flush()
+
+    def cache_stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "memory_entries": len(self._memory)}
+
+
+# -------------------- 预热工具 --------------------
+
+def extract_script_vocabulary(script_path: str) -> List[str]:
+    """从剧本 JSON 提取去重后的规范化词表（台词 + 已有头尾词）"""
+    with open(script_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    vocab: Dict[str, None] = {}
+    for cue in data.get("cues", []):
+        text = cue.get("pure_line") or cue.get("line", "")
+        for tok in tokenize_text(text):
+            vocab[normalize_word(tok)] = None
+        for field in ("head_tok", "tail_tok"):
+            for tok in cue.get(field, []) or []:
+                if isinstance(tok, str) and tok.strip():
+                    vocab[normalize_word(tok)] = None
+    return list(vocab)
+
+
+def read_vocabulary_file(vocab_path: str) -> List[str]:
+    """读取词表：每行一个词，允许“词 其他列”格式（如 Vosk words.txt），只取第一列"""
+    vocab: Dict[str, None] = {}
+    with open(vocab_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if parts:
+                vocab[normalize_word(parts[0])] = None
+    return list(vocab)
+
+
+def prewarm(converter: G2PConverter, words: List[str], store: Optional[PhonemeStore] = None,
+            chunk_size: int = 2000) -> Dict[str, float]:
+    """把词表中尚未缓存的词批量转换并写入缓存"""
+    cached = converter if isinstance(converter, CachedG2P) else CachedG2P(converter, store)
+    start = time.perf_counter()
+    before = cached.misses
+    for i in range(0, len(words), chunk_size):
+        cached.batch_convert(words[i:i + chunk_size])
+        print(f"[G2PCache] 预热进度: {min(i + chunk_size, len(words))}/{len(words)}")
+    cached.flush()
+    elapsed = time.perf_counter() - start
+    converted = cached.misses - before
+    print(f"[G2PCache] ✅ 预热完成: {len(words)} 词, 新转换 {converted}, 耗时 {elapsed:.2f}s")
+    return {"words": len(words), "converted": converted, "seconds": elapsed}
+
+
+def prewarm_from_script(converter: G2PConverter, script_path: str, store: Optional[PhonemeStore] = None):
+    return prewarm(converter, extract_script_vocabulary(script_path), store)
+
+
+def prewarm_from_vocabulary(converter: G2PConverter, vocab_path: str, store: Optional[PhonemeStore] = None):
+    return prewarm(converter, read_vocabulary_file(vocab_path), store)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="持久化 G2P 缓存工具")
+    parser.add_argument("--db", default=str(DEFAULT_DB_PATH), help="缓存数据库路径")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_warm = sub.add_parser("prewarm", help="从剧本或词表预热缓存")
+    p_warm.add_argument("--engine", default="epitran", help="epitran / charsiu / phonemizer / simple")
+    p_warm.add_argument("--language", default=None, help="引擎语言代码（默认使用引擎默认语言）")
+    src = p_warm.add_mutually_exclusive_group(required=True)
+    src.add_argument("--script", help="剧本 JSON 文件")
+    src.add_argument("--vocab", help="词表文件（每行一个词）")
+
+    sub.add_parser("stats", help="显示缓存内容统计")
+
+    args = parser.parse_args(argv)
+    store = PhonemeStore(args.db)
+
+    if args.command == "stats":
+        rows = store.namespaces()
+        print(f"📊 缓存: {args.db}")
+        for engine, version, language, count in rows:
+            print(f"   {engine} {version or '-'} [{language}]: {count} 词")
+        if not rows:
+            print("   (空)")
+        return
+
+    from app.core.g2p.g2p_manager import G2PManager, G2PEngineType
+    manager = G2PManager(use_persistent_cache=False)
+    engine_type = G2PEngineType(args.engine)
+    language = args.language or manager.engine_configs[engine_type]["default_language"]
+    engine = manager.create_engine(engine_type, language)
+    if args.script:
+        prewarm_from_script(engine, args.script, store)
+    else:
+        prewarm_from_vocabulary(engine, args.vocab, store)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
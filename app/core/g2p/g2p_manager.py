@@ -3,10 +3,13 @@ G2P引擎管理器
 统一管理所有G2P引擎的选择、创建和切换
 """
 
-from typing import Optional, Dict, Any, List, Tuple
+from typing import Optional, Dict, Any, List, Tuple, Callable
+import importlib.util
 import logging
 import os
 import sys
+import threading
+import time
 from enum import Enum
 
 
@@ -18,10 +21,31 @@ class G2PEngineType(Enum):
     SIMPLE = "simple"
 
 
+# 各引擎依赖的 Python 顶层模块（只用 find_spec 探测，不实际导入）
+ENGINE_MODULES = {
+    G2PEngineType.EPITRAN: ["epitran"],
+    G2PEngineType.CHARSIU: ["transformers", "torch"],
+    G2PEngineType.PHONEMIZER: ["phonemizer"],
+    G2PEngineType.SIMPLE: [],
+}
+
+
 class G2PManager:
     """G2P引擎管理器"""
     
-    def __init__(self):
+    # 可用性探测结果在进程内共享（多处会各自创建 G2PManager）
+    _availability_cache: Dict[G2PEngineType, bool] = {}
+    
+    def __init__(self, use_persistent_cache: bool = True):
+        """
+        Args:
+            use_persistent_cache: 是否为创建的引擎包上持久化词级缓存（cache/g2p/phonemes.sqlite）
+        """
+        self.use_persistent_cache = use_persistent_cache
+        # 启动耗时记录（毫秒），见 get_startup_report()
+        self.timings: Dict[str, float] = {}
+        self._preload_thread: Optional[threading.Thread] = None
+        self._engine_lock = threading.RLock()
         self.current_engine_type = G2PEngineType.EPITRAN  # 默认使用Epitran
         self.current_language = "fra-Latn"  # 默认法语
         self.current_engine = None
@@ -112,28 +136,36 @@ class G2PManager:
         return available
         
     def _check_engine_availability(self, engine_type: G2PEngineType) -> bool:
-        """检查引擎是否可用"""
-        try:
-            if engine_type == G2PEngineType.EPITRAN:
-                from app.core.g2p.epitran_g2p import EpitranG2P
-                return True
-            elif engine_type == G2PEngineType.CHARSIU:
-                from app.core.g2p.charsiu_g2p import CharsiuG2P
-                return True
-            elif engine_type == G2PEngineType.PHONEMIZER:
-                from app.core.g2p.phonemizer_g2p import PhonemizerG2P
-                return True
-            elif engine_type == G2PEngineType.SIMPLE:
-                from app.core.g2p.simple_g2p import SimpleG2P
-                return True
-        except ImportError as e:
-            logging.debug(f"引擎 {engine_type.value} 不可用: {e}")
-            return False
-        except Exception as e:
-            logging.warning(f"检查引擎 {engine_type.value} 时出错: {e}")
-            return False
-            
-        return False
+        """
+        检查引擎是否可用。
+        只用 importlib.util.find_spec 查找依赖模块，不执行导入（避免探测 CharsiuG2P 时加载 torch），
+        结果在进程内缓存。
+        """
+        cached = self._availability_cache.get(engine_type)
+        if cached is not None:
+            return cached
+        
+        start = time.perf_counter()
+        available = True
+        for module_name in ENGINE_MODULES.get(engine_type, []):
+            try:
+                if importlib.util.find_spec(module_name) is None:
+                    logging.debug(f"引擎 {engine_type.value} 不可用: 未安装 {module_name}")
+                    available = False
+                    break
+            except (ImportError, ValueError) as e:
+                logging.debug(f"引擎 {engine_type.value} 不可用: {e}")
+                available = False
+                break
+        self.timings[f"probe:{engine_type.value}"] = (time.perf_counter() - start) * 1000
+        
+        self._availability_cache[engine_type] = available
+        return available
+    
+    @classmethod
+    def refresh_availability(cls):
+        """清空可用性缓存（安装新依赖后调用）"""
+        cls._availability_cache.clear()
         
     def create_engine(self, engine_type, language: Optional[str] = None):
         """创建G2P引擎实例"""
@@ -150,7 +182,9 @@ class G2PManager:
         if language is None:
             language = self.current_language
             
+        start = time.perf_counter()
         try:
+            # 引擎模块在此处才导入（懒加载）
             if engine_type == G2PEngineType.EPITRAN:
                 from app.core.g2p.epitran_g2p import EpitranG2P
                 engine = EpitranG2P(language=str(language))
@@ -173,6 +207,11 @@ class G2PManager:
                 
             else:
                 raise ValueError(f"不支持的引擎类型: {engine_type}")
+
+            if self.use_persistent_cache:
+                engine = self._wrap_with_cache(engine)
+            
+            self.timings[f"create:{engine_type.value}"] = (time.perf_counter() - start) * 1000
                 
             self.current_engine = engine
             self.current_engine_type = engine_type
@@ -193,6 +232,15 @@ class G2PManager:
             # 尝试降级到下一个可用引擎
             return self._fallback_create_engine(engine_type)
             
+    def _wrap_with_cache(self, engine):
+        """为引擎包上持久化缓存；缓存不可用时返回原引擎"""
+        try:
+            from app.core.g2p.g2p_cache import CachedG2P
+            return CachedG2P(engine)
+        except Exception as e:
+            logging.warning(f"持久化G2P缓存不可用，直接使用引擎: {e}")
+            return engine
+
     def _fallback_create_engine(self, failed_engine_type: G2PEngineType):
         """创建备用引擎"""
         # 定义降级顺序
@@ -219,8 +267,60 @@ class G2PManager:
                     
         raise RuntimeError("所有G2P引擎都不可用")
         
+    def apply_benchmark_report(self, report: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        读取本机基准报告（python -m app.core.g2p.g2p_benchmark 生成），
+        用实测数据替换 engine_configs 中的速度标签，并记录在 "measured" 字段中。
+        """
+        if report is None:
+            from app.core.g2p.g2p_benchmark import load_benchmark_report
+            report = load_benchmark_report()
+        self._benchmark_report = report
+        if not report:
+            return False
+        
+        for name, result in report.get("engines", {}).items():
+            try:
+                engine_type = G2PEngineType(name)
+            except ValueError:
+                continue
+            config = self.engine_configs[engine_type]
+            config["measured"] = result
+            wps = result.get("batch_words_per_sec") if result.get("ok") else None
+            if wps:
+                if wps >= 20000:
+                    config["speed"] = "极快"
+                elif wps >= 2000:
+                    config["speed"] = "快"
+                elif wps >= 200:
+                    config["speed"] = "中"
+                else:
+                    config["speed"] = "慢"
+        return True
+    
+    def _measured_priority(self, priority_order: List[G2PEngineType],
+                           max_cold_start_s: float = 20.0, min_batch_wps: float = 100.0) -> List[G2PEngineType]:
+        """
+        按实测数据调整优先级：本机上能在 max_cold_start_s 内启动、批量速度不低于 min_batch_wps
+        的引擎保持原有（质量）顺序排在前面，实测失败或过慢的引擎排到后面。
+        """
+        report = getattr(self, "_benchmark_report", None)
+        if not report:
+            return priority_order
+        engines = report.get("engines", {})
+        
+        def _fits(engine_type: G2PEngineType) -> bool:
+            r = engines.get(engine_type.value)
+            if not r or not r.get("ok"):
+                return False
+            return (r.get("cold_start_s", float("inf")) <= max_cold_start_s
+                    and (r.get("batch_words_per_sec") or 0) >= min_batch_wps)
+        
+        fitting = [e for e in priority_order if _fits(e)]
+        return fitting + [e for e in priority_order if e not in fitting]
+    
     def get_best_available_engine(self):
-        """获取最佳可用引擎"""
+        """获取最佳可用引擎（有本机基准报告时按实测数据排序）"""
         # 按优先级尝试创建引擎
         priority_order = [
             G2PEngineType.EPITRAN,    # 主要推荐
@@ -228,6 +328,9 @@ class G2PManager:
             G2PEngineType.PHONEMIZER, # 质量高但依赖复杂
             G2PEngineType.SIMPLE      # 保底方案
         ]
+        if not hasattr(self, "_benchmark_report"):
+            self.apply_benchmark_report()
+        priority_order = self._measured_priority(priority_order)
         
         for engine_type in priority_order:
             if self._check_engine_availability(engine_type):
@@ -271,10 +374,54 @@ class G2PManager:
             raise
             
     def get_current_engine(self):
-        """获取当前引擎"""
-        if self.current_engine is None:
-            self.current_engine = self.get_best_available_engine()
-        return self.current_engine
+        """获取当前引擎（若正在后台预加载则等待其完成）"""
+        preload = self._preload_thread
+        if preload is not None and preload is not threading.current_thread():
+            preload.join()
+        with self._engine_lock:
+            if self.current_engine is None:
+                self.current_engine = self.get_best_available_engine()
+            return self.current_engine
+    
+    def preload_async(self, engine_type: Optional[G2PEngineType] = None, language: Optional[str] = None,
+                      callback: Optional[Callable[[Any], None]] = None) -> threading.Thread:
+        """
+        在后台线程创建选定引擎（导入依赖、加载模型），不阻塞界面启动。
+        callback(engine) 在后台线程中调用；Qt 代码应在其中发射信号而不是直接操作控件。
+        """
+        def _run():
+            start = time.perf_counter()
+            engine = None
+            try:
+                with self._engine_lock:
+                    if engine_type is None and language is None:
+                        engine = self.current_engine or self.get_best_available_engine()
+                    else:
+                        engine = self.create_engine(engine_type, language)
+                    self.current_engine = engine
+            except Exception as e:
+                logging.error(f"后台预加载G2P引擎失败: {e}")
+            finally:
+                self.timings["preload"] = (time.perf_counter() - start) * 1000
+                self._preload_thread = None
+            if callback is not None:
+                try:
+                    callback(engine)
+                except Exception as e:
+                    logging.warning(f"G2P预加载回调出错: {e}")
+        
+        thread = threading.Thread(target=_run, name="g2p-preload", daemon=True)
+        self._preload_thread = thread
+        thread.start()
+        return thread
+    
+    @property
+    def is_preloading(self) -> bool:
+        return self._preload_thread is not None
+    
+    def get_startup_report(self) -> Dict[str, float]:
+        """返回探测/创建/预加载各步骤耗时（毫秒）"""
+        return dict(self.timings)
         
     def get_default_engine(self) -> str:
         """获取默认引擎名称"""
@@ -292,8 +439,8 @@ class G2PManager:
             raise ValueError(f"不支持的引擎类型: {engine_name}")
         
     def get_current_engine_info(self) -> Dict[str, Any]:
-        """获取当前引擎信息"""
-        if self.current_engine is None:
+        """获取当前引擎信息（预加载进行中时返回选定引擎的信息，不等待）"""
+        if self.current_engine is None and not self.is_preloading:
             self.get_current_engine()
             
         return {
@@ -352,3 +499,40 @@ class G2PManager:
             logging.debug("G2P编码环境已设置")
         except Exception as e:
             logging.warning(f"设置G2P编码环境时出错: {e}")
+
+
+def benchmark_startup():
+    """对比“导入模块探测”与 find_spec 探测的启动耗时（各在独立子进程中测量）"""
+    import subprocess
+    
+    def _run(code: str) -> float:
+        out = subprocess.run(
+            [sys.executable, "-c", f"import time; t=time.perf_counter(); {code}; print(time.perf_counter()-t)"],
+            capture_output=True, text=True,
+        )
+        try:
+            return float(out.stdout.strip().splitlines()[-1]) * 1000
+        except (ValueError, IndexError):
+            return float("nan")
+    
+    print("🧪 G2P 引擎探测耗时（冷启动子进程）\n")
+    import_probe = ("\n".join([
+        "for m in ('epitran_g2p', 'charsiu_g2p', 'phonemizer_g2p', 'simple_g2p'):",
+        "    try: __import__('app.core.g2p.' + m)",
+        "    except Exception: pass",
+    ]))
+    old_ms = _run("exec(" + repr(import_probe) + ")")
+    new_ms = _run("from app.core.g2p.g2p_manager import G2PManager; G2PManager(use_persistent_cache=False).get_available_engines()")
+    print(f"   导入引擎模块探测:   {old_ms:8.1f} ms")
+    print(f"   find_spec 探测:     {new_ms:8.1f} ms")
+    
+    manager = G2PManager()
+    manager.get_available_engines()
+    manager.preload_async().join()
+    print("\n   本进程各步骤耗时:")
+    for key, ms in manager.get_startup_report().items():
+        print(f"   {key:<24} {ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    benchmark_startup()
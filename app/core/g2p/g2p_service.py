@@ -0,0 +1,247 @@
+"""
+异步 G2P 服务
+让调用方（GUI 线程、对齐器）不再同步阻塞在 convert/batch_convert 上：
+
+- submit(words) 立即返回 concurrent.futures.Future，结果为与 words 等长的音素列表
+- 请求去重：同一个词的并发请求共享同一次计算（包括正在计算中的词）
+- 微批处理：几毫秒内陆续到达的小请求合并成一次 batch_convert
+- 每个引擎一个工作池（默认单线程，引擎本身无需线程安全）
+- QtG2PService 为 Qt 代码提供信号版本，结果在接收者线程中送达
+
+用法：
+    service = get_g2p_service(g2p_manager.get_current_engine())
+    phonemes = service.submit(["bonjour", "je"]).result()
+"""
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from .base import G2PConverter
+
+
+class G2PService:
+    """为单个 G2P 引擎提供去重 + 微批处理的异步请求队列"""
+
+    def __init__(self, converter: G2PConverter, batch_window_ms: float = 5.0,
+                 max_batch_size: int = 512, workers: int = 1):
+        """
+        Args:
+            converter: 被包装的 G2P 引擎
+            batch_window_ms: 收到第一个请求后等待更多请求合批的时间
+            max_batch_size: 单次 batch_convert 的最大词数
+            workers: 工作线程数（引擎非线程安全时保持 1）
+        """
+        self.converter = converter
+        self.language = getattr(converter, "language", "")
+        self.batch_window = batch_window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+
+        self._queue: "queue.Queue[Optional[List[str]]]" = queue.Queue()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="g2p")
+        self._running = True
+
+        # 统计
+        self.requests = 0
+        self.words_requested = 0
+        self.words_shared = 0   # 与进行中请求共享计算的词数
+        self.batches = 0
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="g2p-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    # -------- 对外接口 --------
+
+    def submit(self, words: List[str]) -> Future:
+        """提交一组词，返回 Future[List[str]]"""
+        result: Future = Future()
+        words = list(words)
+        if not words:
+            result.set_result([])
+            return result
+        if not self._running:
+            result.set_exception(RuntimeError("G2PService 已关闭"))
+            return result
+
+        new_words: List[str] = []
+        word_futures: Dict[str, Future] = {}
+        with self._lock:
+            for w in dict.fromkeys(words):
+                f = self._inflight.get(w)
+                if f is None:
+                    f = Future()
+                    self._inflight[w] = f
+                    new_words.append(w)
+                else:
+                    self.words_shared += 1
+                word_futures[w] = f
+            self.requests += 1
+            self.words_requested += len(words)
+        if new_words:
+            self._queue.put(new_words)
+
+        self._gather(words, word_futures, result)
+        return result
+
+    def convert(self, text: str) -> str:
+        """同步便捷接口"""
+        return self.submit([text]).result()[0]
+
+    def batch_convert(self, texts: List[str]) -> List[str]:
+        """同步便捷接口（与 G2PConverter 兼容，可直接替代引擎传给旧代码）"""
+        return self.submit(texts).result()
+
+    def shutdown(self, wait: bool = True):
+        self._running = False
+        self._queue.put(None)
+        self._dispatcher.join(timeout=1.0)
+        self._pool.shutdown(wait=wait)
+        # 尚未分派的词不会再计算，让等待它们的请求以错误结束而不是永久挂起
+        error = RuntimeError("G2PService 已关闭")
+        while True:
+            try:
+                words = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if not words:
+                continue
+            with self._lock:
+                futures = [self._inflight.pop(w, None) for w in words]
+            for f in futures:
+                if f is not None and not f.done():
+                    f.set_exception(error)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "requests": self.requests,
+            "words_requested": self.words_requested,
+            "words_shared": self.words_shared,
+            "batches": self.batches,
+            "inflight": len(self._inflight),
+        }
+
+    # -------- 内部 --------
+
+    @staticmethod
+    def _gather(words: List[str], word_futures: Dict[str, Future], result: Future):
+        """所有词的 Future 完成后组装请求结果"""
+        remaining = [len(word_futures)]
+        lock = threading.Lock()
+
+        def _on_done(_f: Future):
+            with lock:
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            for f in word_futures.values():
+                if f.exception() is not None:
+                    result.set_exception(f.exception())
+                    return
+            result.set_result([word_futures[w].result() for w in words])
+
+        for f in word_futures.values():
+            f.add_done_callback(_on_done)
+
+    def _dispatch_loop(self):
+        while self._running:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = list(first)
+            deadline = time.monotonic() + self.batch_window
+            # 在窗口内收集更多请求，直到达到批量上限
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    more = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if more is None:
+                    self._running = False
+                    break
+                batch.extend(more)
+            for i in range(0, len(batch), self.max_batch_size):
+                self._pool.submit(self._run_batch, batch[i:i + self.max_batch_size])
+
+    def _run_batch(self, batch: List[str]):
+        self.batches += 1
+        try:
+            phonemes = self.converter.batch_convert(batch)
+            error = None
+            if len(phonemes) != len(batch):
+                raise ValueError(f"batch_convert 返回 {len(phonemes)} 个结果，期望 {len(batch)} 个")
+        except Exception as e:
+            phonemes, error = None, e
+        with self._lock:
+            futures = [self._inflight.pop(w) for w in batch]
+        for i, f in enumerate(futures):
+            if error is not None:
+                f.set_exception(error)
+            else:
+                f.set_result(phonemes[i])
+
+
+class QtG2PService(QObject):
+    """
+    G2PService 的 Qt 信号版本。
+
+    request() 立即返回请求 ID；结果经 phonemesReady 信号送达。
+    信号在 G2P 工作线程（或提交时已完成的情况下在 request() 内部）发出，
+    接收方应是 GUI 线程中的 QObject 槽，并以 Qt.QueuedConnection 连接；
+    需要在结果到达前记下请求 ID 时，先用 new_request_id() 取号再传给 request()。
+    """
+
+    phonemesReady = Signal(int, list, list)  # (请求ID, 词列表, 音素列表)
+    requestFailed = Signal(int, str)         # (请求ID, 错误信息)
+
+    def __init__(self, service: G2PService, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self.service = service
+        self._ids = itertools.count(1)
+
+    def new_request_id(self) -> int:
+        return next(self._ids)
+
+    def request(self, words: List[str], request_id: Optional[int] = None) -> int:
+        if request_id is None:
+            request_id = self.new_request_id()
+        words = list(words)
+        future = self.service.submit(words)
+
+        def _on_done(f: Future):
+            if f.exception() is not None:
+                self.requestFailed.emit(request_id, str(f.exception()))
+            else:
+                self.phonemesReady.emit(request_id, words, f.result())
+
+        future.add_done_callback(_on_done)
+        return request_id
+
+
+_services: Dict[int, G2PService] = {}
+_services_lock = threading.Lock()
+
+
+def get_g2p_service(converter: G2PConverter) -> G2PService:
+    """
+    每个引擎实例共享一个服务和工作池。
+    按实例而不是引擎身份区分：主窗口和对齐管理器各有自己的 G2PManager，
+    同一身份的两个实例各自持有服务，互不关闭对方正在使用的服务
+    （服务引用着引擎，键 id(converter) 在条目存在期间不会被复用）。
+    """
+    if isinstance(converter, G2PService):
+        return converter
+    with _services_lock:
+        service = _services.get(id(converter))
+        if service is None:
+            service = G2PService(converter)
+            _services[id(converter)] = service
+        return service
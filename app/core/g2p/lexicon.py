@@ -0,0 +1,293 @@
+"""
+STT 词表音素词典
+对齐器在线只需要 ASR 可能输出的词的音素；Vosk 的输出词集是封闭的（模型 words.txt），
+因此可以离线把整个词表批量转换好，运行时只做哈希探测，G2P 仅作为未命中时的后备。
+
+文件格式（.phlex，本机字节序，整体 mmap，打开几乎零开销）：
+    b"PHLX" | u32 版本 | u32 词数 n | u32 哈希表大小 m | u32 身份 JSON 长度 | 身份 JSON | 对齐填充
+    u32[n+1] 词偏移 | u32[n+1] 音素偏移 | u32[m] 开放寻址哈希表（存 词序号+1，0 为空）
+    词 UTF-8 数据 | 音素 UTF-8 数据
+
+命令行：
+    python -m app.core.g2p.lexicon build --vosk-model app/models/stt/vosk/vosk-model-fr-0.22 \
+        --engine epitran --language fra-Latn
+    python -m app.core.g2p.lexicon build --vocab words.txt --engine phonemizer --language fr-fr --out fr.phlex
+    python -m app.core.g2p.lexicon info cache/lexicon/vosk-model-fr-0.22.epitran.fra-Latn.phlex
+"""
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from app.utils.paths import CACHE_DIR
+from .g2p_cache import normalize_word, read_vocabulary_file
+
+MAGIC = b"PHLX"
+FORMAT_VERSION = 1
+DEFAULT_LEXICON_DIR = CACHE_DIR / "lexicon"
+
+_HEADER = struct.Struct("=4sIIII")
+# Kaldi/Vosk 词表中的特殊符号，不是可识别的词
+_SPECIAL_WORDS = {"<eps>", "<unk>", "<s>", "</s>", "#0", "!SIL", "[unk]", "<UNK>", "<SPOKEN_NOISE>"}
+
+
+def _word_hash(data: bytes) -> int:
+    return zlib.crc32(data)
+
+
+# -------------------- 词表读取 --------------------
+
+def read_vosk_vocabulary(model_dir: str) -> List[str]:
+    """读取 Vosk 模型的词表（graph/words.txt 等），去掉特殊符号"""
+    root = Path(model_dir)
+    for candidate in (root / "graph" / "words.txt", root / "words.txt", root / "graph" / "phones" / "words.txt"):
+        if candidate.exists():
+            words = read_vocabulary_file(str(candidate))
+            return [w for w in words if w not in _SPECIAL_WORDS and not w.startswith("#")]
+    raise FileNotFoundError(f"在 Vosk 模型中找不到词表 words.txt: {model_dir}")
+
+
+def default_lexicon_path(model_dir: str, engine: str, language: str) -> Path:
+    return DEFAULT_LEXICON_DIR / f"{Path(model_dir).name}.{engine}.{language}.phlex"
+
+
+# -------------------- 读取 --------------------
+
+class PhonemeLexicon:
+    """mmap 的只读词典，get()/lookup_many() 为哈希探测"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n, m, id_len = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"不是受支持的音素词典文件: {self.path}")
+        pos = _HEADER.size
+        self.identity: Tuple[str, str, str] = tuple(json.loads(self._mm[pos:pos + id_len].decode("utf-8")))
+        pos += id_len
+        pos += -pos % 4
+
+        view = memoryview(self._mm)
+        self._key_off = view[pos:pos + 4 * (n + 1)].cast("I")
+        pos += 4 * (n + 1)
+        self._val_off = view[pos:pos + 4 * (n + 1)].cast("I")
+        pos += 4 * (n + 1)
+        self._table = view[pos:pos + 4 * m].cast("I")
+        pos += 4 * m
+        self._keys_base = pos
+        self._vals_base = pos + self._key_off[n]
+        self._n = n
+        self._mask = m - 1
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _find(self, key: bytes) -> int:
+        mm, key_off = self._mm, self._key_off
+        base = self._keys_base
+        slot = _word_hash(key) & self._mask
+        while True:
+            entry = self._table[slot]
+            if entry == 0:
+                return -1
+            i = entry - 1
+            if mm[base + key_off[i]:base + key_off[i + 1]] == key:
+                return i
+            slot = (slot + 1) & self._mask
+
+    def get(self, word: str) -> Optional[str]:
+        i = self._find(normalize_word(word).encode("utf-8"))
+        if i < 0:
+            return None
+        base = self._vals_base
+        return self._mm[base + self._val_off[i]:base + self._val_off[i + 1]].decode("utf-8")
+
+    def __contains__(self, word: str) -> bool:
+        return self._find(normalize_word(word).encode("utf-8")) >= 0
+
+    def lookup_many(self, words: Sequence[str]) -> List[Optional[str]]:
+        return [self.get(w) for w in words]
+
+    def close(self):
+        # memoryview 必须先释放，mmap 才能关闭
+        for attr in ("_key_off", "_val_off", "_table"):
+            mv = self.__dict__.pop(attr, None)
+            if mv is not None:
+                mv.release()
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+
+def find_lexicon(model_dir: str, converter) -> Optional[PhonemeLexicon]:
+    """
+    查找与 STT 模型和当前 G2P 引擎匹配的词典。
+    词典身份（引擎、版本、语言）与引擎不符时不使用，避免混用不同引擎的音素。
+    """
+    identity = tuple(converter.get_engine_identity()) if hasattr(converter, "get_engine_identity") else None
+    if not DEFAULT_LEXICON_DIR.exists():
+        return None
+    for path in sorted(DEFAULT_LEXICON_DIR.glob(f"{Path(model_dir).name}.*.phlex")):
+        try:
+            lexicon = PhonemeLexicon(path)
+        except (OSError, ValueError) as e:
+            print(f"[Lexicon] ⚠️ 无法打开词典 {path.name}: {e}")
+            continue
+        if identity is None or lexicon.identity == identity:
+            print(f"[Lexicon] ✅ 使用音素词典 {path.name} ({len(lexicon)} 词)")
+            return lexicon
+        lexicon.close()
+    return None
+
+
+# -------------------- 构建 --------------------
+
+def write_lexicon(path, identity: Tuple[str, str, str], entries: Iterable[Tuple[str, str]]):
+    """写入词典文件（先写临时文件再原子替换）"""
+    items = {}
+    for word, phonemes in entries:
+        key = normalize_word(word)
+        if key:
+            items[key] = phonemes or ""
+    words = sorted(items)
+
+    key_blobs = [w.encode("utf-8") for w in words]
+    val_blobs = [items[w].encode("utf-8") for w in words]
+    key_off, val_off = array("I", [0]), array("I", [0])
+    for kb, vb in zip(key_blobs, val_blobs):
+        key_off.append(key_off[-1] + len(kb))
+        val_off.append(val_off[-1] + len(vb))
+
+    m = 1
+    while m < max(2, len(words) * 2):
+        m <<= 1
+    table = array("I", bytes(4 * m))
+    for i, kb in enumerate(key_blobs):
+        slot = _word_hash(kb) & (m - 1)
+        while table[slot]:
+            slot = (slot + 1) & (m - 1)
+        table[slot] = i + 1
+
+    id_bytes = json.dumps(list(identity), ensure_ascii=False).encode("utf-8")
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, len(words), m, len(id_bytes)) + id_bytes
+    header += b"\0" * (-len(header) % 4)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(header)
+        key_off.tofile(f)
+        val_off.tofile(f)
+        table.tofile(f)
+        f.write(b"".join(key_blobs))
+        f.write(b"".join(val_blobs))
+    os.replace(tmp, path)
+    return len(words)
+
+
+_worker_engine = None
+
+
+def _worker_init(engine: str, language: str):
+    global _worker_engine
+    from app.core.g2p.g2p_manager import G2PManager
+    _worker_engine = G2PManager(use_persistent_cache=False).create_engine(engine, language)
+    if hasattr(_worker_engine, "workers"):
+        _worker_engine.workers = 1  # 已在进程级并行，避免引擎内部再开进程池
+
+
+def _worker_convert(words: List[str]) -> List[str]:
+    return _worker_engine.batch_convert(words)
+
+
+def build_lexicon(words: List[str], out_path, engine: Optional[str] = None, language: Optional[str] = None,
+                  converter=None, workers: Optional[int] = None, chunk_size: int = 1000) -> int:
+    """
+    批量转换词表并写入词典。
+    给出 engine/language 时按 CPU 核数开进程池，每个进程各建一个引擎；
+    否则用传入的 converter 在本进程内分块批量转换。
+    """
+    words = list(dict.fromkeys(normalize_word(w) for w in words if w and w.strip()))
+    chunks = [words[i:i + chunk_size] for i in range(0, len(words), chunk_size)]
+    start = time.perf_counter()
+    results: List[str] = []
+
+    if engine is not None:
+        from app.core.g2p.g2p_manager import G2PManager
+        probe = G2PManager(use_persistent_cache=False).create_engine(engine, language)
+        identity = probe.get_engine_identity()
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers, initializer=_worker_init,
+                                 initargs=(engine, language)) as pool:
+            for i, part in enumerate(pool.map(_worker_convert, chunks)):
+                results.extend(part)
+                print(f"[Lexicon] 进度: {min((i + 1) * chunk_size, len(words))}/{len(words)}")
+    elif converter is not None:
+        identity = converter.get_engine_identity()
+        for i, chunk in enumerate(chunks):
+            results.extend(converter.batch_convert(chunk))
+            print(f"[Lexicon] 进度: {min((i + 1) * chunk_size, len(words))}/{len(words)}")
+    else:
+        raise ValueError("需要提供 engine 或 converter")
+
+    count = write_lexicon(out_path, identity, zip(words, results))
+    elapsed = time.perf_counter() - start
+    print(f"[Lexicon] ✅ 已写入 {out_path}: {count} 词, 耗时 {elapsed:.1f}s "
+          f"({count / elapsed if elapsed else 0:.0f} 词/秒)")
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="STT 词表音素词典工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="构建词典")
+    src = p_build.add_mutually_exclusive_group(required=True)
+    src.add_argument("--vosk-model", help="Vosk 模型目录（读取其 words.txt）")
+    src.add_argument("--vocab", help="词表文件（每行一个词）")
+    p_build.add_argument("--engine", default="epitran", help="epitran / charsiu / phonemizer / simple")
+    p_build.add_argument("--language", default=None, help="引擎语言代码（默认使用引擎默认语言）")
+    p_build.add_argument("--out", default=None, help="输出文件（默认 cache/lexicon/<模型名>.<引擎>.<语言>.phlex）")
+    p_build.add_argument("--workers", type=int, default=None, help="进程数（默认 CPU 核数）")
+
+    p_info = sub.add_parser("info", help="显示词典信息")
+    p_info.add_argument("path")
+    p_info.add_argument("words", nargs="*", help="要查询的词")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "info":
+        lexicon = PhonemeLexicon(args.path)
+        print(f"📖 {args.path}: {len(lexicon)} 词, 引擎 {lexicon.identity}")
+        for w in args.words:
+            print(f"   {w} -> {lexicon.get(w)}")
+        lexicon.close()
+        return
+
+    from app.core.g2p.g2p_manager import G2PManager, G2PEngineType
+    engine_type = G2PEngineType(args.engine)
+    language = args.language or G2PManager(use_persistent_cache=False).engine_configs[engine_type]["default_language"]
+    if args.vosk_model:
+        words = read_vosk_vocabulary(args.vosk_model)
+        out = args.out or default_lexicon_path(args.vosk_model, args.engine, language)
+    else:
+        words = read_vocabulary_file(args.vocab)
+        out = args.out or DEFAULT_LEXICON_DIR / f"{Path(args.vocab).stem}.{args.engine}.{language}.phlex"
+    print(f"[Lexicon] 词表 {len(words)} 词，引擎 {args.engine} [{language}]")
+    build_lexicon(words, out, engine=args.engine, language=language, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""
+整数化音素表示
+把 G2P 输出的 IPA 字符串切分为音段（正确处理鼻化元音 ɑ̃、长音 ɛː、塞擦音 t͡ʃ、送气 tʰ 等多码点符号），
+每个音段驻留为一个 uint16 符号 ID，音素序列以 array('H') 紧凑存储。
+
+相似度使用加权编辑距离：插入/删除代价 1，替换代价由发音特征决定
+（元音：舌位高低、前后、圆唇、鼻化、长短；辅音：部位、方式、清浊），
+ɛ→e 比 ɛ→k 便宜得多，比按字符的 Levenshtein 更符合语音直觉。
+
+批量接口 similarity_matrix() 在所有词对上向量化动态规划，行内依赖用累积最小值消去，
+一批只需 O(最长序列长度) 次 NumPy 运算。
+"""
+import threading
+import unicodedata
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+PAD_ID = 0
+
+# 元音：(高低 0=闭…6=开, 前后 0=前/1=央/2=后, 圆唇)
+_VOWELS: Dict[str, Tuple[int, int, int]] = {
+    "i": (0, 0, 0), "y": (0, 0, 1), "ɨ": (0, 1, 0), "ʉ": (0, 1, 1), "ɯ": (0, 2, 0), "u": (0, 2, 1),
+    "ɪ": (1, 0, 0), "ʏ": (1, 0, 1), "ʊ": (1, 2, 1),
+    "e": (2, 0, 0), "ø": (2, 0, 1), "ɘ": (2, 1, 0), "ɵ": (2, 1, 1), "ɤ": (2, 2, 0), "o": (2, 2, 1),
+    "ə": (3, 1, 0), "ɚ": (3, 1, 0),
+    "ɛ": (4, 0, 0), "œ": (4, 0, 1), "ɜ": (4, 1, 0), "ɞ": (4, 1, 1), "ʌ": (4, 2, 0), "ɔ": (4, 2, 1),
+    "æ": (5, 0, 0), "ɐ": (5, 1, 0),
+    "a": (6, 0, 0), "ɶ": (6, 0, 1), "ɑ": (6, 2, 0), "ɒ": (6, 2, 1),
+}
+
+# 辅音：(部位, 方式, 清浊)
+# 部位 0 双唇 1 唇齿 2 齿 3 齿龈 4 龈后 5 卷舌 6 硬腭 7 软腭 8 小舌 9 咽 10 声门
+# 方式 0 塞 1 鼻 2 颤 3 闪 4 擦 5 边擦 6 近音 7 边近音 8 塞擦
+_CONSONANTS: Dict[str, Tuple[int, int, int]] = {
+    "p": (0, 0, 0), "b": (0, 0, 1), "t": (3, 0, 0), "d": (3, 0, 1), "ʈ": (5, 0, 0), "ɖ": (5, 0, 1),
+    "c": (6, 0, 0), "ɟ": (6, 0, 1), "k": (7, 0, 0), "g": (7, 0, 1), "ɡ": (7, 0, 1),
+    "q": (8, 0, 0), "ɢ": (8, 0, 1), "ʔ": (10, 0, 0),
+    "m": (0, 1, 1), "ɱ": (1, 1, 1), "n": (3, 1, 1), "ɳ": (5, 1, 1), "ɲ": (6, 1, 1), "ŋ": (7, 1, 1), "ɴ": (8, 1, 1),
+    "ʙ": (0, 2, 1), "r": (3, 2, 1), "ʀ": (8, 2, 1), "ɾ": (3, 3, 1), "ɽ": (5, 3, 1),
+    "ɸ": (0, 4, 0), "β": (0, 4, 1), "f": (1, 4, 0), "v": (1, 4, 1), "θ": (2, 4, 0), "ð": (2, 4, 1),
+    "s": (3, 4, 0), "z": (3, 4, 1), "ʃ": (4, 4, 0), "ʒ": (4, 4, 1), "ʂ": (5, 4, 0), "ʐ": (5, 4, 1),
+    "ç": (6, 4, 0), "ʝ": (6, 4, 1), "x": (7, 4, 0), "ɣ": (7, 4, 1), "χ": (8, 4, 0), "ʁ": (8, 4, 1),
+    "ħ": (9, 4, 0), "ʕ": (9, 4, 1), "h": (10, 4, 0), "ɦ": (10, 4, 1),
+    "ɬ": (3, 5, 0), "ɮ": (3, 5, 1),
+    "ʋ": (1, 6, 1), "ɹ": (3, 6, 1), "ɻ": (5, 6, 1), "j": (6, 6, 1), "ɥ": (6, 6, 1), "ɰ": (7, 6, 1), "w": (7, 6, 1),
+    "l": (3, 7, 1), "ɭ": (5, 7, 1), "ʎ": (6, 7, 1), "ʟ": (7, 7, 1),
+}
+
+# 半元音与对应元音很接近
+_GLIDE_VOWEL = {("j", "i"), ("ɥ", "y"), ("w", "u"), ("ɰ", "ɯ")}
+
+_TIE_BARS = {"͡", "͜"}
+_LENGTH_MARKS = {"ː", "ˑ"}
+_DROP = {"ˈ", "ˌ", ".", "‿", "|", "‖"}
+# 附着在前一音段上的修饰字母（送气、腭化、唇化等）
+_MODIFIERS = {"ʰ", "ʲ", "ʷ", "ˠ", "ˤ", "ⁿ", "ˡ", "ʼ", "˞"}
+
+_NASAL = "̃"
+
+
+def _segment(ipa: str) -> List[str]:
+    """把 IPA 字符串切分为音段"""
+    segments: List[str] = []
+    chars = unicodedata.normalize("NFD", ipa)
+    i, n = 0, len(chars)
+    while i < n:
+        ch = chars[i]
+        i += 1
+        if ch.isspace() or ch in _DROP or (not ch.isalpha() and not unicodedata.combining(ch)
+                                            and ch not in _LENGTH_MARKS and ch not in _MODIFIERS):
+            continue
+        if (unicodedata.combining(ch) and ch not in _TIE_BARS) or ch in _LENGTH_MARKS or ch in _MODIFIERS:
+            if segments:
+                segments[-1] += ch
+            continue
+        if ch in _TIE_BARS:
+            # 连接符：与前后字符组成一个塞擦音/双发音
+            if segments and i < n:
+                segments[-1] += ch + chars[i]
+                i += 1
+            continue
+        segments.append(ch)
+    return [unicodedata.normalize("NFC", s) for s in segments]
+
+
+def _features(symbol: str):
+    """返回 (类别, 特征)；类别为 'V' / 'C' / None（未知）"""
+    base = unicodedata.normalize("NFD", symbol)
+    nasal = _NASAL in base
+    long = any(m in base for m in _LENGTH_MARKS)
+    mods = frozenset(c for c in base if c in _MODIFIERS)
+    if any(t in base for t in _TIE_BARS):
+        first, _, rest = base.partition(next(t for t in _TIE_BARS if t in base))
+        second = rest[:1]
+        if first[:1] in _CONSONANTS and second in _CONSONANTS:
+            place, _, _ = _CONSONANTS[second]
+            voice = _CONSONANTS[first[:1]][2]
+            return "C", (place, 8, voice, mods, second)
+    head = base[:1]
+    if head in _VOWELS:
+        h, b, r = _VOWELS[head]
+        return "V", (h, b, r, nasal, long, head)
+    if head in _CONSONANTS:
+        place, manner, voice = _CONSONANTS[head]
+        return "C", (place, manner, voice, mods, head)
+    return None, (symbol,)
+
+
+def _substitution_cost(a: str, b: str) -> float:
+    if a == b:
+        return 0.0
+    ka, fa = _features(a)
+    kb, fb = _features(b)
+    if ka == "V" and kb == "V":
+        cost = (0.1 * abs(fa[0] - fb[0]) + 0.15 * abs(fa[1] - fb[1]) + 0.2 * (fa[2] != fb[2])
+                + 0.3 * (fa[3] != fb[3]) + 0.1 * (fa[4] != fb[4]))
+        return float(min(1.0, max(0.05, cost)))
+    if ka == "C" and kb == "C":
+        cost = (0.08 * abs(fa[0] - fb[0]) + 0.35 * (fa[1] != fb[1]) + 0.2 * (fa[2] != fb[2])
+                + 0.1 * (fa[3] != fb[3]))
+        return float(min(1.0, max(0.05, cost)))
+    if ka and kb:
+        # 元音 vs 辅音：只有半元音与对应元音接近
+        glide, vowel = (fa[-1], fb[-1]) if ka == "C" else (fb[-1], fa[-1])
+        return 0.35 if (glide, vowel) in _GLIDE_VOWEL else 1.0
+    return 1.0
+
+
+class PhonemeInventory:
+    """
+    单个语言的音素符号表。
+
+    - encode(ipa) -> array('H')，结果按字符串缓存（同一词只切分一次）
+    - intern(ipas) 载入剧本时预先切分、驻留整批音素，并建好代价矩阵
+    - similarity(a, b) 单对加权相似度（0~1），IPA 字符串对直接缓存相似度，命中时只查一次字典
+    - cache_similarities(A, B) 批量算出未缓存的字符串对，之后逐对 similarity() 只查表
+    - similarity_matrix(A, B) 批量加权相似度矩阵
+    """
+
+    _CACHE_LIMIT = 200_000
+
+    def __init__(self, language: str = ""):
+        self.language = language
+        self._symbols: List[str] = ["<pad>"]
+        self._ids: Dict[str, int] = {}
+        self._encoded: Dict[str, array] = {}
+        # (a, b) -> 加权距离，键为 IPA 字符串或音段序列字节；已有符号间的替换代价不会改变，缓存无需失效
+        self._distances: Dict[Tuple[object, object], float] = {}
+        # (ipa_a, ipa_b) -> 相似度，对齐热路径上的单对比较直接命中
+        self._similarities: Dict[Tuple[str, str], float] = {}
+        self._cost: Optional[np.ndarray] = None
+        self._cost_rows: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._symbols) - 1
+
+    @property
+    def symbols(self) -> List[str]:
+        return self._symbols[1:]
+
+    def symbol_id(self, symbol: str) -> int:
+        sid = self._ids.get(symbol)
+        if sid is None:
+            with self._lock:
+                sid = self._ids.get(symbol)
+                if sid is None:
+                    sid = len(self._symbols)
+                    if sid > 0xFFFF:
+                        raise OverflowError("音素符号数超过 uint16 上限")
+                    self._symbols.append(symbol)
+                    self._ids[symbol] = sid
+                    self._cost = None  # 新符号，代价矩阵需重建
+        return sid
+
+    def tokenize(self, ipa: str) -> List[str]:
+        return _segment(ipa or "")
+
+    def encode(self, ipa: str) -> array:
+        seq = self._encoded.get(ipa)
+        if seq is None:
+            seq = array("H", [self.symbol_id(s) for s in _segment(ipa or "")])
+            if len(self._encoded) >= self._CACHE_LIMIT:
+                self._encoded.clear()
+            self._encoded[ipa] = seq
+        return seq
+
+    def intern(self, ipas) -> None:
+        """预先编码一批 IPA 字符串（符号驻留 + 切分缓存），并建好代价矩阵，之后比较不再切分或重建"""
+        for ipa in ipas:
+            if ipa:
+                self.encode(ipa)
+        self.cost_matrix()
+
+    def decode(self, seq: Sequence[int]) -> str:
+        return "".join(self._symbols[i] for i in seq if i != PAD_ID)
+
+    def cost_matrix(self) -> np.ndarray:
+        """替换代价矩阵 (符号数+1)²，第 0 行/列为填充符"""
+        cost = self._cost
+        if cost is None or cost.shape[0] != len(self._symbols):
+            n = len(self._symbols)
+            cost = np.ones((n, n), dtype=np.float32)
+            for i in range(1, n):
+                for j in range(i, n):
+                    cost[i, j] = cost[j, i] = _substitution_cost(self._symbols[i], self._symbols[j])
+            self._cost = cost
+            self._cost_rows = cost.tolist()  # 单对距离的纯 Python 循环用列表更快
+        return cost
+
+    # -------- 距离 --------
+
+    @staticmethod
+    def _key(x):
+        if isinstance(x, str):
+            return x
+        return x.tobytes() if isinstance(x, array) else array("H", x).tobytes()
+
+    def distance(self, a, b) -> float:
+        """加权编辑距离（a/b 为 IPA 字符串或已编码序列），按输入对缓存"""
+        key = (self._key(a), self._key(b))
+        d = self._distances.get(key)
+        if d is None:
+            A = self.encode(a) if isinstance(a, str) else a
+            B = self.encode(b) if isinstance(b, str) else b
+            d = self._distance(A, B) if A and B else float(max(len(A), len(B)))
+            if len(self._distances) >= self._CACHE_LIMIT:
+                self._distances.clear()
+            self._distances[key] = d
+        return d
+
+    def _distance(self, A: Sequence[int], B: Sequence[int]) -> float:
+        self.cost_matrix()
+        rows = self._cost_rows
+        prev = [float(j) for j in range(len(B) + 1)]
+        for i, x in enumerate(A, 1):
+            row = rows[x]
+            cur = [float(i)]
+            for j, y in enumerate(B, 1):
+                cur.append(min(prev[j] + 1.0, cur[j - 1] + 1.0, prev[j - 1] + row[y]))
+            prev = cur
+        return prev[-1]
+
+    def similarity(self, a, b) -> float:
+        """1 - 距离 / 较长序列长度，与 Levenshtein.normalized_similarity 同量纲"""
+        if isinstance(a, str) and isinstance(b, str):
+            sim = self._similarities.get((a, b))
+            if sim is None:
+                sim = self._similarity(a, b)
+                if len(self._similarities) >= self._CACHE_LIMIT:
+                    self._similarities.clear()
+                self._similarities[(a, b)] = sim
+            return sim
+        return self._similarity(a, b)
+
+    def _similarity(self, a, b) -> float:
+        A = self.encode(a) if isinstance(a, str) else a
+        B = self.encode(b) if isinstance(b, str) else b
+        longest = max(len(A), len(B))
+        if longest == 0:
+            return 1.0
+        return 1.0 - self.distance(a, b) / longest
+
+    def cache_similarities(self, A: Sequence[str], B: Sequence[str]) -> None:
+        """把 A × B 中尚未缓存的 IPA 字符串对一次性用 similarity_matrix 算出并存入缓存"""
+        sims = self._similarities
+        ub = list(dict.fromkeys(B))
+        ua = [a for a in dict.fromkeys(A) if any((a, b) not in sims for b in ub)]
+        if not ua:
+            return
+        matrix = self.similarity_matrix(ua, ub).tolist()
+        if len(sims) + len(ua) * len(ub) > self._CACHE_LIMIT:
+            sims.clear()
+        for a, row in zip(ua, matrix):
+            for b, sim in zip(ub, row):
+                sims[(a, b)] = sim
+
+    def similarity_matrix(self, A: Sequence, B: Sequence) -> np.ndarray:
+        """
+        计算 len(A) × len(B) 的加权相似度矩阵（元素为 IPA 字符串或已编码序列）。
+        所有词对一起做动态规划，每行用累积最小值处理行内依赖。
+        """
+        enc_a = [self.encode(x) if isinstance(x, str) else x for x in A]
+        enc_b = [self.encode(x) if isinstance(x, str) else x for x in B]
+        if not enc_a or not enc_b:
+            return np.zeros((len(enc_a), len(enc_b)), dtype=np.float32)
+
+        cost = self.cost_matrix()
+        la = np.array([len(x) for x in enc_a], dtype=np.int64)
+        lb = np.array([len(x) for x in enc_b], dtype=np.int64)
+        Ma, Mb = max(1, int(la.max())), max(1, int(lb.max()))
+        pa = np.zeros((len(enc_a), Ma), dtype=np.int64)
+        pb = np.zeros((len(enc_b), Mb), dtype=np.int64)
+        for i, x in enumerate(enc_a):
+            pa[i, :len(x)] = x
+        for j, y in enumerate(enc_b):
+            pb[j, :len(y)] = y
+
+        # 展平为词对维度 P = |A|·|B|
+        ia = np.repeat(np.arange(len(enc_a)), len(enc_b))
+        ib = np.tile(np.arange(len(enc_b)), len(enc_a))
+        sub = cost[pa[ia][:, :, None], pb[ib][:, None, :]]   # (P, Ma, Mb)
+        cols = np.arange(Mb + 1, dtype=np.float32)
+
+        prev = np.broadcast_to(cols, (len(ia), Mb + 1)).copy()
+        # 记录每个词对在其 a 长度处的行
+        final_rows = np.where((la[ia] == 0)[:, None], prev, 0.0)
+        for i in range(1, Ma + 1):
+            E = np.minimum(prev[:, 1:] + 1.0, prev[:, :-1] + sub[:, i - 1, :])
+            row = np.empty_like(prev)
+            row[:, 0] = i
+            row[:, 1:] = E
+            # row[j] = min_k≤j (row[k] + (j - k))
+            row = np.minimum.accumulate(row - cols, axis=1) + cols
+            done = la[ia] == i
+            if done.any():
+                final_rows[done] = row[done]
+            prev = row
+
+        dist = final_rows[np.arange(len(ia)), lb[ib]]
+        longest = np.maximum(np.maximum(la[ia], lb[ib]), 1)
+        sim = 1.0 - dist / longest
+        sim[(la[ia] == 0) & (lb[ib] == 0)] = 1.0
+        return sim.reshape(len(enc_a), len(enc_b)).astype(np.float32)
+
+
+_inventories: Dict[str, PhonemeInventory] = {}
+_inventories_lock = threading.Lock()
+
+
+def get_inventory(language: str = "") -> PhonemeInventory:
+    """每种语言共享一个符号表"""
+    with _inventories_lock:
+        inv = _inventories.get(language)
+        if inv is None:
+            inv = PhonemeInventory(language)
+            _inventories[language] = inv
+        return inv
+
+
+def benchmark_similarity(pairs: int = 2000):
+    """对比字符 Levenshtein 与整数加权编辑距离（单对 / 批量）"""
+    import random
+    import time
+    from rapidfuzz.distance import Levenshtein
+
+    words = ["bɔ̃ʒuʁ", "vu", "ʒə", "pa", "mɛ̃tənɑ̃", "teatʁ", "tuʒuʁ", "dəmɛ̃", "kɔmedjɛ̃", "lymjɛʁ",
+             "t͡ʃaʊ", "ʁido", "ɛkstʁaɔʁdinɛʁmɑ̃", "sa", "se"]
+    rnd = random.Random(0)
+    A = [rnd.choice(words) for _ in range(pairs)]
+    B = [rnd.choice(words) for _ in range(pairs)]
+    inv = PhonemeInventory("bench")
+
+    t0 = time.perf_counter()
+    for a, b in zip(A, B):
+        Levenshtein.normalized_similarity(a, b)
+    t_lev = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for a, b in zip(A, B):
+        inv.similarity(a, b)
+    t_single = time.perf_counter() - t0
+
+    side = int(pairs ** 0.5)
+    t0 = time.perf_counter()
+    inv.similarity_matrix(A[:side], B[:side])
+    t_batch = time.perf_counter() - t0
+
+    print(f"🧪 音素相似度 ({pairs} 对, 符号表 {len(inv)} 个)")
+    print(f"   字符 Levenshtein:    {t_lev / pairs * 1e6:8.2f} µs/对")
+    print(f"   加权距离（单对）:     {t_single / pairs * 1e6:8.2f} µs/对")
+    print(f"   加权距离（批量矩阵）: {t_batch / (side * side) * 1e6:8.2f} µs/对")
+    for a, b in (("ɛ", "e"), ("ɛ", "k"), ("bɔ̃", "bɔ"), ("se", "sa")):
+        print(f"   {a} ~ {b}: 加权 {inv.similarity(a, b):.2f}, 字符 {Levenshtein.normalized_similarity(a, b):.2f}")
+
+
+if __name__ == "__main__":
+    benchmark_similarity()
@@ -1,31 +1,67 @@
+import threading
+import time
 from typing import List
 from .base import G2PConverter
 
 try:
     from phonemizer.phonemize import phonemize
+    from phonemizer.backend import EspeakBackend
     PHONEMIZER_AVAILABLE = True
 except ImportError:
     PHONEMIZER_AVAILABLE = False
 
 class PhonemizerG2P(G2PConverter):
+    engine_package = "phonemizer"
+
     def __init__(self, language: str = 'fr-fr', njobs: int = 4):
         if not PHONEMIZER_AVAILABLE:
             raise ImportError("Phonemizer library is not installed. Please run 'pip install phonemizer'.")
         self.language = language
         self.njobs = njobs
+        # 每次 phonemize() 都会重新创建 espeak 后端（加载库、设置语音），
+        # 这里在初始化时建好并复用：单词转换不保留标点，批量转换保留标点（与原行为一致）
+        self._word_backend = EspeakBackend(self.language)
+        self._batch_backend = EspeakBackend(self.language, preserve_punctuation=True)
+        # espeak 内部有全局状态，同一后端不能被多个线程同时调用
+        self._lock = threading.Lock()
         print(f"[PhonemizerG2P] Initialized for language: {self.language}")
 
     def convert(self, text: str) -> str:
-        # njobs=1 确保在被高频调用时线程安全
-        return phonemize(text, language=self.language, backend='espeak', strip=True, njobs=1)
+        if not text or not text.strip():
+            return ""
+        with self._lock:
+            return self._word_backend.phonemize([text], strip=True, njobs=1)[0]
 
     def batch_convert(self, texts: List[str]) -> List[str]:
-        # 批量处理时可以使用多核
-        return phonemize(
-            texts,
-            language=self.language,
-            backend="espeak",
-            strip=True,
-            preserve_punctuation=True,
-            njobs=self.njobs
-        )
\ No newline at end of file
+        if not texts:
+            return []
+        # 小批量（如对齐器的在线未命中）不值得启动多进程
+        njobs = self.njobs if len(texts) >= 200 else 1
+        with self._lock:
+            return self._batch_backend.phonemize(list(texts), strip=True, njobs=njobs)
+
+
+def benchmark_phonemizer(language: str = 'fr-fr', repeats: int = 3):
+    """对比逐词调用 phonemize()（每次新建后端）与复用后端的单词延迟"""
+    words = ["bonjour", "je", "vous", "pas", "maintenant", "théâtre", "toujours", "demain"] * 10
+
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for w in words:
+            phonemize(w, language=language, backend='espeak', strip=True, njobs=1)
+    before = (time.perf_counter() - t0) / (repeats * len(words))
+
+    g2p = PhonemizerG2P(language)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for w in words:
+            g2p.convert(w)
+    after = (time.perf_counter() - t0) / (repeats * len(words))
+
+    print(f"🧪 PhonemizerG2P 单词延迟 ({language}, {len(words) * repeats} 次):")
+    print(f"   phonemize() 每次新建后端: {before * 1e3:.2f} ms/词")
+    print(f"   复用 EspeakBackend:       {after * 1e3:.2f} ms/词 ({before / max(after, 1e-9):.1f}x)")
+
+
+if __name__ == "__main__":
+    benchmark_phonemizer()
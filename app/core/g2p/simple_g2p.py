@@ -17,3 +17,7 @@ class SimpleG2P(G2PConverter):
     def batch_convert(self, texts: List[str]) -> List[str]:
         """批量转换：返回原文本列表"""
         return [text.strip() for text in texts]
+
+    def get_engine_identity(self):
+        """无外部依赖，版本固定"""
+        return type(self).__name__, "1", self.language
@@ -1,6 +1,7 @@
 from typing import List, Optional, Dict
 from PySide6.QtCore import QObject, Signal, Slot
 from app.models.models import Cue
+from app.data.cue_index import CueIndex
 
 class SubtitlePlayer(QObject):
     """
@@ -23,10 +24,15 @@ class SubtitlePlayer(QObject):
     windowStateChanged = Signal(int, bool)  # 窗口编号, 激活状态
     secondLanguageStateChanged = Signal(int, bool)  # 窗口编号, 第二语言激活状态
 
-    def __init__(self, cues: List[Cue], parent: Optional[QObject] = None):
+    def __init__(self, cues: List[Cue], parent: Optional[QObject] = None, cue_index: Optional[CueIndex] = None):
         super().__init__(parent)
         self.cues: List[Cue] = cues
         self.idx: int = -1  # 初始索引为-1，表示尚未开始
+        self._current_cue_id: Optional[int] = None  # 列表被编辑后据此重新定位 idx
+        
+        # 台词 id 索引（通常是 ScriptData 共享的那一份）
+        self.cue_index = cue_index if cue_index is not None else CueIndex(cues, parent=self)
+        self.cue_index.indexChanged.connect(self._on_cue_index_changed)
         self._is_playing: bool = False
         
         # 多窗口状态管理
@@ -82,6 +88,7 @@ class SubtitlePlayer(QObject):
         if target_idx is not None:
             old_idx = self.idx
             self.idx = target_idx
+            self._current_cue_id = target_cue.id
             
             print(f"[SubtitlePlayer] Switched to Cue {target_cue.id} (index {target_idx}) - {reason}")
             
@@ -103,10 +110,19 @@ class SubtitlePlayer(QObject):
     
     def _find_cue_index(self, target_cue: Cue) -> Optional[int]:
         """在Cue列表中查找指定Cue的索引"""
-        for i, cue in enumerate(self.cues):
-            if cue.id == target_cue.id:
-                return i
-        return None
+        return self.cue_index.find(self.cues, target_cue.id)
+    
+    @Slot()
+    def _on_cue_index_changed(self):
+        """台词被插入、删除或移动后，让 idx 继续指向同一条台词"""
+        if self._current_cue_id is None or self.cue_index.cues is not self.cues:
+            return
+        new_idx = self.cue_index.index_of(self._current_cue_id)
+        if new_idx is None:
+            # 当前台词已被删除，停在原位置
+            new_idx = min(self.idx, len(self.cues) - 1)
+            self._current_cue_id = self.cues[new_idx].id if new_idx >= 0 else None
+        self.idx = new_idx
 
     # ---------- 手动控制接口 ----------
     def next(self):
@@ -136,6 +152,7 @@ class SubtitlePlayer(QObject):
             old_idx = self.idx
             self.idx = new_idx
             current_cue = self.cues[self.idx]
+            self._current_cue_id = current_cue.id
             
             print(f"[SubtitlePlayer] Manual navigation: {old_idx} -> {new_idx} (Cue {current_cue.id}) - {reason}")
             
@@ -160,6 +177,7 @@ class SubtitlePlayer(QObject):
     def reset(self):
         """重置到初始状态"""
         self.idx = -1
+        self._current_cue_id = None
         self._is_playing = False
         self.playbackStatusChanged.emit("Reset to initial state")
         print("[SubtitlePlayer] Reset to initial state")
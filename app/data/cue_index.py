@@ -0,0 +1,220 @@
+"""
+台词 id 索引
+ScriptData 持有一份 CueIndex，维护 台词 id → 列表位置 / Cue 对象 的映射，
+Director、SubtitlePlayer、ScriptTableModel、PlayControlWindow 共享它做常数时间查找。
+
+- 修改列表的一方（主要是 ScriptTableModel）在插入、删除、移动后调用 inserted / removed / moved，
+  只更新受影响区间内台词的位置；排序、整体替换后调用 rebuild
+- 查找时校验命中的位置确实是该 id，列表被绕过通知修改过（如加载时直接 append）则自动重建，
+  结果始终与线性扫描一致（重复 id 时取第一条）
+- 位置发生变化后发出 indexChanged，持有"当前位置"的组件据此重新定位
+
+同时按角色维护有序的位置列表（角色名去除首尾空白后作为键，None 单独成组），
+"角色 X 在位置 i 之前/之后最近的一句"用 bisect 在 O(log n) 内回答，
+供多屏角色分配显示和表格的角色筛选使用。编辑角色名后需调用 character_changed。
+"""
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+from typing import Dict, Iterable, List, Optional
+
+from PySide6.QtCore import QObject, Signal
+
+from app.models.models import Cue
+
+
+def character_key(character: Optional[str]) -> Optional[str]:
+    return character.strip() if isinstance(character, str) else character
+
+
+class CueIndex(QObject):
+    """台词 id → 位置 / Cue 的增量索引"""
+
+    indexChanged = Signal()  # 台词位置发生变化（插入、删除、移动、重建）
+
+    def __init__(self, cues: Optional[List[Cue]] = None, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._cues: List[Cue] = []
+        self._positions: Dict[int, int] = {}
+        self._character_rows: Dict[Optional[str], List[int]] = {}
+        self._size = 0
+        self._has_duplicates = False
+        self.attach(cues if cues is not None else [])
+
+    @property
+    def cues(self) -> List[Cue]:
+        return self._cues
+
+    def attach(self, cues: List[Cue]):
+        """绑定（按引用）新的台词列表并重建索引"""
+        self._cues = cues
+        self.rebuild()
+
+    def rebuild(self):
+        """全量重建，用于排序、整体替换等无法增量描述的修改"""
+        self._reindex_all()
+        self.indexChanged.emit()
+
+    def _reindex_all(self):
+        positions: Dict[int, int] = {}
+        character_rows: Dict[Optional[str], List[int]] = {}
+        for i, cue in enumerate(self._cues):
+            positions.setdefault(cue.id, i)
+            character_rows.setdefault(character_key(cue.character), []).append(i)
+        self._positions = positions
+        self._character_rows = character_rows
+        self._size = len(self._cues)
+        self._has_duplicates = len(positions) != self._size
+
+    # ---------- 查询 ----------
+
+    def index_of(self, cue_id: int) -> Optional[int]:
+        """台词 id 对应的位置，不存在返回 None"""
+        i = self._positions.get(cue_id)
+        cues = self._cues
+        if i is not None and i < len(cues) and cues[i].id == cue_id:
+            return i
+        if i is not None or len(cues) != self._size:
+            # 列表被绕过通知修改过
+            self._reindex_all()
+            i = self._positions.get(cue_id)
+        return i
+
+    def find(self, cues: List[Cue], cue_id: int) -> Optional[int]:
+        """
+        在调用方持有的列表中查找：列表正是本索引绑定的那一份时走索引，
+        否则（共享索引已改绑到别的列表）退回线性扫描，结果不会错位
+        """
+        if cues is self._cues:
+            return self.index_of(cue_id)
+        for i, cue in enumerate(cues):
+            if cue.id == cue_id:
+                return i
+        return None
+
+    def index_of_cue(self, cue: Cue) -> Optional[int]:
+        return self.index_of(cue.id)
+
+    def cue_by_id(self, cue_id: int) -> Optional[Cue]:
+        i = self.index_of(cue_id)
+        return self._cues[i] if i is not None else None
+
+    def _rows_of(self, character: Optional[str]) -> List[int]:
+        if len(self._cues) != self._size:
+            self._reindex_all()
+        return self._character_rows.get(character_key(character), [])
+
+    def _checked(self, character: Optional[str], row: Optional[int], query) -> Optional[int]:
+        # 角色名被绕过 character_changed 修改过时重建后重查
+        if row is not None and character_key(self._cues[row].character) != character_key(character):
+            self._reindex_all()
+            row = query()
+        return row
+
+    def last_of_character(self, character: Optional[str], index: int) -> Optional[int]:
+        """角色 character 在位置 index（含）之前的最后一句台词的位置"""
+        def query():
+            rows = self._rows_of(character)
+            k = bisect_right(rows, index)
+            return rows[k - 1] if k else None
+        return self._checked(character, query(), query)
+
+    def next_of_character(self, character: Optional[str], index: int) -> Optional[int]:
+        """角色 character 在位置 index 之后的第一句台词的位置（用于预加载）"""
+        def query():
+            rows = self._rows_of(character)
+            k = bisect_right(rows, index)
+            return rows[k] if k < len(rows) else None
+        return self._checked(character, query(), query)
+
+    def rows_of_characters(self, characters: Iterable[Optional[str]]) -> List[int]:
+        """属于任一给定角色的所有台词位置（升序）"""
+        keys = {character_key(c) for c in characters}
+        if len(self._cues) != self._size:
+            self._reindex_all()
+        groups = [self._character_rows[k] for k in keys if k in self._character_rows]
+        if len(groups) == 1:
+            return list(groups[0])
+        return list(merge(*groups))
+
+    def __contains__(self, cue_id: int) -> bool:
+        return self.index_of(cue_id) is not None
+
+    def __len__(self) -> int:
+        return len(self._cues)
+
+    # ---------- 增量更新（在列表修改之后调用） ----------
+
+    def _shift_character_rows(self, start: int, stop: Optional[int], delta: int):
+        """位置在 [start, stop) 内的角色行号整体加 delta（有序性不变）"""
+        for rows in self._character_rows.values():
+            lo = bisect_left(rows, start)
+            hi = len(rows) if stop is None else bisect_left(rows, stop)
+            if lo < hi:
+                rows[lo:hi] = [r + delta for r in rows[lo:hi]]
+
+    def _add_character_row(self, row: int):
+        insort(self._character_rows.setdefault(character_key(self._cues[row].character), []), row)
+
+    def _discard_character_row(self, character: Optional[str], row: int):
+        key = character_key(character)
+        rows = self._character_rows.get(key)
+        if rows:
+            k = bisect_left(rows, row)
+            if k < len(rows) and rows[k] == row:
+                del rows[k]
+            if not rows:
+                del self._character_rows[key]
+
+    def character_changed(self, index: int, old_character: Optional[str]):
+        """位置 index 的台词角色名由 old_character 改成了当前值"""
+        self._discard_character_row(old_character, index)
+        self._add_character_row(index)
+
+    def _reindex_range(self, start: int, stop: int):
+        positions = self._positions
+        cues = self._cues
+        for i in range(start, min(stop, len(cues))):
+            positions[cues[i].id] = i
+        self._size = len(cues)
+
+    def inserted(self, index: int, count: int = 1):
+        """列表在 index 处插入了 count 条台词"""
+        new_ids = {cue.id for cue in self._cues[index:index + count]}
+        if self._has_duplicates or len(new_ids) != count or any(cid in self._positions for cid in new_ids):
+            self.rebuild()
+            return
+        self._shift_character_rows(index, None, count)
+        for row in range(index, index + count):
+            self._add_character_row(row)
+        self._reindex_range(index, len(self._cues))
+        self.indexChanged.emit()
+
+    def appended(self, count: int):
+        """列表末尾追加了 count 条台词"""
+        self.inserted(len(self._cues) - count, count)
+
+    def removed(self, index: int, cues: List[Cue]):
+        """列表从 index 处删除了 cues"""
+        if self._has_duplicates:
+            self.rebuild()
+            return
+        for offset, cue in enumerate(cues):
+            self._positions.pop(cue.id, None)
+            self._discard_character_row(cue.character, index + offset)
+        self._shift_character_rows(index + len(cues), None, -len(cues))
+        self._reindex_range(index, len(self._cues))
+        self.indexChanged.emit()
+
+    def moved(self, from_index: int, to_index: int):
+        """一条台词从 from_index 移到了 to_index（均为移动后的列表位置）"""
+        if self._has_duplicates:
+            self.rebuild()
+            return
+        self._discard_character_row(self._cues[to_index].character, from_index)
+        if from_index < to_index:
+            self._shift_character_rows(from_index + 1, to_index + 1, -1)
+        else:
+            self._shift_character_rows(to_index, from_index, 1)
+        self._add_character_row(to_index)
+        self._reindex_range(min(from_index, to_index), max(from_index, to_index) + 1)
+        self.indexChanged.emit()
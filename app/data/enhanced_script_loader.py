@@ -5,17 +5,19 @@
 支持meta词条检验、dataclass格式校验、音素检验、缓存等功能
 """
 
+import copy
 import json
 import logging
-import hashlib
-import pickle
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, Iterator, List, Tuple, Optional, Any
 from dataclasses import asdict, is_dataclass
 from datetime import datetime
 
 from app.models.models import Meta, Style, Cue, SubtitleDocument
 from app.core.g2p.base import G2PConverter
+from app.data.script_cache import DEFAULT_CACHE_DIR, FeatureCache, ScriptCacheError
+from app.data.file_hash_index import file_content_hash
+from app.data.script_stream import iter_script_json, ScriptStreamError
 try:
     from app.utils.script_conversion_utils import ScriptConverter
     CONVERSION_AVAILABLE = True
@@ -32,13 +34,18 @@ class ScriptValidationError(Exception):
 class EnhancedScriptLoader:
     """增强版剧本加载器"""
     
-    def __init__(self, g2p_converter: Optional[G2PConverter] = None, head_tail_count: int = 5):
+    def __init__(self, g2p_converter: Optional[G2PConverter] = None, head_tail_count: int = 5,
+                 ngram_size: int = 2, cache_budget_mb: float = 512.0):
         self.g2p_converter = g2p_converter
         self.validation_results = {}
         self.conversion_results = {}
         self.head_tail_count = head_tail_count  # 头部和尾部词语数量
-        self.cache_dir = Path("cache/scripts")  # 缓存目录
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.ngram_size = ngram_size  # 整句n-gram的n
+        self.cache_dir = DEFAULT_CACHE_DIR  # 缓存目录（项目根目录下，与工作目录无关）
+        # 按 (内容哈希, 特征配置) 存放多个变体，LRU 控制磁盘占用
+        self.feature_cache = FeatureCache(self.cache_dir, budget_mb=cache_budget_mb)
+        # 本次加载的词级音素表 {词: 音素}，由词表预处理一次性填充
+        self._vocab_phonemes: Dict[str, str] = {}
         
     def load_script(self, filepath: str) -> Tuple[SubtitleDocument, Dict[str, Any]]:
         """
@@ -58,10 +65,11 @@ class EnhancedScriptLoader:
         print(f"🔍 文件哈希: {file_hash[:16]}...")
         
         # 2. 检查缓存
-        cached_document = self._load_from_cache(file_hash)
-        if cached_document:
+        cached = self._load_from_cache(file_hash)
+        if cached:
+            cached_document, cache_extra = cached
             print("✅ 从缓存加载成功")
-            report = self._generate_cache_report(cached_document)
+            report = self._generate_cache_report(cached_document, cache_extra.get("summary"))
             return cached_document, report
         
         # 3. 加载JSON数据
@@ -82,27 +90,129 @@ class EnhancedScriptLoader:
         document.meta.hash = file_hash
         document.meta.updated_at = datetime.now().isoformat()
         
-        # 7. 检查音素并进行G2P处理
+        # 7. 提取全剧去重词表，一次性批量G2P
+        print("🔍 构建剧本词表音素...")
+        vocab_results = self._prepare_vocabulary(document)
+        
+        # 8. 检查音素并由词表组装整句音素
         print("🔍 检查音素数据...")
         g2p_results = self._process_phonemes(document)
         
-        # 8. 处理头部和尾部词语
+        # 9. 处理头部和尾部词语
         print("🔍 处理头部和尾部词语...")
         head_tail_results = self._process_head_tail_tokens(document)
         
-        # 9. 处理整句n-gram生成
+        # 10. 处理整句n-gram生成
         print("🔍 生成整句n-gram特征...")
-        ngram_results = self._process_line_ngrams(document, n=2)
+        ngram_results = self._process_line_ngrams(document, n=self.ngram_size)
         
-        # 10. 保存到缓存
+        # 11. 保存到缓存
         self._save_to_cache(document, file_hash)
         
-        # 11. 生成加载报告
+        # 12. 生成加载报告
         report = self._generate_load_report(document, g2p_results, head_tail_results, ngram_results)
+        report["vocabulary"] = vocab_results
         
         print("✅ 剧本加载完成")
         return document, report
         
+    def stream_script(self, filepath: str, batch_size: int = 500) -> Iterator[Tuple[SubtitleDocument, List[Cue]]]:
+        """
+        流式加载剧本，逐批产出 (文档, 本批台词)。
+        
+        文件按块解析（不整体 json.load），每批台词完成校验、标准化和特征计算后立即产出，
+        调用方可以先显示第一幕。文档对象在第一批时创建并随后续批次增长；
+        meta 位于 cues 之后的文件，其 meta 在后续批次中更新。
+        缓存命中时一次产出全部台词；全部产出后写入特征缓存。
+        
+        产出的文档与台词都是副本：调用方（GUI）在加载期间编辑台词、增加翻译，
+        不会写进按原文件哈希保存的缓存，也不会与写缓存的线程同时读写同一对象。
+        """
+        file_path = Path(filepath)
+        if not file_path.exists():
+            raise FileNotFoundError(f"剧本文件不存在: {file_path}")
+        
+        print(f"🔍 开始流式加载剧本: {file_path.name}")
+        file_hash = self._calculate_file_hash(file_path)
+        
+        cached = self._load_from_cache(file_hash)
+        if cached:
+            print("✅ 从缓存加载成功")
+            document = cached[0]
+            yield document, document.cues
+            return
+        
+        document = SubtitleDocument(cues=[])  # 加载器私有，用于写缓存
+        public = SubtitleDocument(cues=[])    # 交给调用方
+        has_meta = False
+        errors: List[str] = []
+        batch: List[Cue] = []
+        self._vocab_phonemes = {}
+        
+        try:
+            for kind, payload in iter_script_json(file_path):
+                if kind == "field":
+                    key, value = payload
+                    if key == "meta" and isinstance(value, dict):
+                        try:
+                            document.meta = Meta(**value)
+                        except TypeError as e:
+                            raise ScriptValidationError(f"meta 格式错误: {e}")
+                        has_meta = True
+                    elif key == "styles" and isinstance(value, dict):
+                        document.styles = self._create_styles(value, errors)
+                    continue
+                batch.append(self._create_cue(payload, len(document.cues) + len(batch), errors))
+                if len(batch) >= batch_size:
+                    yield public, self._publish_batch(document, public, batch)
+                    batch = []
+        except ScriptStreamError as e:
+            raise ScriptValidationError(str(e))
+        
+        if batch:
+            yield public, self._publish_batch(document, public, batch)
+        
+        if not has_meta:
+            document.meta = Meta(**self._convert_legacy_format({}, file_path)["meta"])
+            document.meta.language = document.get_all_languages()
+        if errors:
+            print(f"⚠️ 发现 {len(errors)} 个格式问题")
+        document.meta.hash = file_hash
+        document.meta.updated_at = datetime.now().isoformat()
+        # 调用方在生成器耗尽后读取的最终文档即 public，同步最终的 meta
+        public.meta = copy.deepcopy(document.meta)
+        self._save_to_cache(document, file_hash)
+        print(f"✅ 流式加载完成: {len(document.cues)} 条台词")
+        
+    def _publish_batch(self, document: SubtitleDocument, public: SubtitleDocument,
+                       batch: List[Cue]) -> List[Cue]:
+        """处理一批台词并并入私有文档，返回交给调用方的副本（meta/styles 一并同步为副本）"""
+        self._process_batch(batch)
+        document.cues.extend(batch)
+        copies = [cue.copy() for cue in batch]
+        public.cues.extend(copies)
+        public.meta = copy.deepcopy(document.meta)
+        public.styles = copy.deepcopy(document.styles)
+        return copies
+        
+    def _process_batch(self, cues: List[Cue]):
+        """对一批台词做词表G2P、音素、头尾词和n-gram处理（词表跨批次累积）"""
+        batch_document = SubtitleDocument(cues=cues)
+        self._prepare_vocabulary(batch_document, reset=False)
+        self._process_phonemes(batch_document)
+        self._process_head_tail_tokens(batch_document)
+        self._process_line_ngrams(batch_document, n=self.ngram_size)
+        
+    def _create_styles(self, styles_data: Dict[str, Any], errors: List[str]) -> Dict[str, Style]:
+        styles = {}
+        for name, style_data in styles_data.items():
+            try:
+                styles[name] = Style(**style_data)
+            except Exception as e:
+                errors.append(f"样式 '{name}' 格式错误: {e}")
+                styles[name] = Style()  # 使用默认样式
+        return styles
+        
     def _load_json(self, filepath: Path) -> Dict[str, Any]:
         """加载JSON文件"""
         try:
@@ -470,34 +580,14 @@ class EnhancedScriptLoader:
             
             # 验证styles字段
             styles_data = data.get("styles", {"default": {}})
-            styles = {}
-            for name, style_data in styles_data.items():
-                try:
-                    styles[name] = Style(**style_data)
-                except Exception as e:
-                    errors.append(f"样式 '{name}' 格式错误: {e}")
-                    styles[name] = Style()  # 使用默认样式
+            styles = self._create_styles(styles_data, errors)
                     
             # 验证cues字段
             cues_data = data.get("cues", [])
             cues = []
             
             for i, cue_data in enumerate(cues_data):
-                try:
-                    # 处理可能缺失的字段
-                    cue_dict = self._normalize_cue_data(cue_data, i)
-                    cue = Cue(**cue_dict)
-                    cues.append(cue)
-                except Exception as e:
-                    errors.append(f"台词 {i+1} 格式错误: {e}")
-                    # 创建一个最小的有效cue
-                    cues.append(Cue(
-                        id=i+1,
-                        character=cue_data.get("character"),
-                        line=cue_data.get("line", ""),
-                        phonemes="",
-                        notes=f"格式错误: {e}"
-                    ))
+                cues.append(self._create_cue(cue_data, i, errors))
                     
             if errors:
                 print(f"⚠️ 发现 {len(errors)} 个格式问题：")
@@ -522,6 +612,22 @@ class EnhancedScriptLoader:
         except Exception as e:
             raise ScriptValidationError(f"文档创建失败: {e}")
             
+    def _create_cue(self, cue_data: Dict[str, Any], index: int, errors: List[str]) -> Cue:
+        """标准化并创建单条台词；格式错误时记录到 errors 并返回最小的有效cue"""
+        try:
+            # 处理可能缺失的字段
+            return Cue(**self._normalize_cue_data(cue_data, index))
+        except Exception as e:
+            errors.append(f"台词 {index+1} 格式错误: {e}")
+            get = cue_data.get if isinstance(cue_data, dict) else (lambda key, default=None: default)
+            return Cue(
+                id=index+1,
+                character=get("character"),
+                line=get("line", ""),
+                phonemes="",
+                notes=f"格式错误: {e}"
+            )
+            
     def _normalize_cue_data(self, cue_data: Dict[str, Any], index: int) -> Dict[str, Any]:
         """标准化cue数据，补充缺失字段"""
         # 生成pure_line（如果原数据中没有）
@@ -586,8 +692,9 @@ class EnhancedScriptLoader:
             if not cue.phonemes or not cue.phonemes.strip():  # 没有音素
                 # 优先使用pure_line，如果没有则使用清理后的line
                 text_for_g2p = cue.pure_line if cue.pure_line else self._clean_text_for_ngram(cue.line)
-                if text_for_g2p.strip():
-                    lines_to_process.append(text_for_g2p)
+                tokens = self._tokenize_for_ngram(text_for_g2p)
+                if tokens:
+                    lines_to_process.append(tokens)
                     indices_to_process.append(i)
                 else:
                     skipped += 1
@@ -596,11 +703,15 @@ class EnhancedScriptLoader:
                 skipped += 1
                 
         if lines_to_process:
-            print(f"🔄 对 {len(lines_to_process)} 条台词进行G2P转换...")
+            print(f"🔄 对 {len(lines_to_process)} 条台词组装音素...")
             
             try:
-                # 批量G2P转换
-                phonemes_results = self.g2p_converter.batch_convert(lines_to_process)
+                # 由词表音素拼接整句音素（词表中没有的词在此一次性补转换）
+                self._lookup_phonemes([t for tokens in lines_to_process for t in tokens])
+                phonemes_results = [
+                    " ".join(p for p in self._lookup_phonemes(tokens) if p)
+                    for tokens in lines_to_process
+                ]
                 
                 # 更新cue对象的音素
                 for idx, phonemes in zip(indices_to_process, phonemes_results):
@@ -627,58 +738,148 @@ class EnhancedScriptLoader:
             "total": len(document.cues)
         }
     
+    def _prepare_vocabulary(self, document: SubtitleDocument, reset: bool = True) -> Dict[str, Any]:
+        """
+        词表预处理：收集整句、头尾词、n-gram 用到的所有词，去重后一次性批量G2P。
+        后续各步骤只查表，高频词（je、vous、pas……）在整次加载中只转换一次。
+        流式加载时 reset=False，词表跨批次累积，已转换的词不再重复转换。
+        """
+        if reset:
+            self._vocab_phonemes = {}
+        if not self.g2p_converter:
+            return {"unique_words": 0, "total_tokens": 0}
+        
+        vocabulary: Dict[str, None] = {}
+        total_tokens = 0
+        for cue in document.cues:
+            if not cue.line.strip():
+                continue
+            text = cue.pure_line if cue.pure_line else self._clean_text_for_ngram(cue.line)
+            tokens = self._tokenize_for_ngram(text)
+            head_tokens, tail_tokens = self._extract_head_tail_tokens(text)
+            for token in (*tokens, *head_tokens, *tail_tokens):
+                vocabulary[token] = None
+            total_tokens += len(tokens)
+        
+        unique_words = list(vocabulary)
+        try:
+            self._lookup_phonemes(unique_words)
+        except Exception as e:
+            print(f"❌ 词表G2P转换失败: {e}")
+            return {"unique_words": len(unique_words), "total_tokens": total_tokens, "errors": [str(e)]}
+        
+        print(f"✅ 词表音素: {total_tokens} 个词次 -> {len(unique_words)} 个不同词，一次批量转换")
+        return {"unique_words": len(unique_words), "total_tokens": total_tokens}
+    
+    def _lookup_phonemes(self, tokens: List[str]) -> List[str]:
+        """从词表查音素；表中缺失的词去重后用一次 batch_convert 补齐"""
+        missing = [t for t in dict.fromkeys(tokens) if t not in self._vocab_phonemes]
+        if missing:
+            self._vocab_phonemes.update(zip(missing, self.g2p_converter.batch_convert(missing)))
+        return [self._vocab_phonemes[t] for t in tokens]
+    
     def _calculate_file_hash(self, filepath: Path) -> str:
-        """计算文件哈希值"""
-        hasher = hashlib.md5()
-        with open(filepath, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        """计算文件内容哈希（文件未变化时由哈希索引直接返回）"""
+        return file_content_hash(filepath)
     
-    def _load_from_cache(self, file_hash: str) -> Optional[SubtitleDocument]:
-        """从缓存加载文档"""
-        cache_file = self.cache_dir / f"{file_hash}.cache"
-        if not cache_file.exists():
+    def feature_variant(self) -> Dict[str, Any]:
+        """
+        决定缓存特征内容的全部配置：G2P 引擎、引擎版本、语言、n-gram 大小、头尾词数。
+        任一项变化都对应不同的缓存变体。
+        """
+        if self.g2p_converter is not None and hasattr(self.g2p_converter, 'get_engine_identity'):
+            engine, version, language = self.g2p_converter.get_engine_identity()
+        elif self.g2p_converter is not None:
+            engine, version, language = type(self.g2p_converter).__name__, "", str(getattr(self.g2p_converter, 'language', ''))
+        else:
+            engine, version, language = "", "", ""
+        return {
+            "engine": engine,
+            "engine_version": version,
+            "language": language,
+            "ngram_sizes": [self.ngram_size],
+            "head_tail_count": self.head_tail_count,
+        }
+    
+    def load_cached_variant(self, filepath: str) -> Optional[Tuple[SubtitleDocument, Dict[str, Any]]]:
+        """
+        只查缓存：当前 G2P 配置的特征变体已预计算时直接返回 (文档, 报告)，否则返回 None。
+        用于切换引擎时在已缓存的变体之间即时切换。
+        """
+        file_path = Path(filepath)
+        if not file_path.exists():
             return None
-            
+        file_hash = self._calculate_file_hash(file_path)
+        cached = self._load_from_cache(file_hash)
+        if not cached:
+            return None
+        document, extra = cached
+        return document, self._generate_cache_report(document, extra.get("summary"))
+    
+    def recompute_cue_features(self, cues: List[Cue]) -> List[Cue]:
+        """
+        只为给定台词重算特征（pure_line、音素、头尾词、n-gram），用于编辑后的增量更新。
+        不修改传入的台词，返回带新特征的副本，由调用方统一写回。
+        """
+        copies = [
+            Cue(
+                id=cue.id,
+                character=cue.character,
+                line=cue.line,
+                pure_line=self._clean_text_for_ngram(cue.line) if cue.line else "",
+                character_cue_index=cue.character_cue_index,
+                translation=dict(cue.translation or {}),
+                notes=cue.notes,
+                style=cue.style,
+            ) for cue in cues
+        ]
+        document = SubtitleDocument(cues=copies)
+        self._prepare_vocabulary(document)
+        self._process_phonemes(document)
+        self._process_head_tail_tokens(document)
+        self._process_line_ngrams(document, n=self.ngram_size)
+        return copies
+    
+    def _load_from_cache(self, file_hash: str) -> Optional[Tuple[SubtitleDocument, Dict[str, Any]]]:
+        """从列式缓存加载当前特征变体（台词按需物化）"""
         try:
-            with open(cache_file, 'rb') as f:
-                cached_data = pickle.load(f)
-                
-            # 验证缓存版本兼容性
-            if cached_data.get('version') != '1.0':
-                print("⚠️ 缓存版本不兼容，重新加载")
-                return None
-                
-            document = cached_data.get('document')
-            if isinstance(document, SubtitleDocument):
-                return document
-                
+            return self.feature_cache.load(file_hash, self.feature_variant())
+        except ScriptCacheError as e:
+            print(f"⚠️ {e}，重新加载")
         except Exception as e:
             print(f"⚠️ 缓存加载失败: {e}")
             
         return None
     
     def _save_to_cache(self, document: SubtitleDocument, file_hash: str):
-        """保存文档到缓存"""
+        """保存当前特征变体到列式缓存"""
         try:
-            cache_file = self.cache_dir / f"{file_hash}.cache"
-            cache_data = {
-                'version': '1.0',
-                'document': document,
-                'cached_at': datetime.now().isoformat()
+            extra = {
+                'cached_at': datetime.now().isoformat(),
+                'summary': self._summarize_cues(document),
             }
-            
-            with open(cache_file, 'wb') as f:
-                pickle.dump(cache_data, f)
-                
+            cache_file = self.feature_cache.store(file_hash, self.feature_variant(), document, extra)
             print(f"✅ 已保存到缓存: {cache_file.name}")
             
         except Exception as e:
             print(f"⚠️ 缓存保存失败: {e}")
     
-    def _generate_cache_report(self, document: SubtitleDocument) -> Dict[str, Any]:
+    def _summarize_cues(self, document: SubtitleDocument) -> Dict[str, Any]:
+        """台词统计（写入缓存头，缓存命中时无需物化全部台词）"""
+        return {
+            "valid_cues": len([c for c in document.cues if c.line.strip()]),
+            "empty_cues": len([c for c in document.cues if not c.line.strip()]),
+            "cues_with_phonemes": len([c for c in document.cues if c.phonemes and c.phonemes.strip()]),
+            "cues_with_head_tail": len([c for c in document.cues if c.head_tok or c.tail_tok]),
+            "cues_with_line_ngrams": len([c for c in document.cues if c.line_ngram]),
+            "characters": len(set(c.character for c in document.cues if c.character)),
+            "available_languages": getattr(document, 'get_all_languages', lambda: [])(),
+        }
+    
+    def _generate_cache_report(self, document: SubtitleDocument,
+                               summary: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """生成缓存加载报告"""
+        summary = summary or self._summarize_cues(document)
         return {
             "file_info": {
                 "title": document.meta.title,
@@ -691,15 +892,7 @@ class EnhancedScriptLoader:
             "validation": {"from_cache": True},
             "g2p_processing": {"from_cache": True},
             "head_tail_processing": {"from_cache": True},
-            "summary": {
-                "valid_cues": len([c for c in document.cues if c.line.strip()]),
-                "empty_cues": len([c for c in document.cues if not c.line.strip()]),
-                "cues_with_phonemes": len([c for c in document.cues if c.phonemes and c.phonemes.strip()]),
-                "cues_with_head_tail": len([c for c in document.cues if c.head_tok or c.tail_tok]),
-                "cues_with_line_ngrams": len([c for c in document.cues if c.line_ngram]),
-                "characters": len(set(c.character for c in document.cues if c.character)),
-                "available_languages": getattr(document, 'get_all_languages', lambda: [])()
-            }
+            "summary": summary
         }
     
     def _process_head_tail_tokens(self, document: SubtitleDocument) -> Dict[str, Any]:
@@ -722,14 +915,14 @@ class EnhancedScriptLoader:
                 text_to_process = cue.pure_line if cue.pure_line else cue.line
                 head_tokens, tail_tokens = self._extract_head_tail_tokens(text_to_process)
                 
-                # 对词语进行G2P转换
+                # 从词表查音素
                 if head_tokens:
-                    head_phonemes = self.g2p_converter.batch_convert(head_tokens)
+                    head_phonemes = self._lookup_phonemes(head_tokens)
                     cue.head_tok = head_tokens
                     cue.head_phonemes = head_phonemes
                     
                 if tail_tokens:
-                    tail_phonemes = self.g2p_converter.batch_convert(tail_tokens)
+                    tail_phonemes = self._lookup_phonemes(tail_tokens)
                     cue.tail_tok = tail_tokens
                     cue.tail_phonemes = tail_phonemes
                 
@@ -774,15 +967,11 @@ class EnhancedScriptLoader:
                     line_ngrams = self._create_ngrams(tokens, n)
                     cue.line_ngram = line_ngrams
                     
-                    # 对每个n-gram中的token进行G2P转换，然后生成音素n-gram
+                    # 从词表查每个token的音素，然后生成音素n-gram
+                    token_phonemes = dict(zip(tokens, self._lookup_phonemes(tokens)))
                     phoneme_ngrams = []
                     for ngram in line_ngrams:
-                        # 将ngram中的每个token转换为音素
-                        phoneme_tokens = []
-                        for token in ngram:
-                            phoneme = self.g2p_converter.convert(token)
-                            if phoneme:
-                                phoneme_tokens.append(phoneme)
+                        phoneme_tokens = [token_phonemes[token] for token in ngram if token_phonemes[token]]
                         
                         if phoneme_tokens:
                             phoneme_ngrams.append(tuple(phoneme_tokens))
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文件内容哈希索引
+按 (路径, 大小, mtime_ns, ctime_ns, inode, 设备) 记录文件内容哈希，文件未变化时跳过重新读取。
+
+- 需要计算时使用 BLAKE2b（128 位）和 1 MB 缓冲的 readinto，比 4 KB 分块的 MD5 快得多
+- "竞态条目"处理（同 git index）：若文件 mtime 距离计算哈希的时刻不足 RACY_WINDOW_NS，
+  说明在同一时间戳粒度内文件仍可能被改写而 mtime 不变，此时不信任 stat，重新计算。
+  这覆盖了 FAT/SMB 的 2 秒 mtime 粒度和网络盘的属性缓存延迟
+- POSIX 上同时比较 ctime（无法被 utime 回拨），cp -p / rsync -t 还原 mtime 也能识别
+
+索引以 JSON 保存在项目根目录下的 cache/hash_index.json，原子替换写入。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from app.utils.paths import CACHE_DIR
+
+DEFAULT_INDEX_PATH = CACHE_DIR / "hash_index.json"
+HASH_ALGORITHM = "blake2b-128"
+READ_BUFFER_SIZE = 1024 * 1024
+RACY_WINDOW_NS = 3_000_000_000
+MAX_ENTRIES = 4096
+
+
+def hash_file(filepath) -> str:
+    """用大缓冲区顺序读取并计算 BLAKE2b-128 十六进制摘要"""
+    hasher = hashlib.blake2b(digest_size=16)
+    buffer = bytearray(READ_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(filepath, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            hasher.update(view[:n])
+    return hasher.hexdigest()
+
+
+def hash_bytes(data: bytes) -> str:
+    """内存中内容的摘要，与 hash_file 对同样内容的结果一致"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _stat_key(st: os.stat_result) -> List[int]:
+    # Windows 上 st_ctime 是创建时间，不随内容变化，不参与比较
+    ctime = 0 if os.name == "nt" else st.st_ctime_ns
+    return [st.st_size, st.st_mtime_ns, ctime, st.st_ino, st.st_dev]
+
+
+class FileHashIndex:
+    """stat 快速路径的文件哈希索引（线程安全）"""
+
+    def __init__(self, index_path=DEFAULT_INDEX_PATH):
+        self.index_path = Path(index_path)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("algorithm") == HASH_ALGORITHM:
+                self._entries = data.get("entries", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 哈希索引读取失败，将重建: {e}")
+
+    def _save(self):
+        if not self._dirty:
+            return
+        if len(self._entries) > MAX_ENTRIES:
+            # 保留最近计算的条目
+            keep = sorted(self._entries.items(), key=lambda kv: kv[1]["hashed_at_ns"])[-MAX_ENTRIES:]
+            self._entries = dict(keep)
+        try:
+            self.index_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.index_path.with_name(self.index_path.name + f".{os.getpid()}.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"algorithm": HASH_ALGORITHM, "entries": self._entries}, f)
+            os.replace(tmp, self.index_path)
+            self._dirty = False
+        except OSError as e:
+            print(f"⚠️ 哈希索引保存失败: {e}")
+
+    def hash(self, filepath) -> str:
+        """返回文件内容哈希；stat 未变化且不处于竞态窗口时直接取索引"""
+        key = os.path.abspath(filepath)
+        st = os.stat(key)
+        stat_key = _stat_key(st)
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is not None and entry["stat"] == stat_key
+                    and entry["hashed_at_ns"] - st.st_mtime_ns > RACY_WINDOW_NS):
+                self.hits += 1
+                return entry["hash"]
+
+        digest = hash_file(key)
+        hashed_at = time.time_ns()
+        # 计算期间文件被改写则不记录，下次重新计算
+        if _stat_key(os.stat(key)) == stat_key:
+            with self._lock:
+                self._entries[key] = {"stat": stat_key, "hash": digest, "hashed_at_ns": hashed_at}
+                self._dirty = True
+                self.misses += 1
+                self._save()
+        return digest
+
+    def invalidate(self, filepath):
+        with self._lock:
+            if self._entries.pop(os.path.abspath(filepath), None) is not None:
+                self._dirty = True
+                self._save()
+
+
+_default_index: Optional[FileHashIndex] = None
+_default_lock = threading.Lock()
+
+
+def get_hash_index() -> FileHashIndex:
+    """进程内共享的默认索引"""
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = FileHashIndex()
+        return _default_index
+
+
+def file_content_hash(filepath) -> str:
+    """便捷接口：经默认索引取文件内容哈希"""
+    return get_hash_index().hash(filepath)
@@ -0,0 +1,545 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式剧本缓存
+取代把整个 SubtitleDocument 对象图 pickle 到磁盘的旧缓存：
+
+- 所有字符串去重进一个字符串池（UTF-8 数据 + 偏移数组）
+- 每个 Cue 字段一列：字符串/整数字段为定长数组，词表/n-gram/翻译为偏移数组 + 条目数组
+- 文件整体 mmap，打开只解析一个很小的 JSON 头
+- 访问时才把某一行物化为 Cue 对象（LazyCueList），改动列表时一次性物化全部
+- 头部带模式哈希（Cue/Meta/Style 字段名与类型 + 格式版本），数据类一改，旧缓存自动失效
+
+列布局根据 Cue 的类型注解自动推导，新增字段无需改动本模块。
+FeatureCache 在此之上按 (内容哈希, G2P/特征配置) 存放多个变体，并按 LRU 控制磁盘占用。
+"""
+
+import dataclasses
+import hashlib
+import json
+import mmap
+import os
+import struct
+import typing
+from array import array
+from collections.abc import MutableSequence
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.models.models import Meta, Style, Cue, SubtitleDocument
+from app.utils.paths import CACHE_DIR
+
+FORMAT_VERSION = 1
+MAGIC = b"SCCH"
+NONE_ID = 0xFFFFFFFF
+DEFAULT_CACHE_DIR = CACHE_DIR / "scripts"
+
+# 魔数 | 格式版本 | 模式哈希(32字节) | 头 JSON 长度
+_HEADER = struct.Struct("<4sI32sI")
+
+
+def _classify(tp) -> str:
+    """根据类型注解决定列类型"""
+    origin = typing.get_origin(tp)
+    args = typing.get_args(tp)
+    if tp is str or (origin is typing.Union and set(args) == {str, type(None)}):
+        return "str"
+    if tp is int:
+        return "int"
+    if origin in (list, List):
+        if args and args[0] is str:
+            return "list"
+        if args and (args[0] is tuple or typing.get_origin(args[0]) is tuple):
+            return "tuples"
+    if origin in (dict, Dict) and args == (str, str):
+        return "dict"
+    return "json"
+
+
+def _field_names(cls) -> List[str]:
+    # Cue 是带 __slots__ 的紧凑类，字段列表由 Cue.FIELDS 给出
+    names = getattr(cls, "FIELDS", None)
+    return list(names) if names is not None else [f.name for f in dataclasses.fields(cls)]
+
+
+_CUE_HINTS = typing.get_type_hints(Cue)
+CUE_COLUMNS: List[Tuple[str, str]] = [(name, _classify(_CUE_HINTS[name])) for name in _field_names(Cue)]
+
+
+def schema_hash() -> str:
+    """Cue/Meta/Style 字段名与类型 + 格式版本的哈希，任一变化即令旧缓存失效"""
+    parts = [f"v{FORMAT_VERSION}"]
+    for cls in (Cue, Meta, Style):
+        hints = typing.get_type_hints(cls)
+        parts.append(cls.__name__ + ":" + ",".join(f"{name}={hints[name]!r}" for name in _field_names(cls)))
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+# -------------------- 写入 --------------------
+
+class _StringPool:
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self.offsets = array("I", [0])
+        self._chunks: List[bytes] = []
+
+    def add(self, s: Optional[str]) -> int:
+        if s is None:
+            return NONE_ID
+        sid = self._ids.get(s)
+        if sid is None:
+            data = s.encode("utf-8")
+            sid = len(self._ids)
+            self._ids[s] = sid
+            self._chunks.append(data)
+            self.offsets.append(self.offsets[-1] + len(data))
+        return sid
+
+    def blob(self) -> bytes:
+        return b"".join(self._chunks)
+
+
+def write_script_cache(path, document: SubtitleDocument, extra: Optional[Dict[str, Any]] = None):
+    """把文档写成列式缓存文件（临时文件 + 原子替换）"""
+    cues = list(document.cues)
+    pool = _StringPool()
+    sections: Dict[str, array] = {}
+
+    for name, kind in CUE_COLUMNS:
+        values = [getattr(cue, name) for cue in cues]
+        if kind == "str":
+            sections[name] = array("I", (pool.add(v) for v in values))
+        elif kind == "int":
+            sections[name] = array("q", (int(v) for v in values))
+        elif kind == "json":
+            sections[name] = array("I", (pool.add(json.dumps(v, ensure_ascii=False)) for v in values))
+        elif kind == "list":
+            off, items = array("I", [0]), array("I")
+            for v in values:
+                items.extend(pool.add(x) for x in (v or []))
+                off.append(len(items))
+            sections[name + ".off"], sections[name + ".items"] = off, items
+        elif kind == "tuples":
+            off, tup, items = array("I", [0]), array("I", [0]), array("I")
+            for v in values:
+                for t in (v or []):
+                    items.extend(pool.add(x) for x in t)
+                    tup.append(len(items))
+                off.append(len(tup) - 1)
+            sections[name + ".off"], sections[name + ".tup"], sections[name + ".items"] = off, tup, items
+        elif kind == "dict":
+            off, keys, vals = array("I", [0]), array("I"), array("I")
+            for v in values:
+                for k, x in (v or {}).items():
+                    keys.append(pool.add(k))
+                    vals.append(pool.add(x))
+                off.append(len(keys))
+            sections[name + ".off"], sections[name + ".keys"], sections[name + ".vals"] = off, keys, vals
+
+    sections["str.off"] = pool.offsets
+    blob = pool.blob()
+
+    # 各段按 8 字节对齐，位置记在头 JSON 中
+    layout: Dict[str, List] = {}
+    pos = 0
+    for name, arr in sections.items():
+        pos += -pos % 8
+        layout[name] = [arr.typecode, pos, len(arr)]
+        pos += arr.itemsize * len(arr)
+    pos += -pos % 8
+    layout["str.blob"] = ["B", pos, len(blob)]
+
+    header = {
+        "count": len(cues),
+        "columns": CUE_COLUMNS,
+        "sections": layout,
+        "meta": dataclasses.asdict(document.meta),
+        "styles": {k: dataclasses.asdict(v) for k, v in document.styles.items()},
+        "extra": extra or {},
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    prefix = _HEADER.pack(MAGIC, FORMAT_VERSION, schema_hash().encode("ascii"), len(header_bytes)) + header_bytes
+    prefix += b"\0" * (-len(prefix) % 8)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(prefix)
+        written = 0
+        for name, arr in sections.items():
+            start = layout[name][1]
+            f.write(b"\0" * (start - written))
+            arr.tofile(f)
+            written = start + arr.itemsize * len(arr)
+        f.write(b"\0" * (layout["str.blob"][1] - written))
+        f.write(blob)
+    os.replace(tmp, path)
+
+
+# -------------------- 读取 --------------------
+
+class ScriptCacheError(Exception):
+    """缓存文件无效、损坏或模式不匹配"""
+    pass
+
+
+class ScriptCacheReader:
+    """mmap 打开的列式缓存，按行物化 Cue"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ScriptCacheError(f"空缓存文件: {self.path}")
+        try:
+            magic, version, schema, header_len = _HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or version != FORMAT_VERSION:
+                raise ScriptCacheError("缓存格式版本不兼容")
+            if schema.decode("ascii") != schema_hash():
+                raise ScriptCacheError("缓存模式哈希不匹配（数据类已变更）")
+            start = _HEADER.size
+            self.header = json.loads(self._mm[start:start + header_len].decode("utf-8"))
+            base = start + header_len
+            base += -base % 8
+        except Exception:
+            self.close()
+            raise
+
+        self.count: int = self.header["count"]
+        self._columns = [tuple(c) for c in self.header["columns"]]
+        view = memoryview(self._mm)
+        self._views: Dict[str, Any] = {}
+        for name, (typecode, offset, length) in self.header["sections"].items():
+            itemsize = array(typecode).itemsize
+            mv = view[base + offset:base + offset + itemsize * length]
+            self._views[name] = mv if typecode == "B" else mv.cast(typecode)
+        self._str_off = self._views["str.off"]
+        self._blob = self._views["str.blob"]
+        # 已解码的字符串（同一字符串只解码一次，物化出的 Cue 共享同一对象）
+        self._str_cache: Dict[int, Optional[str]] = {NONE_ID: None}
+
+    def _s(self, sid: int) -> Optional[str]:
+        try:
+            return self._str_cache[sid]
+        except KeyError:
+            s = str(self._blob[self._str_off[sid]:self._str_off[sid + 1]], "utf-8")
+            self._str_cache[sid] = s
+            return s
+
+    def meta(self) -> Meta:
+        return Meta(**self.header["meta"])
+
+    def styles(self) -> Dict[str, Style]:
+        return {k: Style(**v) for k, v in self.header["styles"].items()}
+
+    @property
+    def extra(self) -> Dict[str, Any]:
+        return self.header.get("extra", {})
+
+    def cue(self, i: int) -> Cue:
+        v = self._views
+        s = self._s
+        kwargs: Dict[str, Any] = {}
+        for name, kind in self._columns:
+            if kind == "str":
+                kwargs[name] = s(v[name][i])
+            elif kind == "int":
+                kwargs[name] = v[name][i]
+            elif kind == "json":
+                kwargs[name] = json.loads(s(v[name][i]))
+            elif kind == "list":
+                off = v[name + ".off"]
+                kwargs[name] = [s(k) for k in v[name + ".items"][off[i]:off[i + 1]].tolist()]
+            elif kind == "tuples":
+                off, tup = v[name + ".off"], v[name + ".tup"]
+                bounds = tup[off[i]:off[i + 1] + 1].tolist()
+                if len(bounds) < 2:
+                    kwargs[name] = []
+                    continue
+                ids = [s(k) for k in v[name + ".items"][bounds[0]:bounds[-1]].tolist()]
+                base = bounds[0]
+                kwargs[name] = [tuple(ids[a - base:b - base]) for a, b in zip(bounds, bounds[1:])]
+            elif kind == "dict":
+                off = v[name + ".off"]
+                a, b = off[i], off[i + 1]
+                kwargs[name] = dict(zip(map(s, v[name + ".keys"][a:b].tolist()),
+                                        map(s, v[name + ".vals"][a:b].tolist())))
+        return Cue(**kwargs)
+
+    def close(self):
+        for mv in getattr(self, "_views", {}).values():
+            mv.release()
+        self._views = {}
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._file.close()
+
+
+class LazyCueList(MutableSequence):
+    """
+    按需物化的 Cue 列表。读访问只物化被访问的行；
+    任何修改（插入、删除、赋值）先物化全部行并释放缓存文件，之后行为与普通 list 相同。
+    """
+
+    def __init__(self, reader: ScriptCacheReader):
+        self._reader: Optional[ScriptCacheReader] = reader
+        self._items: List[Optional[Cue]] = [None] * reader.count
+        self._pending = reader.count
+
+    def _get(self, i: int) -> Cue:
+        cue = self._items[i]
+        if cue is None:
+            cue = self._reader.cue(i)
+            self._items[i] = cue
+            self._pending -= 1
+            if self._pending == 0:
+                self._release()
+        return cue
+
+    def _release(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+    def materialize(self) -> List[Cue]:
+        """物化全部行，返回内部列表"""
+        if self._reader is not None:
+            for i in range(len(self._items)):
+                if self._items[i] is None:
+                    self._items[i] = self._reader.cue(i)
+            self._pending = 0
+            self._release()
+        return self._items
+
+    @property
+    def materialized_count(self) -> int:
+        return len(self._items) - self._pending
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._get(i) for i in range(*index.indices(len(self._items)))]
+        if index < 0:
+            index += len(self._items)
+        if not 0 <= index < len(self._items):
+            raise IndexError("cue index out of range")
+        return self._get(index)
+
+    def __iter__(self):
+        for i in range(len(self._items)):
+            yield self._get(i)
+
+    def __setitem__(self, index, value):
+        self.materialize()[index] = value
+
+    def __delitem__(self, index):
+        del self.materialize()[index]
+
+    def insert(self, index, value):
+        self.materialize().insert(index, value)
+
+    def sort(self, *args, **kwargs):
+        self.materialize().sort(*args, **kwargs)
+
+    def copy(self) -> List[Cue]:
+        return list(self)
+
+    def __eq__(self, other):
+        if isinstance(other, (list, LazyCueList)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self):
+        return f"LazyCueList({len(self._items)} cues, {self.materialized_count} materialized)"
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def read_script_cache(path) -> Tuple[SubtitleDocument, Dict[str, Any]]:
+    """打开缓存文件，返回 (cues 为 LazyCueList 的文档, extra)"""
+    reader = ScriptCacheReader(path)
+    document = SubtitleDocument(meta=reader.meta(), styles=reader.styles(), cues=LazyCueList(reader))  # type: ignore[arg-type]
+    return document, reader.extra
+
+
+# -------------------- 多变体特征缓存 --------------------
+
+def variant_id(variant: Dict[str, Any]) -> str:
+    """特征变体（引擎、版本、语言、n-gram、头尾词数……）的稳定短标识"""
+    payload = json.dumps(variant, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class FeatureCache:
+    """
+    按 (内容哈希, 特征变体) 存放列式缓存文件：<内容哈希>.<变体ID>.scache。
+    同一剧本的多个变体并存，切换 G2P 配置时可直接命中；
+    命中时刷新文件 mtime 作为 LRU 时间戳，总大小超出磁盘预算时淘汰最久未用的文件。
+    """
+
+    SUFFIX = ".scache"
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, budget_mb: float = 512.0):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+
+    def path_for(self, content_hash: str, variant: Dict[str, Any]) -> Path:
+        return self.directory / f"{content_hash}.{variant_id(variant)}{self.SUFFIX}"
+
+    def load(self, content_hash: str, variant: Dict[str, Any]) -> Optional[Tuple[SubtitleDocument, Dict[str, Any]]]:
+        """命中返回 (文档, extra)；不存在返回 None；文件无效时删除并抛出 ScriptCacheError"""
+        path = self.path_for(content_hash, variant)
+        if not path.exists():
+            return None
+        try:
+            result = read_script_cache(path)
+        except ScriptCacheError:
+            self._remove(path)
+            raise
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return result
+
+    def store(self, content_hash: str, variant: Dict[str, Any], document: SubtitleDocument,
+              extra: Optional[Dict[str, Any]] = None) -> Path:
+        path = self.path_for(content_hash, variant)
+        extra = dict(extra or {})
+        extra["variant"] = variant
+        write_script_cache(path, document, extra)
+        self.evict(keep=path)
+        return path
+
+    def variants(self, content_hash: str) -> List[Dict[str, Any]]:
+        """列出某剧本已缓存的全部特征变体"""
+        found = []
+        for path in self.directory.glob(f"{content_hash}.*{self.SUFFIX}"):
+            try:
+                reader = ScriptCacheReader(path)
+            except (ScriptCacheError, OSError):
+                continue
+            try:
+                found.append(reader.extra.get("variant", {}))
+            finally:
+                reader.close()
+        return found
+
+    def total_bytes(self) -> int:
+        return sum(p.stat().st_size for p in self.directory.glob(f"*{self.SUFFIX}"))
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """按 LRU 删除缓存文件直到总大小不超过预算，返回删除的文件数"""
+        entries = []
+        for p in self.directory.glob(f"*{self.SUFFIX}"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, p in sorted(entries, key=lambda e: e[0]):
+            if total <= self.budget_bytes:
+                break
+            if keep is not None and p == keep:
+                continue
+            if self._remove(p):
+                total -= size
+                removed += 1
+        return removed
+
+    @staticmethod
+    def _remove(path: Path) -> bool:
+        try:
+            path.unlink()
+            return True
+        except OSError:
+            # Windows 上仍被映射的文件无法删除，留待下次淘汰
+            return False
+
+
+# -------------------- 基准 --------------------
+
+def benchmark_script_cache(cue_count: int = 5000, directory=CACHE_DIR / "bench"):
+    """对比 pickle 与列式缓存的写入/加载耗时与内存（tracemalloc 峰值）"""
+    import pickle
+    import random
+    import time
+    import tracemalloc
+
+    rnd = random.Random(0)
+    vocab = [f"mot{i}" for i in range(3000)] + ["je", "vous", "pas", "le", "la", "de"] * 200
+    cues = []
+    for i in range(cue_count):
+        toks = [rnd.choice(vocab) for _ in range(rnd.randint(3, 25))]
+        cues.append(Cue(
+            id=i + 1, character=f"P{i % 12}", line=" ".join(toks) + ".", pure_line=" ".join(toks),
+            phonemes=" ".join(toks), character_cue_index=i // 12, translation={"en": "x " * 5},
+            head_tok=toks[:5], head_phonemes=toks[:5], tail_tok=toks[-5:], tail_phonemes=toks[-5:],
+            line_ngram=list(zip(toks, toks[1:])), line_ngram_phonemes=list(zip(toks, toks[1:])),
+        ))
+    doc = SubtitleDocument(meta=Meta(title="bench"), cues=cues)
+    out = Path(directory)
+    out.mkdir(parents=True, exist_ok=True)
+    pkl, col = out / "bench.pickle", out / "bench.scache"
+
+    t0 = time.perf_counter()
+    with open(pkl, "wb") as f:
+        pickle.dump({"version": "1.0", "document": doc}, f)
+    t_pkl_w = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    write_script_cache(col, doc)
+    t_col_w = time.perf_counter() - t0
+
+    def _timed(fn):
+        t = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - t
+
+    def _peak(fn):
+        # 内存单独测一遍，避免 tracemalloc 的开销计入耗时
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    def _pickle_load():
+        with open(pkl, "rb") as f:
+            return pickle.load(f)["document"]
+
+    def _lazy_full():
+        document, _ = read_script_cache(col)
+        return document.cues.materialize()
+
+    _, t_pkl_r = _timed(_pickle_load)
+    (lazy_doc, _), t_col_open = _timed(lambda: read_script_cache(col))
+    _, t_col_first = _timed(lambda: lazy_doc.cues[0])
+    _, t_col_all = _timed(lazy_doc.cues.materialize)
+    assert lazy_doc.cues[cue_count // 2] == cues[cue_count // 2]
+    m_pkl = _peak(_pickle_load)
+    m_col_open = _peak(lambda: read_script_cache(col)[0].cues.materialized_count)
+    m_col_all = _peak(_lazy_full)
+
+    print(f"🧪 剧本缓存基准: {cue_count} 条台词")
+    print(f"   文件大小: pickle {pkl.stat().st_size / 1e6:.2f} MB | 列式 {col.stat().st_size / 1e6:.2f} MB")
+    print(f"   写入:     pickle {t_pkl_w * 1e3:.1f} ms | 列式 {t_col_w * 1e3:.1f} ms")
+    print(f"   加载:     pickle {t_pkl_r * 1e3:.1f} ms ({m_pkl / 1e6:.1f} MB) | "
+          f"列式打开 {t_col_open * 1e3:.2f} ms ({m_col_open / 1e6:.2f} MB)")
+    print(f"   首行物化: {t_col_first * 1e6:.0f} µs | 全部物化 {t_col_all * 1e3:.1f} ms ({m_col_all / 1e6:.1f} MB)")
+    pkl.unlink()
+    col.unlink()
+
+
+if __name__ == "__main__":
+    benchmark_script_cache()
@@ -1,10 +1,13 @@
-from typing import List, Dict, Any, Optional, Tuple
-import hashlib
+from typing import List, Dict, Any, Optional, Set, Tuple
 import json
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from PySide6.QtCore import QObject # 继承QObject以便未来增加信号
+from PySide6.QtCore import QObject, Signal
 from app.models.models import Cue, SubtitleDocument
 from app.core.g2p.base import G2PConverter
+from app.data.file_hash_index import file_content_hash
+from app.data.cue_index import CueIndex
+from app.data.script_writer import ScriptSnapshot, ScriptWriter
 
 class ScriptData(QObject):
     """
@@ -12,12 +15,44 @@ class ScriptData(QObject):
     负责加载、解析、预处理和存储所有Cue对象。
     现在使用增强版加载器支持meta词条检验、格式校验等功能。
     """
+    # 后台保存完成：(路径, 是否成功, 错误信息, 文件哈希, 保存时间)，在保存线程中发出；
+    # 接收方在 GUI 线程中调用 apply_save_result 写回 meta
+    saveFinished = Signal(str, bool, str, str, str)
+    
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.cues: List[Cue] = []
+        # 台词 id → 位置 / Cue 的共享索引，cues 被整体替换时自动改绑
+        self.cue_index = CueIndex(parent=self)
+        self._cues: List[Cue] = []
         self.filepath: str = ""
         self.document: Optional[SubtitleDocument] = None
         self.load_report: Dict[str, Any] = {}
+        # 保存：编码片段缓存 + 单线程保存队列（首次后台保存时创建）
+        self._writer = ScriptWriter()
+        self._save_pool: Optional[ThreadPoolExecutor] = None
+        # 保存字典缓存：台词对象 id -> (台词, 保存字典)；只有标脏的台词在下次快照时重建
+        self._records: Dict[int, Tuple[Cue, Dict[str, Any]]] = {}
+        self._records_enhanced: Optional[bool] = None
+        self._dirty_records: Set[int] = set()
+
+    @property
+    def cues(self) -> List[Cue]:
+        return self._cues
+
+    @cues.setter
+    def cues(self, cues: List[Cue]):
+        self._cues = cues
+        self.cue_index.attach(cues)
+
+    def mark_cues_dirty(self, cues: Optional[List[Cue]] = None):
+        """
+        台词的保存内容被修改后调用（连接到模型的 cuesEdited），下次保存时只重建这些台词的保存字典。
+        cues 为 None 表示全部台词。新增的台词不在缓存中，无需标记。
+        """
+        if cues is None:
+            self._records.clear()
+        else:
+            self._dirty_records.update(id(cue) for cue in cues)
 
     def load_from_file(self, filepath: str, g2p_converter: G2PConverter) -> bool:
         """
@@ -94,123 +129,154 @@ class ScriptData(QObject):
         print(f"[*] Successfully loaded and processed {len(self.cues)} cues.")
         return True
         
-    def save_to_file(self, filepath: str | None = None) -> bool:
+    def save_to_file(self, filepath: str | None = None, compact: bool = False) -> bool:
         """
-        保存剧本数据到JSON文件
+        保存剧本数据到JSON文件（在调用线程上同步完成）
         保存完整的增强格式JSON，包括meta信息和所有数据
-        保存后会自动计算并更新文件哈希值
+        保存后会自动更新文件哈希值
         """
-        import json
-        from datetime import datetime
-        
-        target_path = filepath or self.filepath
-        
-        if not target_path:
-            raise ValueError("没有指定保存路径")
-            
+        snapshot = self._take_snapshot(filepath, compact)  # 未指定路径时抛出 ValueError
         try:
-            # 如果有document对象（增强版加载的），保存完整数据
-            if hasattr(self, 'document') and self.document:
-                # 使用增强版格式保存
-                success = self._save_enhanced_format(target_path)
-                if success:
-                    # 计算并更新文件哈希
-                    file_hash = self._calculate_file_hash(target_path)
-                    if self.document and self.document.meta:
-                        self.document.meta.hash = file_hash
-                        self.document.meta.updated_at = datetime.now().isoformat()
-                        print(f"[*] 已更新文件哈希: {file_hash[:16]}...")
-                return success
-            else:
-                # 使用传统格式保存
-                success = self._save_legacy_format(target_path)
-                if success:
-                    # 对于传统格式，无法更新meta，但可以记录哈希
-                    file_hash = self._calculate_file_hash(target_path)
-                    print(f"[*] 文件哈希: {file_hash[:16]}...")
-                return success
-                
+            file_hash = self._writer.write(snapshot)
         except Exception as e:
             print(f"⚠️ Error saving script: {e}")
             return False
+        self._log_saved(snapshot, file_hash)
+        self.apply_save_result(file_hash, self._snapshot_updated_at(snapshot))
+        return True
     
-    def _calculate_file_hash(self, filepath: str) -> str:
-        """计算文件MD5哈希值"""
-        hasher = hashlib.md5()
-        try:
-            with open(filepath, 'rb') as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hasher.update(chunk)
-            return hasher.hexdigest()
-        except Exception as e:
-            print(f"⚠️ 计算文件哈希失败: {e}")
-            return ""
-    
-    def _save_enhanced_format(self, target_path: str) -> bool:
-        """保存增强版格式（包含meta信息）"""
-        import json
-        from datetime import datetime
+    def save_to_file_async(self, filepath: str | None = None, compact: bool = False) -> Future:
+        """
+        后台保存：在调用线程上取快照，编码和写盘在保存线程中进行，完成后发出 saveFinished。
+        保存线程不修改本对象，哈希和保存时间随信号送回，由接收方调用 apply_save_result。
+        多次调用按顺序写入，最后一次的快照生效。
+        """
+        snapshot = self._take_snapshot(filepath, compact)
+        if self._save_pool is None:
+            self._save_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="script-save")
         
-        # 构建完整的增强格式数据
-        save_data = {}
+        def _save():
+            try:
+                file_hash = self._writer.write(snapshot)
+            except Exception as e:
+                print(f"⚠️ Error saving script: {e}")
+                self.saveFinished.emit(snapshot.path, False, str(e), "", "")
+                raise
+            self._log_saved(snapshot, file_hash)
+            self.saveFinished.emit(snapshot.path, True, "", file_hash, self._snapshot_updated_at(snapshot))
+            return file_hash
         
-        # 添加meta信息
-        if self.document and self.document.meta:
-            meta = self.document.meta
-            save_data["meta"] = {
-                "title": meta.title,
-                "author": meta.author,
-                "translator": meta.translator,
-                "version": meta.version,
-                "description": meta.description,
-                "language": meta.language,
-                "created_at": meta.created_at,
-                "updated_at": datetime.now().isoformat(),  # 更新保存时间
-                "license": meta.license
-            }
+        return self._save_pool.submit(_save)
+    
+    def wait_for_saves(self):
+        """等待已提交的后台保存全部完成（退出前调用）"""
+        if self._save_pool is not None:
+            self._save_pool.shutdown(wait=True)
+            self._save_pool = None
+    
+    def _take_snapshot(self, filepath: str | None, compact: bool) -> ScriptSnapshot:
+        """复制出保存所需的全部数据（GUI 线程，不做 JSON 编码）"""
+        target_path = filepath or self.filepath
+        if not target_path:
+            raise ValueError("没有指定保存路径")
         
-        # 添加样式信息（如果存在）- 转换为字典格式
-        if self.document and hasattr(self.document, 'styles'):
+        header: Dict[str, Any] = {}
+        if self.document:
+            # 增强版格式（包含meta信息）
+            if self.document.meta:
+                meta = self.document.meta
+                header["meta"] = {
+                    "title": meta.title,
+                    "author": meta.author,
+                    "translator": meta.translator,
+                    "version": meta.version,
+                    "description": meta.description,
+                    "language": list(meta.language),
+                    "created_at": meta.created_at,
+                    "updated_at": datetime.now().isoformat(),  # 更新保存时间
+                    "license": meta.license
+                }
+            # 添加样式信息（如果存在）- 转换为字典格式
             styles = getattr(self.document, 'styles', {})
             if styles:
-                # 确保styles是可序列化的字典格式
-                save_data["styles"] = self._serialize_styles(styles)
+                header["styles"] = self._serialize_styles(styles)
+            make_record = self._enhanced_cue_record
+        else:
+            make_record = self._legacy_cue_record
         
-        # 添加台词数据
-        cues_data = []
+        return ScriptSnapshot(path=target_path, header=header,
+                              records=self._cue_records(make_record, self.document is not None),
+                              compact=compact)
+    
+    def _cue_records(self, make_record, enhanced: bool) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        逐条台词取保存字典：未标脏的台词复用上次的字典（对象不变，写入器按身份直接命中片段缓存），
+        新增或标脏的台词重新生成。缓存只保留当前台词，删除的台词随之释放。
+        """
+        if enhanced != self._records_enhanced:
+            self._records.clear()
+            self._records_enhanced = enhanced
+        cached, dirty = self._records, self._dirty_records
+        records: Dict[int, Tuple[Cue, Dict[str, Any]]] = {}
+        out: List[Tuple[int, Dict[str, Any]]] = []
         for cue in self.cues:
-            cue_data = {
-                "id": cue.id,
-                "character": cue.character,
-                "line": cue.line,
-                "phonemes": getattr(cue, 'phonemes', ""),
-                "character_cue_index": getattr(cue, 'character_cue_index', -1),
-                "translation": getattr(cue, 'translation', {}),
-                "notes": getattr(cue, 'notes', ""),
-                "style": getattr(cue, 'style', "default")
-            }
-            
-            # 添加新的头尾字段（如果存在且非空）
-            if hasattr(cue, 'head_tok') and cue.head_tok:
-                cue_data["head_tok"] = cue.head_tok
-            if hasattr(cue, 'head_phonemes') and cue.head_phonemes:
-                cue_data["head_phonemes"] = cue.head_phonemes
-            if hasattr(cue, 'tail_tok') and cue.tail_tok:
-                cue_data["tail_tok"] = cue.tail_tok
-            if hasattr(cue, 'tail_phonemes') and cue.tail_phonemes:
-                cue_data["tail_phonemes"] = cue.tail_phonemes
-            
-            cues_data.append(cue_data)
-        
-        save_data["cues"] = cues_data
-        
-        # 保存到文件
-        with open(target_path, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=2)
-            
-        print(f"[*] Enhanced script saved to: {target_path}")
-        self.filepath = target_path
-        return True
+            key = id(cue)
+            entry = cached.get(key)
+            if entry is None or key in dirty:
+                entry = (cue, make_record(cue))
+            records[key] = entry
+            out.append((key, entry[1]))
+        self._records = records
+        self._dirty_records = set()
+        return out
+    
+    def apply_save_result(self, file_hash: str, updated_at: str = ""):
+        """保存成功后把文件哈希和保存时间写回 meta（在 GUI 线程调用）"""
+        if self.document and self.document.meta:
+            self.document.meta.hash = file_hash
+            if updated_at:
+                self.document.meta.updated_at = updated_at
+    
+    @staticmethod
+    def _snapshot_updated_at(snapshot: ScriptSnapshot) -> str:
+        return snapshot.header.get("meta", {}).get("updated_at", "")
+    
+    def _log_saved(self, snapshot: ScriptSnapshot, file_hash: str):
+        kind = "Enhanced" if self.document else "Legacy"
+        print(f"[*] {kind} script saved to: {snapshot.path} "
+              f"(重新编码 {self._writer.encoded} 条，复用 {self._writer.reused} 条)")
+        print(f"[*] 文件哈希: {file_hash[:16]}...")
+    
+    def _calculate_file_hash(self, filepath: str) -> str:
+        """计算文件内容哈希（经哈希索引，与加载器缓存键一致）"""
+        try:
+            return file_content_hash(filepath)
+        except Exception as e:
+            print(f"⚠️ 计算文件哈希失败: {e}")
+            return ""
+    
+    def _enhanced_cue_record(self, cue: Cue) -> Dict[str, Any]:
+        """增强版格式的单条台词"""
+        cue_data = {
+            "id": cue.id,
+            "character": cue.character,
+            "line": cue.line,
+            "phonemes": getattr(cue, 'phonemes', ""),
+            "character_cue_index": getattr(cue, 'character_cue_index', -1),
+            "translation": dict(getattr(cue, 'translation', {})),
+            "notes": getattr(cue, 'notes', ""),
+            "style": getattr(cue, 'style', "default")
+        }
+        self._add_head_tail_fields(cue, cue_data)
+        return cue_data
+    
+    @staticmethod
+    def _add_head_tail_fields(cue: Cue, cue_data: Dict[str, Any]):
+        """添加头尾字段（如果存在且非空）"""
+        for name in ("head_tok", "head_phonemes", "tail_tok", "tail_phonemes"):
+            value = getattr(cue, name, None)
+            if value:
+                cue_data[name] = list(value)
     
     def _serialize_styles(self, styles) -> dict:
         """将样式对象转换为可序列化的字典"""
@@ -234,53 +300,29 @@ class ScriptData(QObject):
             # 如果不是字典，返回空字典
             return {}
     
-    def _save_legacy_format(self, target_path: str) -> bool:
-        """保存传统格式（仅cues）"""
-        import json
+    def _legacy_cue_record(self, cue: Cue) -> Dict[str, Any]:
+        """传统格式（仅cues）的单条台词"""
+        cue_data = {
+            "id": cue.id,
+            "character": cue.character,
+            "line": cue.line
+        }
         
-        # 转换为JSON格式
-        cues_data = []
-        for cue in self.cues:
-            cue_data = {
-                "id": cue.id,
-                "character": cue.character,
-                "line": cue.line
-            }
+        # 添加新字段（如果存在且非默认值）
+        if hasattr(cue, 'phonemes') and cue.phonemes:
+            cue_data["phonemes"] = cue.phonemes
             
-            # 添加新字段（如果存在且非默认值）
-            if hasattr(cue, 'phonemes') and cue.phonemes:
-                cue_data["phonemes"] = cue.phonemes
-                
-            if hasattr(cue, 'character_cue_index') and cue.character_cue_index != -1:
-                cue_data["character_cue_index"] = cue.character_cue_index
-                
-            if hasattr(cue, 'translation') and cue.translation:
-                cue_data["translation"] = cue.translation
-                
-            if hasattr(cue, 'notes') and cue.notes:
-                cue_data["notes"] = cue.notes
-                
-            if hasattr(cue, 'style') and cue.style != "default":
-                cue_data["style"] = cue.style
+        if hasattr(cue, 'character_cue_index') and cue.character_cue_index != -1:
+            cue_data["character_cue_index"] = cue.character_cue_index
             
-            # 添加新的头尾字段（如果存在且非空）
-            if hasattr(cue, 'head_tok') and cue.head_tok:
-                cue_data["head_tok"] = cue.head_tok
-            if hasattr(cue, 'head_phonemes') and cue.head_phonemes:
-                cue_data["head_phonemes"] = cue.head_phonemes
-            if hasattr(cue, 'tail_tok') and cue.tail_tok:
-                cue_data["tail_tok"] = cue.tail_tok
-            if hasattr(cue, 'tail_phonemes') and cue.tail_phonemes:
-                cue_data["tail_phonemes"] = cue.tail_phonemes
+        if hasattr(cue, 'translation') and cue.translation:
+            cue_data["translation"] = dict(cue.translation)
             
-            cues_data.append(cue_data)
+        if hasattr(cue, 'notes') and cue.notes:
+            cue_data["notes"] = cue.notes
             
-        script_json = {"cues": cues_data}
+        if hasattr(cue, 'style') and cue.style != "default":
+            cue_data["style"] = cue.style
         
-        # 保存到文件
-        with open(target_path, 'w', encoding='utf-8') as f:
-            json.dump(script_json, f, ensure_ascii=False, indent=2)
-            
-        print(f"[*] Legacy script saved to: {target_path}")
-        self.filepath = target_path
-        return True
\ No newline at end of file
+        self._add_head_tail_fields(cue, cue_data)
+        return cue_data
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剧本 JSON 流式解析
+不把整个文件 json.load 进内存：按块读取，顶层的 meta/styles 等小字段整体解码，
+"cues" 数组逐条解码并立即产出，峰值内存与单条台词而非整个文件成正比。
+
+支持两种顶层结构：
+    {"meta": {...}, "styles": {...}, "cues": [{...}, ...]}
+    [{...}, ...]                      # 纯台词数组（旧格式）
+
+仅依赖标准库 json.JSONDecoder.raw_decode。
+"""
+
+import json
+from pathlib import Path
+from typing import Any, Iterator, Tuple
+
+READ_CHUNK_SIZE = 1024 * 1024
+# 已消费的缓冲前缀超过该长度时丢弃，控制缓冲区大小
+_COMPACT_THRESHOLD = 4 * READ_CHUNK_SIZE
+
+_WHITESPACE = " \t\n\r"
+
+
+class ScriptStreamError(ValueError):
+    """流式解析时遇到的 JSON 结构错误"""
+    pass
+
+
+class _Reader:
+    """带回填的字符缓冲：按需从文件读取更多内容"""
+
+    def __init__(self, f, chunk_size: int):
+        self._f = f
+        self._chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self._f.read(self._chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        if self.pos > _COMPACT_THRESHOLD:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += chunk
+        return True
+
+    def peek(self) -> str:
+        """跳过空白，返回下一个非空白字符（文件结束返回空串）"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        c = self.peek()
+        if not c or c not in chars:
+            raise ScriptStreamError(f"位置 {self.pos}: 期望 {chars!r}，实际 {c or 'EOF'!r}")
+        self.pos += 1
+        return c
+
+    def value(self) -> Any:
+        """解码下一个完整 JSON 值；缓冲不完整时继续读取"""
+        self.peek()
+        while True:
+            try:
+                obj, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise ScriptStreamError(f"JSON格式错误: {e}") from e
+            # 数字可能被块边界截断（如 "12" + "3"），在结尾处时再读一次确认
+            if end == len(self.buf) and isinstance(obj, (int, float)) and self._fill():
+                continue
+            self.pos = end
+            return obj
+
+
+def iter_script_json(filepath, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Tuple[str, Any]]:
+    """
+    流式遍历剧本文件。
+
+    Yields:
+        ("field", (键, 值))  顶层非 cues 字段，如 meta、styles
+        ("cue", dict)        cues 数组中的每一条台词
+    """
+    with open(Path(filepath), "r", encoding="utf-8") as f:
+        r = _Reader(f, chunk_size)
+        first = r.expect("{[")
+        if first == "[":
+            yield from _iter_array(r)
+            return
+
+        if r.peek() == "}":
+            r.pos += 1
+            return
+        while True:
+            key = r.value()
+            if not isinstance(key, str):
+                raise ScriptStreamError(f"位置 {r.pos}: 对象键必须是字符串")
+            r.expect(":")
+            if key == "cues" and r.peek() == "[":
+                r.pos += 1
+                yield from _iter_array(r)
+            else:
+                yield "field", (key, r.value())
+            if r.expect(",}") == "}":
+                return
+
+
+def _iter_array(r: _Reader) -> Iterator[Tuple[str, Any]]:
+    if r.peek() == "]":
+        r.pos += 1
+        return
+    while True:
+        yield "cue", r.value()
+        if r.expect(",]") == "]":
+            return
@@ -0,0 +1,118 @@
+"""
+剧本保存（编码与原子写入）
+ScriptData 在 GUI 线程上只做一次轻量快照（只为被编辑过的台词重建保存字典，其余复用上次的字典），
+编码和写盘交给这里，可以放在后台线程执行：
+
+- 每条台词编码后的 JSON 片段按台词对象缓存；快照复用的字典按身份直接命中，
+  重建的字典与缓存内容相等时同样复用片段，只重新编码内容真正变化的台词
+- 缩进模式的输出与 json.dump(..., ensure_ascii=False, indent=2) 逐字节一致；紧凑模式不缩进、不留空格
+- 先写同目录临时文件并 fsync，再 os.replace，读者只会看到旧文件或完整的新文件
+- 内容哈希直接对写出的字节计算（与 file_hash_index 同一算法），不再回读文件
+"""
+import contextlib
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from app.data.file_hash_index import hash_bytes
+
+_INDENT = 2
+_COMPACT_SEPARATORS = (",", ":")
+
+
+@dataclass(frozen=True)
+class ScriptSnapshot:
+    """某一时刻要保存的内容；所有字典都是独立副本且保存后不再修改，编码期间 GUI 可以继续编辑"""
+    path: str
+    header: Dict[str, Any]  # cues 之前的顶层字段（meta、styles）
+    records: List[Tuple[int, Dict[str, Any]]]  # (台词对象 id, 台词的保存字典)
+    compact: bool = False
+
+
+def write_atomic(path, data: bytes):
+    """写同目录临时文件、fsync 后原子替换"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            tmp.unlink()
+        raise
+
+
+class ScriptWriter:
+    """把快照编码为 JSON 并原子写入，缓存每条台词的编码片段（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # 台词对象 id -> (保存字典, 是否紧凑, 片段)；对象 id 被复用也无妨，命中要求字典相同或相等
+        self._fragments: Dict[int, Tuple[Dict[str, Any], bool, str]] = {}
+        self.reused = 0
+        self.encoded = 0
+
+    @staticmethod
+    def _dumps(value: Any, compact: bool) -> str:
+        if compact:
+            return json.dumps(value, ensure_ascii=False, separators=_COMPACT_SEPARATORS)
+        return json.dumps(value, ensure_ascii=False, indent=_INDENT)
+
+    def _cue_fragments(self, snapshot: ScriptSnapshot) -> List[str]:
+        compact = snapshot.compact
+        # 台词位于第 2 层（顶层对象 → cues 数组）
+        newline = "\n" + " " * (2 * _INDENT)
+        fragments: Dict[int, Tuple[Dict[str, Any], bool, str]] = {}
+        out: List[str] = []
+        reused = 0
+        for key, record in snapshot.records:
+            cached = self._fragments.get(key)
+            if cached is not None and cached[1] == compact and (cached[0] is record or cached[0] == record):
+                text = cached[2]
+                reused += 1
+            else:
+                text = self._dumps(record, compact)
+                if not compact:
+                    text = text.replace("\n", newline)  # JSON 字符串内的换行已转义，可以直接替换
+            fragments[key] = (record, compact, text)
+            out.append(text)
+        # 只保留本次快照中的台词，删除的台词不再占用缓存
+        self._fragments = fragments
+        self.reused = reused
+        self.encoded = len(out) - reused
+        return out
+
+    def encode(self, snapshot: ScriptSnapshot) -> bytes:
+        with self._lock:
+            cues = self._cue_fragments(snapshot)
+        parts: List[str] = []
+        if snapshot.compact:
+            for name, value in snapshot.header.items():
+                parts.append(f"{json.dumps(name, ensure_ascii=False)}:{self._dumps(value, True)},")
+            parts.append(f'"cues":[{",".join(cues)}]')
+            return ("{" + "".join(parts) + "}").encode("utf-8")
+
+        pad = " " * _INDENT
+        for name, value in snapshot.header.items():
+            text = self._dumps(value, False).replace("\n", "\n" + pad)
+            parts.append(f"\n{pad}{json.dumps(name, ensure_ascii=False)}: {text},")
+        if cues:
+            item_pad = "\n" + pad * 2
+            body = "[" + ",".join(item_pad + text for text in cues) + "\n" + pad + "]"
+        else:
+            body = "[]"
+        parts.append(f'\n{pad}"cues": {body}')
+        return ("{" + "".join(parts) + "\n}").encode("utf-8")
+
+    def write(self, snapshot: ScriptSnapshot) -> str:
+        """编码并原子写入快照，返回写入内容的哈希"""
+        data = self.encode(snapshot)
+        write_atomic(snapshot.path, data)
+        return hash_bytes(data)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cue 内存占用基准
+对比原先的数据类 Cue（实例 __dict__ + 每条台词各自一份词串 + n-gram 元组列表）
+与当前的紧凑 Cue（__slots__ + 驻留池 + n-gram 编号数组）保留的内存。
+
+    python -m app.models.cue_memory [台词数]
+"""
+
+import gc
+import json
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from app.models import models
+from app.models.models import Cue, InternPool
+
+
+@dataclass
+class _DataclassCue:
+    """改造前的 Cue 定义，仅作对照"""
+    id: int
+    character: Optional[str]
+    line: str
+    pure_line: str = ""
+    phonemes: Optional[str] = ""
+    character_cue_index: int = -1
+    translation: Dict[str, str] = field(default_factory=dict)
+    notes: Optional[str] = ""
+    style: str = "default"
+    head_tok: List[str] = field(default_factory=list)
+    head_phonemes: List[str] = field(default_factory=list)
+    tail_tok: List[str] = field(default_factory=list)
+    tail_phonemes: List[str] = field(default_factory=list)
+    line_ngram: List[tuple] = field(default_factory=list)
+    line_ngram_phonemes: List[tuple] = field(default_factory=list)
+
+
+def _synthetic_script(cue_count: int, seed: int = 0) -> str:
+    """生成与转换格式一致的多语言剧本 JSON 文本"""
+    rnd = random.Random(seed)
+    vocab = [f"mot{i}" for i in range(5000)] + ["je", "vous", "pas", "le", "la", "de", "que", "et"] * 300
+    cues = []
+    for i in range(cue_count):
+        toks = [rnd.choice(vocab) for _ in range(rnd.randint(3, 25))]
+        phs = [f"/{t}/" for t in toks]
+        cues.append({
+            "id": i + 1, "character": f"PERSONNAGE {i % 15}", "line": " ".join(toks) + ".",
+            "pure_line": " ".join(toks), "phonemes": " ".join(phs), "character_cue_index": i // 15,
+            "translation": {"en": f"line {i} in english", "zh": f"第 {i} 句"},
+            "style": "default",
+            "head_tok": toks[:5], "head_phonemes": phs[:5], "tail_tok": toks[-5:], "tail_phonemes": phs[-5:],
+            "line_ngram": [list(g) for g in zip(toks, toks[1:])],
+            "line_ngram_phonemes": [list(g) for g in zip(phs, phs[1:])],
+        })
+    return json.dumps({"cues": cues}, ensure_ascii=False)
+
+
+def _build(cls, text: str):
+    data = json.loads(text)["cues"]
+    cues = []
+    for d in data:
+        d["line_ngram"] = [tuple(g) for g in d["line_ngram"]]
+        d["line_ngram_phonemes"] = [tuple(g) for g in d["line_ngram_phonemes"]]
+        cues.append(cls(**d))
+    return cues
+
+
+def _retained(cls, text: str):
+    """构建台词列表后仍然占用的内存（解析出的中间字典已释放）"""
+    gc.collect()
+    tracemalloc.start()
+    cues = _build(cls, text)
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return cues, current
+
+
+def benchmark_cue_memory(cue_count: int = 20000):
+    text = _synthetic_script(cue_count)
+
+    t0 = time.perf_counter()
+    _build(_DataclassCue, text)
+    t_old = time.perf_counter() - t0
+    old_cues, m_old = _retained(_DataclassCue, text)
+    del old_cues
+
+    # 使用空的驻留池，把池本身的占用也计入
+    saved = models.TOKEN_POOL, models.PHONEME_POOL
+    try:
+        models.TOKEN_POOL, models.PHONEME_POOL = InternPool(), InternPool()
+        t0 = time.perf_counter()
+        _build(Cue, text)
+        t_new = time.perf_counter() - t0
+        models.TOKEN_POOL, models.PHONEME_POOL = InternPool(), InternPool()
+        new_cues, m_new = _retained(Cue, text)
+        pool_size = len(models.TOKEN_POOL) + len(models.PHONEME_POOL)
+
+        t0 = time.perf_counter()
+        for cue in new_cues:
+            cue.line_ngram
+            cue.head_tok
+        t_access = time.perf_counter() - t0
+        del new_cues
+    finally:
+        models.TOKEN_POOL, models.PHONEME_POOL = saved
+
+    print(f"🧪 Cue 内存基准: {cue_count} 条台词, JSON {len(text.encode('utf-8')) / 1e6:.1f} MB")
+    print(f"   数据类:   {m_old / 1e6:.1f} MB ({m_old / cue_count:.0f} B/条), 构建 {t_old * 1e3:.0f} ms")
+    print(f"   紧凑 Cue: {m_new / 1e6:.1f} MB ({m_new / cue_count:.0f} B/条, 含 {pool_size} 个驻留串), "
+          f"构建 {t_new * 1e3:.0f} ms")
+    print(f"   节省 {1 - m_new / m_old:.0%}; 读取全部 line_ngram + head_tok {t_access * 1e3:.0f} ms")
+    return {"dataclass_bytes": m_old, "compact_bytes": m_new}
+
+
+if __name__ == "__main__":
+    benchmark_cue_memory(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -1,3 +1,7 @@
+import sys
+import threading
+from array import array
+from itertools import chain
 from dataclasses import dataclass, field
 from typing import Optional, List, Dict
 from datetime import datetime
@@ -24,29 +28,269 @@ class Style:
     color: str = "#FFFFFF"
     pos: str = "bottom"
 
-@dataclass
+class InternPool:
+    """
+    进程内字符串驻留池：相同的词/音素在所有台词间只保存一份，并分配稳定的整数编号。
+    编号只在本进程内有效，不能直接写入文件或跨进程传递。
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._strings: List[str] = []
+        self._lock = threading.Lock()
+
+    def id_of(self, s: str) -> int:
+        sid = self._ids.get(s)
+        if sid is None:
+            with self._lock:
+                sid = self._ids.get(s)
+                if sid is None:
+                    sid = len(self._strings)
+                    self._strings.append(s)
+                    self._ids[s] = sid
+        return sid
+
+    def ids(self, strings) -> List[int]:
+        out = list(map(self._ids.get, strings))
+        if None in out:
+            out = [self.id_of(s) for s in strings]
+        return out
+
+    def intern_all(self, strings) -> tuple:
+        """返回与 strings 逐个相等的驻留字符串元组"""
+        return tuple(map(self._strings.__getitem__, self.ids(strings)))
+
+    def __getitem__(self, sid: int) -> str:
+        return self._strings[sid]
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+# 词和音素分池存放
+TOKEN_POOL = InternPool()
+PHONEME_POOL = InternPool()
+
+
+def _pack_tokens(pool: InternPool, tokens) -> tuple:
+    if not tokens:
+        return ()
+    return pool.intern_all(tokens)
+
+
+def _pack_ngrams(pool: InternPool, ngrams):
+    """
+    n-gram 列表压缩为 array('I', [n, id, id, ...])（每个编号 4 字节）；
+    长度不一致的罕见情况退回为驻留字符串组成的元组的元组
+    """
+    if not ngrams:
+        return None
+    sizes = set(map(len, ngrams))
+    if len(sizes) == 1 and 0 not in sizes:
+        ids = array("I", sizes)
+        ids.extend(pool.ids(list(chain.from_iterable(ngrams))))
+        return ids
+    return tuple(pool.intern_all(g) for g in ngrams)
+
+
+def _unpack_ngrams(pool: InternPool, packed) -> List[tuple]:
+    if packed is None:
+        return []
+    if type(packed) is tuple:
+        return list(packed)
+    values = iter(list(map(pool.__getitem__, packed[1:])))
+    return list(zip(*[values] * packed[0]))
+
+
 class Cue:
+    """
+    单条台词。
+
+    为大剧本节省内存的紧凑表示：
+    - __slots__，没有实例 __dict__
+    - 角色名、样式名用 sys.intern 驻留；头尾词/音素存为驻留字符串的元组
+    - line_ngram / line_ngram_phonemes 存为驻留池编号数组，访问时还原为元组列表
+    - 没有翻译时不分配字典，第一次访问 translation 时才创建
+
+    对外的字段和构造参数与原先的数据类一致。注意头尾词和 n-gram 属性每次返回新的列表，
+    修改必须整体赋值（cue.head_tok = [...]），原地 append 不会生效；translation 仍是可原地修改的字典。
+    """
+
+    # 对外字段及类型（列式缓存按这里推导列布局）
     id: int
     character: Optional[str]  # 可能为 null（舞台提示等）
     line: str
-    pure_line: str = ""  # 去除标点符号的台词（保留法语特殊字符）
-    phonemes: Optional[str] = ""  # 音素转换结果
-    character_cue_index: int = -1  # 角色台词索引
-    translation: Dict[str, str] = field(default_factory=dict)  # 多语言翻译字典
-    notes: Optional[str] = ""  # 备注
-    style: str = "default"  # 样式名称
-    # 新增：头部和尾部预处理字段
-    head_tok: List[str] = field(default_factory=list)  # 头部词语列表
-    head_phonemes: List[str] = field(default_factory=list)  # 头部音素列表
-    tail_tok: List[str] = field(default_factory=list)  # 尾部词语列表
-    tail_phonemes: List[str] = field(default_factory=list)  # 尾部音素列表
-    # 新增：整句N-gram 特征字段
-    line_ngram: List[tuple] = field(default_factory=list)  # 整句n-gram元组列表
-    line_ngram_phonemes: List[tuple] = field(default_factory=list)  # 整句音素n-gram元组列表
-    
+    pure_line: str  # 去除标点符号的台词（保留法语特殊字符）
+    phonemes: Optional[str]  # 音素转换结果
+    character_cue_index: int  # 角色台词索引
+    translation: Dict[str, str]  # 多语言翻译字典
+    notes: Optional[str]  # 备注
+    style: str  # 样式名称
+    # 头部和尾部预处理字段
+    head_tok: List[str]  # 头部词语列表
+    head_phonemes: List[str]  # 头部音素列表
+    tail_tok: List[str]  # 尾部词语列表
+    tail_phonemes: List[str]  # 尾部音素列表
+    # 整句N-gram 特征字段
+    line_ngram: List[tuple]  # 整句n-gram元组列表
+    line_ngram_phonemes: List[tuple]  # 整句音素n-gram元组列表
+
+    FIELDS = (
+        "id", "character", "line", "pure_line", "phonemes", "character_cue_index",
+        "translation", "notes", "style",
+        "head_tok", "head_phonemes", "tail_tok", "tail_phonemes",
+        "line_ngram", "line_ngram_phonemes",
+    )
+
+    __slots__ = (
+        "id", "_character", "line", "pure_line", "phonemes", "character_cue_index",
+        "_translation", "notes", "_style",
+        "_head_tok", "_head_phonemes", "_tail_tok", "_tail_phonemes",
+        "_line_ngram", "_line_ngram_phonemes",
+        "__weakref__",
+    )
+
+    def __init__(self, id: int, character: Optional[str], line: str, pure_line: str = "",
+                 phonemes: Optional[str] = "", character_cue_index: int = -1,
+                 translation: Optional[Dict[str, str]] = None, notes: Optional[str] = "",
+                 style: str = "default",
+                 head_tok: Optional[List[str]] = None, head_phonemes: Optional[List[str]] = None,
+                 tail_tok: Optional[List[str]] = None, tail_phonemes: Optional[List[str]] = None,
+                 line_ngram: Optional[List[tuple]] = None,
+                 line_ngram_phonemes: Optional[List[tuple]] = None):
+        self.id = id
+        self.character = character
+        self.line = line
+        self.pure_line = pure_line
+        self.phonemes = phonemes
+        self.character_cue_index = character_cue_index
+        self.translation = translation
+        self.notes = notes
+        self.style = style
+        self.head_tok = head_tok
+        self.head_phonemes = head_phonemes
+        self.tail_tok = tail_tok
+        self.tail_phonemes = tail_phonemes
+        self.line_ngram = line_ngram
+        self.line_ngram_phonemes = line_ngram_phonemes
+
+    # ---- 驻留字段 ----
+
+    @property
+    def character(self) -> Optional[str]:
+        return self._character
+
+    @character.setter
+    def character(self, value: Optional[str]):
+        self._character = sys.intern(value) if type(value) is str else value
+
+    @property
+    def style(self) -> str:
+        return self._style
+
+    @style.setter
+    def style(self, value: str):
+        self._style = sys.intern(value) if type(value) is str else value
+
+    @property
+    def translation(self) -> Dict[str, str]:
+        if self._translation is None:
+            self._translation = {}
+        return self._translation
+
+    @translation.setter
+    def translation(self, value: Optional[Dict[str, str]]):
+        self._translation = value or None
+
+    @property
+    def head_tok(self) -> List[str]:
+        return list(self._head_tok)
+
+    @head_tok.setter
+    def head_tok(self, value):
+        self._head_tok = _pack_tokens(TOKEN_POOL, value)
+
+    @property
+    def tail_tok(self) -> List[str]:
+        return list(self._tail_tok)
+
+    @tail_tok.setter
+    def tail_tok(self, value):
+        self._tail_tok = _pack_tokens(TOKEN_POOL, value)
+
+    @property
+    def head_phonemes(self) -> List[str]:
+        return list(self._head_phonemes)
+
+    @head_phonemes.setter
+    def head_phonemes(self, value):
+        self._head_phonemes = _pack_tokens(PHONEME_POOL, value)
+
+    @property
+    def tail_phonemes(self) -> List[str]:
+        return list(self._tail_phonemes)
+
+    @tail_phonemes.setter
+    def tail_phonemes(self, value):
+        self._tail_phonemes = _pack_tokens(PHONEME_POOL, value)
+
+    @property
+    def line_ngram(self) -> List[tuple]:
+        return _unpack_ngrams(TOKEN_POOL, self._line_ngram)
+
+    @line_ngram.setter
+    def line_ngram(self, value):
+        self._line_ngram = _pack_ngrams(TOKEN_POOL, value)
+
+    @property
+    def line_ngram_phonemes(self) -> List[tuple]:
+        return _unpack_ngrams(PHONEME_POOL, self._line_ngram_phonemes)
+
+    @line_ngram_phonemes.setter
+    def line_ngram_phonemes(self, value):
+        self._line_ngram_phonemes = _pack_ngrams(PHONEME_POOL, value)
+
+    # ---- 数据类兼容 ----
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.FIELDS)
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._values() == other._values()
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS)
+        return f"{self.__class__.__name__}({fields})"
+
+    def __getstate__(self) -> Dict:
+        # 驻留池编号只在本进程有效，pickle/deepcopy 时保存还原后的字段值
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __setstate__(self, state: Dict):
+        for name in self.FIELDS:
+            setattr(self, name, state[name])
+
+    def copy(self) -> "Cue":
+        """
+        独立副本（含加载器生成的特征）。
+        编码后的词表、n-gram 只会被整体替换、不会原地修改，可以直接共享；翻译字典单独复制。
+        """
+        other = Cue.__new__(Cue)
+        for name in self.__slots__[:-1]:
+            setattr(other, name, getattr(self, name))
+        if self._translation is not None:
+            other._translation = dict(self._translation)
+        return other
+
+    # ---- 便捷方法 ----
+
     def get_translation(self, language_code: str) -> str:
         """获取指定语言的翻译"""
-        return self.translation.get(language_code, "")
+        return (self._translation or {}).get(language_code, "")
     
     def set_translation(self, language_code: str, text: str):
         """设置指定语言的翻译"""
@@ -73,15 +317,16 @@ class Cue:
     
     def has_ngrams(self) -> bool:
         """检查是否包含n-gram特征"""
-        return bool(self.line_ngram or self.line_ngram_phonemes)
+        return bool(self._line_ngram or self._line_ngram_phonemes)
     
     def get_available_languages(self) -> List[str]:
         """获取已有翻译的语言列表"""
-        return list(self.translation.keys())
+        return list(self._translation or ())
     
     def has_translation(self, language_code: str) -> bool:
         """检查是否有指定语言的翻译"""
-        return language_code in self.translation and bool(self.translation[language_code].strip())
+        translation = self._translation or {}
+        return language_code in translation and bool(translation[language_code].strip())
 
 @dataclass
 class SubtitleDocument:
@@ -100,8 +345,7 @@ class SubtitleDocument:
         
         # 从cues的translation中获取语言
         for cue in self.cues:
-            if cue.translation:
-                languages.update(cue.translation.keys())
+            languages.update(cue.get_available_languages())
         
         return sorted(list(languages))
     
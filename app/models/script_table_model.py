@@ -4,10 +4,11 @@ ScriptTableModel - 专门用于编辑模式的表格模型
 """
 import logging
 from typing import List, Optional, Any, Union, Dict, Set
-from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex, QPersistentModelIndex, Signal
+from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex, QPersistentModelIndex, Signal, Slot
 from PySide6.QtGui import QBrush, QColor, QFont
 
 from app.models.models import Cue
+from app.data.cue_index import CueIndex
 from app.utils.character_color_manager import CharacterColorManager
 
 
@@ -22,6 +23,10 @@ class ScriptTableModel(QAbstractTableModel):
     cueAdded = Signal(int)   # 添加台词时发出 (index)
     cueRemoved = Signal(int) # 删除台词时发出 (index)
     validationError = Signal(str, int, int)  # 验证错误 (message, row, column)
+    phonemesRefreshed = Signal(int)  # 音素刷新完成 (台词数)
+    featuresDirty = Signal()  # 有台词的特征（音素、头尾词、n-gram）需要重算
+    cuesReplaced = Signal()  # 共享的台词列表被整体替换（恢复快照）
+    cuesEdited = Signal(object)  # 台词的保存内容被修改 (台词列表，None 表示全部)，供 ScriptData 只重建这些台词的保存字典
     
     # 列定义
     COLUMN_ID = 0
@@ -37,6 +42,8 @@ class ScriptTableModel(QAbstractTableModel):
     def __init__(self, cues: Optional[List[Cue]] = None, character_color_manager: Optional[CharacterColorManager] = None, parent=None):
         super().__init__(parent)
         self._cues: List[Cue] = cues or []
+        # 台词 id → 行 的索引；set_cues 时可换成 ScriptData 共享的那一份
+        self.cue_index = CueIndex(self._cues, parent=self)
         self._original_cues: List[Cue] = []  # 用于撤销功能
         self._modified = False
         self._read_only_columns = {self.COLUMN_ID, self.COLUMN_PHONEMES}  # 只读列
@@ -62,6 +69,15 @@ class ScriptTableModel(QAbstractTableModel):
         self._filtered_characters: Optional[Set[str]] = None
         self._visible_rows: List[int] = []  # 可见行索引
         
+        # 特征脏标记：按对象身份记录（新增台词的临时ID可能重复）
+        self._dirty_cues: Dict[int, Cue] = {}
+        self._removed_cues: List[Cue] = []
+        
+        # 异步音素刷新：已连接的 QtG2PService、进行中的请求 ID 及其台词快照
+        self._phoneme_service = None
+        self._phoneme_request_id: Optional[int] = None
+        self._phoneme_request_cues: List[Cue] = []
+        
         # 保存原始数据用于撤销
         self.save_snapshot()
         self._update_visible_rows()
@@ -87,43 +103,45 @@ class ScriptTableModel(QAbstractTableModel):
         
     def save_snapshot(self):
         """保存当前状态的快照，用于撤销功能"""
-        self._original_cues = [
-            Cue(
-                id=cue.id,
-                character=cue.character,
-                line=cue.line,
-                phonemes=getattr(cue, 'phonemes', ''),
-                character_cue_index=getattr(cue, 'character_cue_index', -1),
-                translation=getattr(cue, 'translation', {}).copy(),  # 深拷贝字典
-                notes=getattr(cue, 'notes', ''),
-                style=getattr(cue, 'style', 'default')
-            ) for cue in self._cues
-        ]
+        self._original_cues = [cue.copy() for cue in self._cues]
         
     def restore_snapshot(self):
-        """恢复到快照状态"""
+        """
+        恢复到快照状态。
+        快照保留了加载器生成的特征；恢复出的是新的台词对象，对齐器按对象记录的统计需要
+        撤回旧台词、重新计入新台词，因此旧台词记为删除、恢复的台词全部标脏。
+        共享同一列表的其他模型需响应 cuesReplaced 调用 notify_cues_replaced。
+        """
         if self._original_cues:
             self.beginResetModel()
-            self._cues = [
-                Cue(
-                    id=cue.id,
-                    character=cue.character,
-                    line=cue.line,
-                    phonemes=getattr(cue, 'phonemes', ''),
-                    character_cue_index=getattr(cue, 'character_cue_index', -1),
-                    translation=getattr(cue, 'translation', {}).copy(),  # 深拷贝字典
-                    notes=getattr(cue, 'notes', ''),
-                    style=getattr(cue, 'style', 'default')
-                ) for cue in self._original_cues
-            ]
+            replaced = list(self._cues)
+            # 原地替换，与共享同一列表的播放器、ScriptData 保持一致
+            self._cues[:] = [cue.copy() for cue in self._original_cues]
+            self.cue_index.rebuild()
+            self._update_visible_rows()
             self._modified = False
             self.endResetModel()
+            
+            self._removed_cues.extend(replaced)
+            self._dirty_cues = {id(cue): cue for cue in self._cues}
+            self.featuresDirty.emit()
+            self.cuesReplaced.emit()
             logging.info("已恢复到上次保存的状态")
             
-    def set_cues(self, cues: List[Cue]):
-        """设置新的台词列表"""
+    def notify_cues_replaced(self):
+        """与其他模型共享的台词列表已被整体替换时，重置本模型的视图"""
+        self.beginResetModel()
+        self._update_visible_rows()
+        self.endResetModel()
+        
+    def set_cues(self, cues: List[Cue], cue_index: Optional[CueIndex] = None):
+        """设置新的台词列表（cue_index 为 ScriptData 共享的 id 索引）"""
         self.beginResetModel()
         self._cues = cues
+        if cue_index is not None:
+            self.cue_index = cue_index
+        if self.cue_index.cues is not cues:
+            self.cue_index.attach(cues)
         self._modified = False
         
         # 清理之前的翻译列配置，避免加载新剧本时列累积
@@ -133,12 +151,46 @@ class ScriptTableModel(QAbstractTableModel):
         # 清理语言过滤设置
         self._visible_languages = None
         
+        # 新剧本的特征由加载器生成，丢弃旧的脏标记
+        self._dirty_cues.clear()
+        self._removed_cues.clear()
+        
         # 更新列显示
         self._update_current_columns()
         
         self.endResetModel()
         self.save_snapshot()
         
+    def append_cues(self, cues: List[Cue]):
+        """在末尾追加一批台词（流式加载），不重置模型，已显示的行保持不变"""
+        if cues:
+            self._insert_rows_at_end(len(cues), lambda: self._cues.extend(cues))
+        
+    def notify_cues_appended(self, count: int):
+        """与其他模型共享的台词列表已被追加 count 条时，只通知视图插入行"""
+        if count > 0:
+            self._insert_rows_at_end(count, None)
+        
+    def _insert_rows_at_end(self, count: int, mutate):
+        # 共享列表已追加时新行从 len-count 开始，否则从当前末尾开始
+        first = len(self._cues) - count if mutate is None else len(self._cues)
+        if self._filtered_characters is None:
+            self.beginInsertRows(QModelIndex(), first, first + count - 1)
+            if mutate is not None:
+                mutate()
+                self.cue_index.appended(count)
+            self._update_visible_rows()
+            self.endInsertRows()
+        else:
+            self.beginResetModel()
+            if mutate is not None:
+                mutate()
+                self.cue_index.appended(count)
+            self._update_visible_rows()
+            self.endResetModel()
+        # 流式加载的台词属于原始数据，一并纳入撤销快照
+        self._original_cues.extend(cue.copy() for cue in self._cues[first:])
+        
     def get_cues(self) -> List[Cue]:
         """获取当前台词列表"""
         return self._cues
@@ -305,9 +357,12 @@ class ScriptTableModel(QAbstractTableModel):
                 if col == self.COLUMN_CHARACTER:
                     old_value = cue.character
                     cue.character = new_value
+                    self.cue_index.character_changed(row, old_value)
                 elif col == self.COLUMN_LINE:
                     old_value = cue.line
                     cue.line = new_value
+                    if old_value != new_value:
+                        self._mark_features_dirty(cue)
                 else:
                     return False
             else:
@@ -347,6 +402,7 @@ class ScriptTableModel(QAbstractTableModel):
             # 标记数据已修改
             if old_value != new_value:
                 self._modified = True
+                self.cuesEdited.emit([cue])
                 self.dataChanged.emit(index, index, [role])
                 self.dataModified.emit()
                 logging.debug(f"更新台词 {cue.id}: {col} 列从 '{old_value}' 改为 '{new_value}'")
@@ -397,6 +453,7 @@ class ScriptTableModel(QAbstractTableModel):
             elif column == self.COLUMN_LINE:
                 self._cues.sort(key=lambda cue: cue.line, reverse=reverse)
             # 音素列不再显示，因此不需要排序逻辑
+            self.cue_index.rebuild()
                 
             self._modified = True
             self.dataModified.emit()
@@ -457,8 +514,10 @@ class ScriptTableModel(QAbstractTableModel):
             # 插入数据
             self.beginInsertRows(QModelIndex(), index, index)
             self._cues.insert(index, new_cue)
+            self.cue_index.inserted(index)
             self.endInsertRows()
             
+            self._mark_features_dirty(new_cue)
             self._modified = True
             self.dataModified.emit()
             self.cueAdded.emit(index)
@@ -491,8 +550,10 @@ class ScriptTableModel(QAbstractTableModel):
             # 插入数据
             self.beginInsertRows(QModelIndex(), index, index)
             self._cues.insert(index, new_cue)
+            self.cue_index.inserted(index)
             self.endInsertRows()
             
+            self._mark_features_dirty(new_cue)
             self._modified = True
             self.dataModified.emit()
             self.cueAdded.emit(index)
@@ -514,8 +575,13 @@ class ScriptTableModel(QAbstractTableModel):
             
             self.beginRemoveRows(QModelIndex(), index, index)
             del self._cues[index]
+            self.cue_index.removed(index, [cue])
             self.endRemoveRows()
             
+            self._dirty_cues.pop(id(cue), None)
+            self._removed_cues.append(cue)
+            self.featuresDirty.emit()
+            
             self._modified = True
             self.dataModified.emit()
             self.cueRemoved.emit(index)
@@ -565,11 +631,15 @@ class ScriptTableModel(QAbstractTableModel):
             # 调整插入位置
             if from_index < to_index:
                 self._cues.insert(to_index - 1, cue)
+                self.cue_index.moved(from_index, to_index - 1)
             else:
                 self._cues.insert(to_index, cue)
+                self.cue_index.moved(from_index, to_index)
                 
             self.endMoveRows()
             
+            # 顺序变化影响对齐器的"下一句"目标
+            self._mark_features_dirty(cue)
             self._modified = True
             self.dataModified.emit()
             
@@ -582,17 +652,20 @@ class ScriptTableModel(QAbstractTableModel):
             
     def batch_update_character(self, old_character: str, new_character: str) -> int:
         """批量更新角色名称"""
-        updated_count = 0
+        updated: List[Cue] = []
         
         try:
             for row, cue in enumerate(self._cues):
                 if cue.character == old_character:
                     cue.character = new_character
+                    self.cue_index.character_changed(row, old_character)
                     index = self.index(row, self.COLUMN_CHARACTER)
                     self.dataChanged.emit(index, index, [Qt.ItemDataRole.EditRole])
-                    updated_count += 1
+                    updated.append(cue)
                     
+            updated_count = len(updated)
             if updated_count > 0:
+                self.cuesEdited.emit(updated)
                 self._modified = True
                 self.dataModified.emit()
                 logging.info(f"批量更新角色名称: '{old_character}' -> '{new_character}', 共 {updated_count} 条")
@@ -646,19 +719,98 @@ class ScriptTableModel(QAbstractTableModel):
         
     def get_row_by_cue_id(self, cue_id: int) -> int:
         """根据台词ID获取行索引"""
+        row = self.cue_index.find(self._cues, cue_id)
+        return -1 if row is None else row
+        
+    # === 增量特征重算 ===
+    
+    def _mark_features_dirty(self, cue: Cue):
+        self._dirty_cues[id(cue)] = cue
+        self.cuesEdited.emit([cue])
+        self.featuresDirty.emit()
+        
+    def has_dirty_features(self) -> bool:
+        return bool(self._dirty_cues or self._removed_cues)
+        
+    def take_feature_changes(self):
+        """
+        取出并清空脏标记。
+        
+        Returns:
+            Tuple[List[Cue], List[Cue]]: (需要重算特征的台词, 已删除的台词)
+        """
+        dirty = list(self._dirty_cues.values())
+        removed = self._removed_cues
+        self._dirty_cues = {}
+        self._removed_cues = []
+        return dirty, removed
+        
+    def notify_features_updated(self, cues: List[Cue]):
+        """增量重算结果写回后刷新对应行"""
+        if cues:
+            self.cuesEdited.emit(list(cues))  # 头尾词/音素等特征写回也会改变保存内容
+        rows = {id(cue) for cue in cues}
         for row, cue in enumerate(self._cues):
-            if cue.id == cue_id:
-                return row
-        return -1
+            if id(cue) in rows:
+                self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1),
+                                      [Qt.ItemDataRole.DisplayRole])
         
     def refresh_phonemes(self, g2p_converter):
         """刷新所有台词的音素"""
         try:
             lines = [cue.line for cue in self._cues]
             all_phonemes = g2p_converter.batch_convert(lines)
+            self._apply_phonemes(list(self._cues), all_phonemes)
             
-            for cue, phonemes in zip(self._cues, all_phonemes):
+        except Exception as e:
+            logging.error(f"刷新音素失败: {e}")
+            
+    def refresh_phonemes_async(self, qt_g2p_service) -> int:
+        """
+        异步刷新所有台词的音素，不阻塞 GUI 线程。
+        QtG2PService 的信号在工作线程发出，以 QueuedConnection 连接到本模型的槽，
+        写回总在 GUI 线程进行；完成时发出 phonemesRefreshed。
+        
+        Returns:
+            int: 请求ID（新的请求会取代尚未完成的旧请求）
+        """
+        if self._phoneme_service is not qt_g2p_service:
+            if self._phoneme_service is not None:
+                self._phoneme_service.phonemesReady.disconnect(self._on_phonemes_ready)
+                self._phoneme_service.requestFailed.disconnect(self._on_phonemes_failed)
+            qt_g2p_service.phonemesReady.connect(self._on_phonemes_ready, Qt.ConnectionType.QueuedConnection)
+            qt_g2p_service.requestFailed.connect(self._on_phonemes_failed, Qt.ConnectionType.QueuedConnection)
+            self._phoneme_service = qt_g2p_service
+            
+        # 先取号再提交：请求可能在 request() 内部就已完成
+        self._phoneme_request_cues = list(self._cues)
+        self._phoneme_request_id = qt_g2p_service.new_request_id()
+        return qt_g2p_service.request([cue.line for cue in self._phoneme_request_cues],
+                                      self._phoneme_request_id)
+        
+    @Slot(int, list, list)
+    def _on_phonemes_ready(self, request_id: int, _words: list, phonemes: list):
+        if request_id != self._phoneme_request_id:
+            return
+        cues = self._phoneme_request_cues
+        self._phoneme_request_id = None
+        self._phoneme_request_cues = []
+        self._apply_phonemes(cues, phonemes)
+        
+    @Slot(int, str)
+    def _on_phonemes_failed(self, request_id: int, message: str):
+        if request_id != self._phoneme_request_id:
+            return
+        self._phoneme_request_id = None
+        self._phoneme_request_cues = []
+        logging.error(f"刷新音素失败: {message}")
+        
+    def _apply_phonemes(self, cues: List[Cue], all_phonemes: List[str]):
+        """把音素写回台词并刷新显示（cues 为发起请求时的台词快照）"""
+        try:
+            for cue, phonemes in zip(cues, all_phonemes):
                 cue.phonemes = phonemes
+            self.cuesEdited.emit(list(cues))
                 
             # 刷新音素列的显示
             top_left = self.index(0, self.COLUMN_PHONEMES)
@@ -668,7 +820,8 @@ class ScriptTableModel(QAbstractTableModel):
             self._modified = True
             self.dataModified.emit()
             
-            logging.info(f"已刷新 {len(self._cues)} 条台词的音素")
+            logging.info(f"已刷新 {len(cues)} 条台词的音素")
+            self.phonemesRefreshed.emit(len(cues))
             
         except Exception as e:
             logging.error(f"刷新音素失败: {e}")
@@ -694,6 +847,7 @@ class ScriptTableModel(QAbstractTableModel):
                     if not hasattr(cue, 'translation') or cue.translation is None:
                         cue.translation = {}
                     cue.translation[lang_code] = translation
+            self.cuesEdited.emit(None)
         
         self.endInsertColumns()
         
@@ -707,7 +861,9 @@ class ScriptTableModel(QAbstractTableModel):
             return
             
         fixed_count = 0
+        fixed: List[Cue] = []
         for cue in self._cues:
+            before = fixed_count
             # 确保台词有translation字典
             if not hasattr(cue, 'translation') or cue.translation is None:
                 cue.translation = {}
@@ -719,8 +875,11 @@ class ScriptTableModel(QAbstractTableModel):
                     cue.translation[lang_code] = ""
                     fixed_count += 1
                     logging.debug(f"为台词 {cue.id} 自动添加翻译语言 {lang_code} 的空值")
+            if fixed_count != before:
+                fixed.append(cue)
         
         if fixed_count > 0:
+            self.cuesEdited.emit(fixed)
             logging.info(f"修复了 {fixed_count} 个缺失的翻译字典条目")
             self._modified = True
             self.dataModified.emit()
@@ -740,6 +899,7 @@ class ScriptTableModel(QAbstractTableModel):
         for cue in self._cues:
             if hasattr(cue, 'translation') and cue.translation and lang_code in cue.translation:
                 del cue.translation[lang_code]
+        self.cuesEdited.emit(None)
         
         del self.translation_columns[language_name]
         
@@ -768,6 +928,7 @@ class ScriptTableModel(QAbstractTableModel):
             cue.translation = {}
             
         cue.translation[lang_code] = translation
+        self.cuesEdited.emit([cue])
         
         # 发射数据变化信号
         column_index = len(self.BASE_COLUMN_NAMES) + list(self.translation_columns.keys()).index(language_name)
@@ -831,8 +992,10 @@ class ScriptTableModel(QAbstractTableModel):
         if self._filtered_characters is None:
             # 没有筛选，显示所有行
             self._visible_rows = list(range(len(self._cues)))
+        elif self.cue_index.cues is self._cues:
+            # 根据角色筛选：直接合并各角色的有序位置列表（无角色的台词始终显示）
+            self._visible_rows = self.cue_index.rows_of_characters([*self._filtered_characters, None])
         else:
-            # 根据角色筛选
             self._visible_rows = []
             for i, cue in enumerate(self._cues):
                 if cue.character in self._filtered_characters or cue.character is None:
@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量剧本转换
+把一个目录（或清单）中的剧本并行转换为包含音素、头尾词、n-gram 特征的新格式：
+
+- 每个工作进程只创建一次 G2P 引擎（按引擎+语言复用），不再每个文件重新初始化
+- 所有进程共享持久化的词级音素缓存（SQLite WAL，cache/g2p/phonemes.sqlite），
+  一个进程转换过的词其他进程直接命中
+- 大文件优先调度，减少尾部等待
+- 输出先写临时文件再原子替换，中途失败不会留下半个文件
+- 结束时打印吞吐量汇总
+
+命令行：
+    python -m app.utils.batch_convert scripts/ --out converted/ --workers 4
+    python -m app.utils.batch_convert manifest.json --engine epitran
+
+清单格式（JSON 列表，或每行一个路径的文本文件）：
+    [{"input": "plays/cid.json", "output": "out/cid.json", "language": "fra-Latn"}, ...]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class ConversionJob:
+    """单个文件的转换任务"""
+    input: str
+    output: str
+    language: Optional[str] = None
+
+
+# -------------------- 工作进程 --------------------
+
+_engine_type: Optional[str] = None
+_default_language: Optional[str] = None
+_verbose = False
+_manager = None
+_engines: Dict[Tuple[str, str], Any] = {}
+
+
+def _worker_init(engine_type: str, default_language: Optional[str], verbose: bool):
+    global _engine_type, _default_language, _verbose
+    _engine_type, _default_language, _verbose = engine_type, default_language, verbose
+
+
+def _get_engine(language: Optional[str]):
+    """本进程内按 (引擎, 语言) 复用 G2P 实例"""
+    global _manager
+    from app.core.g2p.g2p_manager import G2PManager, G2PEngineType
+
+    engine_type = G2PEngineType(_engine_type)
+    if _manager is None:
+        _manager = G2PManager()
+    manager = _manager
+    language = language or _default_language or manager.engine_configs[engine_type]["default_language"]
+    key = (engine_type.value, language)
+    engine = _engines.get(key)
+    if engine is None:
+        engine = manager.create_engine(engine_type, language)
+        # 已经按文件并行，引擎内部不再开进程池
+        inner = getattr(engine, "converter", engine)
+        for attr in ("workers", "njobs"):
+            if hasattr(inner, attr):
+                setattr(inner, attr, 1)
+        _engines[key] = engine
+    return engine
+
+
+def document_to_dict(document) -> Dict[str, Any]:
+    """转换结果的输出结构（与 convert_script_direct.py 一致）"""
+    return {
+        "meta": {
+            "title": document.meta.title,
+            "author": document.meta.author,
+            "translator": document.meta.translator,
+            "version": document.meta.version,
+            "description": document.meta.description,
+            "language": document.meta.language,
+            "created_at": document.meta.created_at,
+            "updated_at": document.meta.updated_at,
+            "license": document.meta.license,
+            "hash": document.meta.hash,
+        },
+        "styles": {name: {"font": s.font, "size": s.size, "color": s.color, "pos": s.pos}
+                   for name, s in document.styles.items()},
+        "cues": [
+            {
+                "id": cue.id,
+                "character": cue.character,
+                "line": cue.line,
+                "pure_line": cue.pure_line,
+                "phonemes": cue.phonemes,
+                "character_cue_index": cue.character_cue_index,
+                "translation": cue.translation,
+                "notes": cue.notes,
+                "style": cue.style,
+                "head_tok": cue.head_tok,
+                "head_phonemes": cue.head_phonemes,
+                "tail_tok": cue.tail_tok,
+                "tail_phonemes": cue.tail_phonemes,
+                "line_ngram": [list(g) for g in cue.line_ngram],
+                "line_ngram_phonemes": [list(g) for g in cue.line_ngram_phonemes],
+            }
+            for cue in document.cues
+        ],
+    }
+
+
+def write_json_atomic(path, data: Any):
+    """写临时文件后 os.replace，读者只会看到旧文件或完整的新文件"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            tmp.unlink()
+        raise
+
+
+def convert_one(job: ConversionJob) -> Dict[str, Any]:
+    """在工作进程中转换单个文件，返回统计信息"""
+    from app.data.enhanced_script_loader import EnhancedScriptLoader
+
+    result: Dict[str, Any] = {"input": job.input, "output": job.output, "pid": os.getpid()}
+    start = time.perf_counter()
+    try:
+        engine = _get_engine(job.language)
+        before = dict(engine.cache_stats()) if hasattr(engine, "cache_stats") else {}
+        loader = EnhancedScriptLoader(engine)
+        # 加载器输出很多逐步日志，批量模式下默认静默
+        out = contextlib.nullcontext() if _verbose else contextlib.redirect_stdout(io.StringIO())
+        with out:
+            document, _report = loader.load_script(job.input)
+        write_json_atomic(job.output, document_to_dict(document))
+        if hasattr(engine, "flush"):
+            engine.flush()  # 写入共享缓存，其他进程可以命中
+
+        after = engine.cache_stats() if hasattr(engine, "cache_stats") else {}
+        result.update(
+            ok=True,
+            cues=len(document.cues),
+            tokens=sum(len(c.pure_line.split()) for c in document.cues),
+            cache_hits=after.get("hits", 0) - before.get("hits", 0),
+            cache_misses=after.get("misses", 0) - before.get("misses", 0),
+        )
+    except Exception as e:
+        result.update(ok=False, error=f"{type(e).__name__}: {e}")
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+# -------------------- 任务收集 --------------------
+
+def collect_jobs(source: str, out_dir: Optional[str] = None, recursive: bool = False,
+                 suffix: str = "_converted") -> List[ConversionJob]:
+    """从目录或清单文件收集转换任务"""
+    src = Path(source)
+    jobs: List[ConversionJob] = []
+
+    def _output_for(path: Path) -> str:
+        if out_dir:
+            if src.is_dir():
+                rel = path.relative_to(src)
+            elif not path.is_absolute() and ".." not in path.parts:
+                # 清单中的相对路径原样保留，fr/cid.json 与 en/cid.json 不会写到同一个文件
+                rel = path
+            else:
+                rel = Path(path.name)
+            return str(Path(out_dir) / rel)
+        return str(path.with_name(f"{path.stem}{suffix}{path.suffix}"))
+
+    if src.is_dir():
+        pattern = "**/*.json" if recursive else "*.json"
+        for path in sorted(src.glob(pattern)):
+            if path.stem.endswith(suffix) and not out_dir:
+                continue  # 跳过上一次的输出
+            jobs.append(ConversionJob(str(path), _output_for(path)))
+    elif src.suffix == ".json":
+        with open(src, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        for entry in entries:
+            if isinstance(entry, str):
+                entry = {"input": entry}
+            path = Path(entry["input"])
+            jobs.append(ConversionJob(str(path), entry.get("output") or _output_for(path), entry.get("language")))
+    else:
+        with open(src, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    path = Path(line)
+                    jobs.append(ConversionJob(str(path), _output_for(path)))
+
+    # 多个任务写同一输出会并发覆盖、静默丢失结果
+    outputs: Dict[str, List[str]] = {}
+    for job in jobs:
+        outputs.setdefault(os.path.normcase(os.path.abspath(job.output)), []).append(job.input)
+    duplicates = {out: inputs for out, inputs in outputs.items() if len(inputs) > 1}
+    if duplicates:
+        details = "; ".join(f"{out} <- {', '.join(inputs)}" for out, inputs in duplicates.items())
+        raise ValueError(f"多个剧本的输出路径相同: {details}")
+    return jobs
+
+
+# -------------------- 调度 --------------------
+
+def run_batch(jobs: List[ConversionJob], engine_type: str = "epitran", language: Optional[str] = None,
+              workers: Optional[int] = None, verbose: bool = False) -> Dict[str, Any]:
+    """并行转换并返回汇总"""
+    workers = max(1, min(workers or os.cpu_count() or 1, len(jobs) or 1))
+    # 大文件先调度
+    jobs = sorted(jobs, key=lambda j: os.path.getsize(j.input) if os.path.exists(j.input) else 0, reverse=True)
+    print(f"🚀 批量转换: {len(jobs)} 个文件, {workers} 个进程, 引擎 {engine_type}")
+
+    start = time.perf_counter()
+    results: List[Dict[str, Any]] = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                             initializer=_worker_init, initargs=(engine_type, language, verbose)) as pool:
+        futures = {pool.submit(convert_one, job): job for job in jobs}
+        for i, future in enumerate(as_completed(futures), 1):
+            r = future.result()
+            results.append(r)
+            if r["ok"]:
+                print(f"   [{i}/{len(jobs)}] ✅ {Path(r['input']).name}: {r['cues']} 条台词, "
+                      f"{r['seconds']:.1f}s, 缓存命中 {r['cache_hits']}/{r['cache_hits'] + r['cache_misses']}")
+            else:
+                print(f"   [{i}/{len(jobs)}] ❌ {Path(r['input']).name}: {r['error']}")
+    elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r["ok"]]
+    cues = sum(r["cues"] for r in ok)
+    tokens = sum(r["tokens"] for r in ok)
+    hits = sum(r["cache_hits"] for r in ok)
+    misses = sum(r["cache_misses"] for r in ok)
+    summary = {
+        "files": len(jobs),
+        "succeeded": len(ok),
+        "failed": len(results) - len(ok),
+        "cues": cues,
+        "tokens": tokens,
+        "seconds": elapsed,
+        "cues_per_sec": cues / elapsed if elapsed else 0.0,
+        "tokens_per_sec": tokens / elapsed if elapsed else 0.0,
+        "cache_hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        "results": results,
+    }
+
+    print(f"\n📊 汇总: {summary['succeeded']}/{summary['files']} 个文件成功, 用时 {elapsed:.1f}s")
+    print(f"   {cues} 条台词 ({summary['cues_per_sec']:.0f} 条/秒), "
+          f"{tokens} 个词 ({summary['tokens_per_sec']:.0f} 词/秒)")
+    print(f"   共享音素缓存命中率 {summary['cache_hit_rate']:.1%}")
+    return summary
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="批量剧本转换（多进程）")
+    parser.add_argument("source", help="剧本目录，或清单文件（JSON 列表 / 每行一个路径）")
+    parser.add_argument("--out", default=None, help="输出目录（默认与输入同目录，文件名加 _converted）")
+    parser.add_argument("--engine", default="epitran", help="epitran / charsiu / phonemizer / simple")
+    parser.add_argument("--language", default=None, help="默认语言代码（清单中可按文件覆盖）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数（默认 CPU 核数）")
+    parser.add_argument("--recursive", action="store_true", help="递归扫描子目录")
+    parser.add_argument("--verbose", action="store_true", help="显示每个文件的加载日志")
+    parser.add_argument("--summary", default=None, help="把汇总写入该 JSON 文件")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs = collect_jobs(args.source, args.out, args.recursive)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    if not jobs:
+        print(f"❌ 没有找到要转换的剧本: {args.source}")
+        return 1
+    summary = run_batch(jobs, args.engine, args.language, args.workers, args.verbose)
+    if args.summary:
+        write_json_atomic(args.summary, summary)
+    return 0 if summary["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
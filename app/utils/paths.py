@@ -0,0 +1,9 @@
+"""
+项目内固定路径
+缓存等运行时文件统一放在项目根目录下的 cache/（已加入 .gitignore），
+按本文件位置推算，与启动时的工作目录无关。
+"""
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+CACHE_DIR = PROJECT_ROOT / "cache"
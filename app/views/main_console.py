@@ -39,10 +39,11 @@ from app.core.audio.audio_hub import AudioHub
 from app.core.stt.whisper_engine import WhisperEngine
 from app.core.stt.vosk_engine import VoskEngine
 from app.core.aligner.Aligner import Aligner
-from app.core.g2p.phonemizer_g2p import PhonemizerG2P
 from app.core.g2p.g2p_manager import G2PManager, G2PEngineType
+from app.core.g2p.g2p_service import QtG2PService, get_g2p_service
 from app.core.engine_worker import EngineWorkerThread
-from app.models.models import Cue
+from app.core.feature_updater import IncrementalFeatureUpdater
+from app.models.models import Cue, SubtitleDocument
 from app.models.script_table_model import ScriptTableModel
 from app.views.subtitle_window import SubtitleWindow
 from app.views.debug_window import DebugLogWindow
@@ -61,6 +62,12 @@ class LoadScriptThread(QThread):
     progress_updated = Signal(int, str)  # 进度百分比, 状态消息
     script_loaded = Signal(object)  # ScriptData对象
     error_occurred = Signal(str)  # 错误消息
+    cues_appended = Signal(list)  # 流式加载：后续批次的台词
+    stream_finished = Signal(object)  # 流式加载完成：最终的 SubtitleDocument
+    stream_failed = Signal(str)  # 流式加载中途出错：已发出的部分剧本必须丢弃
+    
+    # 超过该大小的剧本使用流式加载，第一幕先显示
+    STREAMING_THRESHOLD_BYTES = 8 * 1024 * 1024
     
     def __init__(self, file_path: str, g2p_manager=None, parent=None):
         super().__init__(parent)
@@ -88,6 +95,11 @@ class LoadScriptThread(QThread):
             
             self.progress_updated.emit(30, "正在使用增强版加载器...")
             
+            if os.path.getsize(self.file_path) >= self.STREAMING_THRESHOLD_BYTES:
+                if not self._load_script_streaming(self.file_path, g2p_converter):
+                    self.error_occurred.emit("剧本加载失败或文件为空")
+                return
+                
             # 创建ScriptData实例
             script_data = ScriptData()
             
@@ -103,6 +115,44 @@ class LoadScriptThread(QThread):
         except Exception as e:
             self.error_occurred.emit(f"加载剧本时出错: {str(e)}")
             
+    def _load_script_streaming(self, filepath: str, g2p_converter) -> bool:
+        """
+        流式加载大剧本：第一批台词就绪即发出 script_loaded，
+        后续批次经 cues_appended 追加，全部完成后发出 stream_finished。
+        已发出 script_loaded 后再解析失败则发出 stream_failed，由 GUI 丢弃不完整的剧本，
+        否则保存时会用部分内容覆盖原文件。
+        """
+        from app.data.enhanced_script_loader import EnhancedScriptLoader
+        
+        loader = EnhancedScriptLoader(g2p_converter)
+        script_data = None
+        final_document = None
+        try:
+            for document, batch in loader.stream_script(filepath):
+                final_document = document
+                if script_data is None:
+                    # GUI 持有自己的列表和文档，加载线程之后只通过信号追加
+                    script_data = ScriptData()
+                    script_data.cues = list(batch)
+                    script_data.document = SubtitleDocument(meta=document.meta, styles=document.styles,
+                                                            cues=script_data.cues)
+                    script_data.filepath = filepath
+                    self.script_loaded.emit(script_data)
+                else:
+                    self.cues_appended.emit(list(batch))
+                self.progress_updated.emit(60, f"已加载 {len(document.cues)} 条台词，继续加载...")
+        except Exception as e:
+            if script_data is None:
+                raise
+            self.stream_failed.emit(f"加载剧本时出错（已加载的部分已丢弃）: {str(e)}")
+            return True
+            
+        if final_document is None or not final_document.cues:
+            return False
+        self.stream_finished.emit(final_document)
+        self.progress_updated.emit(100, f"成功加载 {len(final_document.cues)} 条台词")
+        return True
+        
     def _load_script_enhanced(self, script_data: ScriptData, filepath: str, g2p_converter) -> bool:
         """使用增强版加载器"""
         try:
@@ -473,6 +523,8 @@ class DynamicUIManager:
 class MainConsoleWindow(QMainWindow):
     """主控制台窗口"""
     
+    g2pEngineReady = Signal()  # 后台预加载的G2P引擎就绪
+    
     def __init__(self):
         super().__init__()
         self.script_data = ScriptData()
@@ -499,6 +551,14 @@ class MainConsoleWindow(QMainWindow):
         self.worker_thread = EngineWorkerThread(g2p_manager=self.g2p_manager)
         self.load_thread: Optional[LoadScriptThread] = None  # 加载线程
         
+        # 编辑后只在后台重算被改动台词的特征
+        self.feature_updater = IncrementalFeatureUpdater(
+            self.script_model,
+            loader_factory=self._create_feature_loader,
+            aligners_provider=self._active_aligners,
+            parent=self,
+        )
+        
         # 设置日志处理
         self.setup_logging()
         
@@ -778,12 +838,20 @@ class MainConsoleWindow(QMainWindow):
         
         # 数据模型信号
         self.script_model.dataModified.connect(self.on_script_data_modified)
+        self.script_model.cuesReplaced.connect(self.on_script_cues_replaced)
+        # 只有被编辑过的台词在保存时重建保存字典
+        self.script_model.cuesEdited.connect(self.script_data.mark_cues_dirty)
+        self.theater_model.cuesEdited.connect(self.script_data.mark_cues_dirty)
+        self.script_model.phonemesRefreshed.connect(lambda count: self.update_status(f"音素已刷新 ({count} 条)"))
+        self.feature_updater.featuresUpdated.connect(self.on_features_updated)
         self.script_model.validationError.connect(self.on_validation_error)
         
         # 使用动态UI管理器连接所有信号
         self.dynamic_ui_manager.connect_all_signals()
             
-        # 设置G2P UI
+        # 设置G2P UI，选定引擎在后台预加载，不阻塞窗口显示
+        self.g2pEngineReady.connect(self.update_g2p_status)
+        self.g2p_manager.preload_async(callback=lambda _engine: self.g2pEngineReady.emit())
         self.setup_g2p_ui()
             
     @Slot()
@@ -829,6 +897,9 @@ class MainConsoleWindow(QMainWindow):
         self.load_thread = LoadScriptThread(file_path, self.g2p_manager, self)
         self.load_thread.progress_updated.connect(self.on_load_progress)
         self.load_thread.script_loaded.connect(self.on_script_loaded)
+        self.load_thread.cues_appended.connect(self.on_cues_appended)
+        self.load_thread.stream_finished.connect(self.on_stream_finished)
+        self.load_thread.stream_failed.connect(self.on_stream_failed)
         self.load_thread.error_occurred.connect(self.on_load_error)
         self.load_thread.finished.connect(self.on_load_finished)
         
@@ -849,7 +920,7 @@ class MainConsoleWindow(QMainWindow):
             self.script_data = script_data
             
             # 更新编辑模式数据模型
-            self.script_model.set_cues(self.script_data.cues)
+            self.script_model.set_cues(self.script_data.cues, self.script_data.cue_index)
             
             # 检查并设置翻译列
             self._setup_translation_columns()
@@ -858,7 +929,7 @@ class MainConsoleWindow(QMainWindow):
             self.sync_theater_model()
             
             # 创建播放器
-            self.player = SubtitlePlayer(self.script_data.cues)
+            self.player = SubtitlePlayer(self.script_data.cues, cue_index=self.script_data.cue_index)
             # 注意：播放器的信号连接已移至播放控制窗口
             # 默认选中并显示第一行
             if self.script_data.cues:
@@ -913,6 +984,59 @@ class MainConsoleWindow(QMainWindow):
             self.show_error(f"处理加载结果时出错: {str(e)}")
             logging.error(f"处理加载结果失败: {e}")
     
+    @Slot(list)
+    def on_cues_appended(self, cues: list):
+        """流式加载的后续批次：追加到表格，不重置已显示的内容"""
+        if not cues:
+            return
+        shared = self.theater_model.get_cues() is self.script_model.get_cues()
+        self.script_model.append_cues(cues)
+        if shared:
+            self.theater_model.notify_cues_appended(len(cues))
+        else:
+            self.theater_model.append_cues(cues)
+        self.character_color_manager.import_characters_from_cues(cues)
+        self._update_character_delegate()
+        self.update_status(f"已加载 {len(self.script_data.cues)} 条台词，继续加载...")
+        
+    @Slot()
+    def on_script_cues_replaced(self):
+        """编辑模型整体替换了台词（恢复快照），剧场模型跟着重置"""
+        if self.theater_model.get_cues() is self.script_model.get_cues():
+            self.theater_model.notify_cues_replaced()
+        else:
+            self.sync_theater_model()
+            
+    @Slot(object)
+    def on_stream_finished(self, document):
+        """流式加载完成：同步最终的 meta/styles（meta 可能位于文件末尾）"""
+        if self.script_data and self.script_data.document:
+            self.script_data.document.meta = document.meta
+            self.script_data.document.styles = document.styles
+        self.update_status(f"已加载 {len(self.script_data.cues)} 条台词")
+        logging.info(f"流式加载完成: {self.script_data.filepath}")
+        
+    @Slot(str)
+    def on_stream_failed(self, error_message: str):
+        """
+        流式加载中途失败：丢弃已显示的不完整剧本。
+        它的 filepath 指向源文件，保留下来的话下一次保存会截断原文件。
+        """
+        self.script_data = ScriptData()
+        self.script_model.set_cues(self.script_data.cues, self.script_data.cue_index)
+        self.theater_model.set_cues(self.script_data.cues, self.script_data.cue_index)
+        self.player = None
+        
+        for name in ('save_script_btn', 'add_cue_btn', 'delete_cue_btn', 'duplicate_cue_btn',
+                     'refresh_phonemes_btn', 'add_language_btn', 'remove_language_btn',
+                     'manage_styles_btn'):
+            button = getattr(self, name, None)
+            if button:
+                button.setEnabled(False)
+        self._update_theater_buttons()
+        
+        self.on_load_error(error_message)
+        
     def _setup_translation_columns(self):
         """根据meta信息设置翻译列"""
         try:
@@ -1102,7 +1226,7 @@ class MainConsoleWindow(QMainWindow):
             return
             
         # 复制编辑模式的数据到剧场模式
-        self.theater_model.set_cues(self.script_data.cues)
+        self.theater_model.set_cues(self.script_data.cues, self.script_data.cue_index)
         
         # 同步翻译列
         if hasattr(self.script_model, 'translation_columns'):
@@ -1229,7 +1353,7 @@ class MainConsoleWindow(QMainWindow):
         """刷新显示"""
         if self.script_data.cues:
             # 编辑模式使用数据模型，会自动刷新
-            self.script_model.set_cues(self.script_data.cues)
+            self.script_model.set_cues(self.script_data.cues, self.script_data.cue_index)
             # 剧场模式也使用数据模型，同步刷新
             self.sync_theater_model()
             self.update_status("显示已刷新")
@@ -1346,35 +1470,51 @@ class MainConsoleWindow(QMainWindow):
             # 再次同步数据
             self.script_data.cues = self.script_model.get_cues()
             
-            # 保存到指定文件
-            success = self.script_data.save_to_file(file_path)
-            
-            if success:
-                self.script_model.mark_saved()
-                self.update_status(f"剧本已保存到: {file_path}")
-                logging.info(f"剧本已保存到: {file_path}")
-                
-                # 如果保存到了新路径，询问是否要将此文件设为当前工作文件
-                if file_path != current_file:
-                    from PySide6.QtWidgets import QMessageBox
-                    reply = QMessageBox.question(
-                        self,
-                        "设置工作文件",
-                        f"剧本已保存到新位置：\n{file_path}\n\n是否要将此文件设为当前工作文件？",
-                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
-                        QMessageBox.StandardButton.Yes
-                    )
-                    
-                    if reply == QMessageBox.StandardButton.Yes:
-                        self.script_data.filepath = file_path
-                        logging.info(f"工作文件路径已更新为: {file_path}")
-            else:
-                self.show_error("保存剧本失败")
+            # 后台保存：此处只取快照，编码和写盘在保存线程中完成，结果由 on_script_saved 处理
+            self._save_previous_path = current_file
+            self.script_data.saveFinished.connect(
+                self.on_script_saved, Qt.ConnectionType.QueuedConnection | Qt.ConnectionType.UniqueConnection)
+            self.script_data.save_to_file_async(file_path)
+            # 快照即为保存的内容；保存失败时在 on_script_saved 中恢复"已修改"状态
+            self.script_model.mark_saved()
+            self.update_status(f"正在保存剧本: {file_path}")
                 
         except Exception as e:
             self.show_error(f"保存剧本失败: {str(e)}")
             logging.error(f"保存剧本失败: {e}")
             
+    @Slot(str, bool, str, str, str)
+    def on_script_saved(self, file_path: str, success: bool, error: str, file_hash: str, updated_at: str):
+        """后台保存完成（已回到GUI线程），在此写回 meta 中的哈希和保存时间"""
+        script_data = self.sender()
+        if not isinstance(script_data, ScriptData):
+            script_data = self.script_data
+        if not success:
+            self.script_model._modified = True
+            self.show_error(f"保存剧本失败: {error}")
+            logging.error(f"保存剧本失败: {error}")
+            return
+            
+        script_data.apply_save_result(file_hash, updated_at)
+        self.update_status(f"剧本已保存到: {file_path}")
+        logging.info(f"剧本已保存到: {file_path}")
+        
+        # 如果保存到了新路径，询问是否要将此文件设为当前工作文件
+        current_file = getattr(self, '_save_previous_path', None)
+        if file_path != current_file:
+            from PySide6.QtWidgets import QMessageBox
+            reply = QMessageBox.question(
+                self,
+                "设置工作文件",
+                f"剧本已保存到新位置：\n{file_path}\n\n是否要将此文件设为当前工作文件？",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No,
+                QMessageBox.StandardButton.Yes
+            )
+            
+            if reply == QMessageBox.StandardButton.Yes:
+                script_data.filepath = file_path
+                logging.info(f"工作文件路径已更新为: {file_path}")
+            
     @Slot()
     def add_cue(self):
         """添加新台词 - 在当前选中行下方插入空行"""
@@ -1588,12 +1728,15 @@ class MainConsoleWindow(QMainWindow):
             return
             
         try:
-            # 使用G2P管理器获取当前引擎
+            # 使用G2P管理器获取当前引擎，经异步服务转换，不阻塞界面
             g2p_converter = self.g2p_manager.get_current_engine()
+            service = get_g2p_service(g2p_converter)
+            if getattr(self, '_g2p_qt_service', None) is None or self._g2p_qt_service.service is not service:
+                self._g2p_qt_service = QtG2PService(service, self)
                 
             # 刷新音素
-            self.script_model.refresh_phonemes(g2p_converter)
-            self.update_status("音素已刷新")
+            self.script_model.refresh_phonemes_async(self._g2p_qt_service)
+            self.update_status("正在刷新音素...")
             
         except Exception as e:
             self.show_error(f"刷新音素失败: {str(e)}")
@@ -1762,6 +1905,7 @@ class MainConsoleWindow(QMainWindow):
                 if lang_code not in cue.translation:
                     cue.translation[lang_code] = ""
                     logging.debug(f"为台词 {cue.id} 添加语言 {lang_code} 的空值")
+            self.script_data.mark_cues_dirty()
             
             # 3. 添加到编辑模式表格
             if hasattr(self.script_model, 'add_language_column'):
@@ -2074,9 +2218,13 @@ class MainConsoleWindow(QMainWindow):
             if not cues:
                 return
                 
-            # 重新分配总体序号ID
+            # 重新分配总体序号ID（记录实际变化的台词，保存时只重建它们）
+            changed = {}
             for i, cue in enumerate(cues):
-                cue.id = i + 1
+                if cue.id != i + 1:
+                    cue.id = i + 1
+                    changed[id(cue)] = cue
+            self.script_model.cue_index.rebuild()
                 
             # 重新计算角色序号
             character_counters = {}  # 记录每个角色的台词计数
@@ -2088,10 +2236,14 @@ class MainConsoleWindow(QMainWindow):
                     if character not in character_counters:
                         character_counters[character] = 0
                     character_counters[character] += 1
-                    cue.character_cue_index = character_counters[character]
+                    index = character_counters[character]
                 else:
                     # 如果角色名为空，设置为-1
-                    cue.character_cue_index = -1
+                    index = -1
+                if cue.character_cue_index != index:
+                    cue.character_cue_index = index
+                    changed[id(cue)] = cue
+            self.script_data.mark_cues_dirty(list(changed.values()))
                     
             # 通知模型数据已更改
             self.script_model.layoutChanged.emit()
@@ -2106,6 +2258,25 @@ class MainConsoleWindow(QMainWindow):
         except Exception as e:
             logging.error(f"重新编号失败: {e}")
             
+    def _create_feature_loader(self):
+        """增量重算用的加载器（在工作线程中调用）"""
+        from app.data.enhanced_script_loader import EnhancedScriptLoader
+        return EnhancedScriptLoader(self.g2p_manager.get_current_engine())
+        
+    def _active_aligners(self) -> list:
+        """与编辑表格共享同一份台词列表的对齐器"""
+        aligners = [getattr(self.worker_thread, 'aligner', None)]
+        if self.playcontrol_window is not None:
+            manager = getattr(self.playcontrol_window, 'alignment_manager', None)
+            aligners.append(getattr(manager, 'aligner', None))
+        return [a for a in aligners if a is not None and a.cues is self.script_model.get_cues()]
+        
+    @Slot(int)
+    def on_features_updated(self, count: int):
+        """增量特征重算完成"""
+        if count:
+            self.update_status(f"已更新 {count} 条台词的音素与特征")
+        
     def closeEvent(self, event):
         """窗口关闭事件"""
         # 停止加载线程（如果正在运行）
@@ -2113,6 +2284,11 @@ class MainConsoleWindow(QMainWindow):
             self.load_thread.quit()
             self.load_thread.wait()
             
+        self.feature_updater.shutdown()
+        # 等待后台保存写完，避免退出时留下未完成的保存
+        if self.script_data:
+            self.script_data.wait_for_saves()
+        
         # 保存角色颜色配置
         self.character_color_manager.save_config()
             
@@ -2218,6 +2394,7 @@ class MainConsoleWindow(QMainWindow):
             
             # 更新状态
             self.update_g2p_status()
+            self._apply_cached_feature_variant()
             
             logging.info(f"G2P引擎已切换到: {engine_name}")
             
@@ -2227,6 +2404,32 @@ class MainConsoleWindow(QMainWindow):
                 self.g2p_status_label.setText("切换失败")
                 self.g2p_status_label.setStyleSheet("color: red; font-weight: bold;")
     
+    def _apply_cached_feature_variant(self):
+        """切换G2P配置后，若该配置的剧本特征已有缓存变体则直接换用（有未保存修改时不替换）"""
+        script_data = getattr(self, 'script_data', None)
+        if not script_data or not script_data.filepath or not script_data.cues:
+            return
+        if self.script_model.is_modified():
+            return
+        try:
+            from app.data.enhanced_script_loader import EnhancedScriptLoader
+            loader = EnhancedScriptLoader(self.g2p_manager.get_current_engine())
+            cached = loader.load_cached_variant(script_data.filepath)
+        except Exception as e:
+            logging.warning(f"查找缓存特征变体失败: {e}")
+            return
+        if cached is None:
+            self.update_status("当前G2P配置没有预计算的剧本特征，可刷新音素")
+            return
+        document, report = cached
+        new_data = ScriptData()
+        new_data.document = document
+        new_data.cues = document.cues
+        new_data.filepath = script_data.filepath
+        new_data.load_report = report
+        self.on_script_loaded(new_data)
+        self.update_status("已切换到当前G2P配置的缓存剧本特征")
+        
     @Slot(str)
     def on_g2p_language_changed(self, language_name: str):
         """G2P语言选择变化事件"""
@@ -2242,6 +2445,7 @@ class MainConsoleWindow(QMainWindow):
             
             # 更新状态
             self.update_g2p_status()
+            self._apply_cached_feature_variant()
             
             logging.info(f"G2P语言已切换到: {language_name} ({language_code})")
             
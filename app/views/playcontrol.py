@@ -107,7 +107,7 @@ class PlayControlWindow(QWidget):
         """初始化组件"""
         if self.script_data and self.script_data.cues:
             # 创建播放器（保留用于兼容性）
-            self.player = SubtitlePlayer(self.script_data.cues)
+            self.player = SubtitlePlayer(self.script_data.cues, cue_index=self.script_data.cue_index)
             
             # 创建字幕窗口管理器
             self.subtitle_window_manager = SubtitleWindowManager(self.player)
@@ -592,7 +592,7 @@ class PlayControlWindow(QWidget):
         if self.standalone_subtitle_window is None:
             # 创建带播放器的字幕窗口
             if not self.player:
-                self.player = SubtitlePlayer(self.script_data.cues)
+                self.player = SubtitlePlayer(self.script_data.cues, cue_index=self.script_data.cue_index)
             self.standalone_subtitle_window = SubtitleWindow(self.player)
             
         self.standalone_subtitle_window.show()
@@ -1161,12 +1161,13 @@ class PlayControlWindow(QWidget):
         if self.player:
             current_index = self.player.current_index
         
-        # 查找该角色在当前位置之前的最后一条台词
+        # 查找该角色在当前位置之前的最后一条台词（按角色的有序位置索引二分查找）
         last_character_cue = None
-        for i in range(min(current_index + 1, len(self.script_data.cues))):
-            cue = self.script_data.cues[i]
-            if cue.character and cue.character.strip() == character:
-                last_character_cue = cue
+        cues = self.script_data.cues
+        if character and current_index >= 0 and cues:
+            last_index = self.script_data.cue_index.last_of_character(character, min(current_index, len(cues) - 1))
+            if last_index is not None:
+                last_character_cue = cues[last_index]
         
         if last_character_cue:
             # 显示该角色的最后一条台词
@@ -1192,10 +1193,10 @@ class PlayControlWindow(QWidget):
         # 更新当前播放位置
         if cue:
             # 查找Cue的索引
-            for i, script_cue in enumerate(self.script_data.cues if self.script_data else []):
-                if script_cue.id == cue.id:
-                    self.current_cue_index = i
-                    break
+            if self.script_data:
+                index = self.script_data.cue_index.find(self.script_data.cues, cue.id)
+                if index is not None:
+                    self.current_cue_index = index
         
         # 为每个活跃的屏幕更新显示
         for screen_id in [1, 2, 3]:
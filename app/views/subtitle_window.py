@@ -69,7 +69,7 @@ class SubtitleWindow(QMainWindow):
             
             if success and self.script_data.cues:
                 # 创建新的播放器
-                self.player = SubtitlePlayer(self.script_data.cues)
+                self.player = SubtitlePlayer(self.script_data.cues, cue_index=self.script_data.cue_index)
                 self.setup_player_connections()
                 
                 # 确保显示第一条台词